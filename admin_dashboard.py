@@ -0,0 +1,121 @@
+"""
+ADAMS 事業推進力診断ツール - 管理者向けコホート分析ダッシュボード
+
+    streamlit run admin_dashboard.py
+
+保存済み診断結果（ADAMS_RESULT_DB）の増分集計を表示する。
+表示時には前回以降の新しい行だけを集計テーブルに取り込む。
+"""
+
+import os
+
+import pandas as pd
+import streamlit as st
+
+from cohort_analytics import CohortAggregates, TOTAL_AXIS
+from result_sink import DEFAULT_DB_PATH
+
+st.set_page_config(page_title="ADAMS 診断結果ダッシュボード", layout="wide")
+
+DB_PATH = os.environ.get("ADAMS_RESULT_DB", DEFAULT_DB_PATH)
+
+
+@st.cache_resource
+def get_aggregates(db_path):
+    return CohortAggregates(db_path)
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def load_aggregates(db_path):
+    """新しい行を取り込んでから集計結果を読み出す（30秒間はキャッシュ）"""
+    aggregates = get_aggregates(db_path)
+    new_rows = aggregates.refresh()
+    return {
+        "new_rows": new_rows,
+        "total": aggregates.total_count(),
+        "summary": aggregates.axis_summary(),
+        "axis_hist": aggregates.axis_histograms(),
+        "question_hist": aggregates.question_histograms(),
+        "rank_mix": aggregates.rank_mix(),
+        "daily": aggregates.daily_trend(),
+        "daily_rank": aggregates.daily_rank_mix(),
+    }
+
+
+st.title("📊 診断結果ダッシュボード")
+
+if not os.path.exists(DB_PATH):
+    st.info(f"保存済みの診断結果がありません（{DB_PATH}）")
+    st.stop()
+
+data = load_aggregates(DB_PATH)
+# 軸・設問・選択肢の表示は集計に使った診断票から取る（集計とずれないように）
+questionnaire = get_aggregates(DB_PATH).questionnaire
+diagnostic_data = questionnaire.diagnostic_data
+options = questionnaire.options
+if st.button("🔄 最新の結果を取り込む"):
+    load_aggregates.clear()
+    st.rerun()
+
+col1, col2 = st.columns(2)
+col1.metric("診断件数", f"{data['total']:,} 件")
+col2.metric("総合 平均達成率", f"{data['summary'][TOTAL_AXIS]['mean_pct']:.1f}%")
+
+if data["total"] == 0:
+    st.stop()
+
+# ===== 軸ごとの平均とランク構成 =====
+col1, col2 = st.columns(2)
+with col1:
+    st.subheader("軸ごとの平均達成率")
+    axis_means = pd.DataFrame(
+        {"平均達成率(%)": [data["summary"][axis]["mean_pct"] for axis in diagnostic_data]},
+        index=[diagnostic_data[axis]["english_label"] for axis in diagnostic_data],
+    )
+    st.bar_chart(axis_means)
+with col2:
+    st.subheader("ランク構成")
+    st.bar_chart(pd.DataFrame({"件数": data["rank_mix"]}))
+
+# ===== 軸ごとのスコア分布 =====
+st.subheader("スコア分布")
+axis = st.selectbox("診断軸", [*diagnostic_data.keys(), TOTAL_AXIS])
+hist = data["axis_hist"].get(axis, {})
+st.bar_chart(pd.DataFrame({"件数": hist}).sort_index())
+
+# ===== 設問ごとの回答分布 =====
+st.subheader("設問ごとの回答分布")
+if axis == TOTAL_AXIS:
+    st.caption("診断軸を選ぶと、その軸の設問ごとの回答分布を表示します")
+else:
+    offset = 0
+    for name, axis_data in diagnostic_data.items():
+        if name == axis:
+            break
+        offset += len(axis_data["questions"])
+    rows = []
+    for q_idx, question in enumerate(diagnostic_data[axis]["questions"]):
+        answers = data["question_hist"].get(offset + q_idx, {})
+        count = sum(answers.values())
+        rows.append({
+            "設問": f"問{q_idx + 1}. {question}",
+            **{options[answer]: answers.get(answer, 0) for answer in sorted(options, reverse=True)},
+            "平均": sum(answer * n for answer, n in answers.items()) / count if count else None,
+        })
+    st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+
+# ===== 推移 =====
+st.subheader("推移")
+if data["daily"]:
+    daily = pd.DataFrame(data["daily"], columns=["日付", "軸", "件数", "平均達成率"])
+    labels = {name: axis_data["english_label"] for name, axis_data in diagnostic_data.items()}
+    labels[TOTAL_AXIS] = "Total"
+    daily["軸"] = daily["軸"].map(labels)
+    col1, col2 = st.columns(2)
+    with col1:
+        st.caption("日別 平均達成率(%)")
+        st.line_chart(daily.pivot(index="日付", columns="軸", values="平均達成率"))
+    with col2:
+        st.caption("日別 ランク構成（件数）")
+        daily_rank = pd.DataFrame(data["daily_rank"], columns=["日付", "ランク", "件数"])
+        st.bar_chart(daily_rank.pivot(index="日付", columns="ランク", values="件数").fillna(0))
@@ -0,0 +1,100 @@
+"""
+ADAMS 事業推進力診断ツール - 回答のバイナリ符号化と共有用の回答コード
+
+全設問の回答（1〜4）を1問2ビットに詰め、診断票の照合用ヘッダと
+チェックサムを付けて URL セーフな Base64 文字列（回答コード）にする。
+37問なら15バイト・20文字で、クエリパラメータや保存行にそのまま入れられる。
+
+    バイト列の構成（バージョン1）
+        [0]      形式のバージョン（CODEC_VERSION）
+        [1:4]    診断票の回答の並び（layout_fingerprint）の先頭3バイト
+        [4:-1]   回答。i 問目は (i // 4) バイト目の (i % 4) * 2 ビット目から2ビット（値 - 1）
+        [-1]     それより前のバイト列の CRC32 の下位8ビット
+"""
+
+import base64
+import zlib
+
+CODEC_VERSION = 1
+
+_HEADER_SIZE = 4
+_LAYOUT_TAG_SIZE = 3
+# 2ビットで表せる回答の値
+_MIN_VALUE = 1
+_MAX_VALUE = 4
+
+
+class AnswerCodeError(ValueError):
+    """回答コードが不正、または診断票と一致しない"""
+
+
+def pack_answers(answers):
+    """
+    回答（1〜4 の整数列）を1問2ビットに詰める
+
+    Returns:
+        bytes: ceil(設問数 / 4) バイト
+    """
+    packed = bytearray((len(answers) + 3) // 4)
+    for i, value in enumerate(answers):
+        value = int(value)
+        if not _MIN_VALUE <= value <= _MAX_VALUE:
+            raise AnswerCodeError(f"{i}問目の回答が 1〜4 ではありません: {value}")
+        packed[i >> 2] |= (value - _MIN_VALUE) << ((i & 3) * 2)
+    return bytes(packed)
+
+
+def unpack_answers(packed, count):
+    """pack_answers() の逆変換（count 問分の回答のリストを返す）"""
+    if len(packed) != (count + 3) // 4:
+        raise AnswerCodeError(f"回答のバイト数が設問数（{count}問）と一致しません")
+    return [((packed[i >> 2] >> ((i & 3) * 2)) & 3) + _MIN_VALUE for i in range(count)]
+
+
+def _check_questionnaire(questionnaire):
+    if questionnaire.max_answer > _MAX_VALUE or min(questionnaire.option_values) < _MIN_VALUE:
+        raise AnswerCodeError(f"{questionnaire.id} の選択肢は2ビットで表せません")
+
+
+def encode_answers(answers, questionnaire):
+    """
+    全問分の回答を回答コードにする
+
+    Args:
+        answers: 設問の通し番号順の回答（未回答の 0 は含められない）
+        questionnaire: 回答した診断票（questionnaire.Questionnaire）
+
+    Returns:
+        str: URL セーフな回答コード
+    """
+    _check_questionnaire(questionnaire)
+    if len(answers) != questionnaire.num_questions:
+        raise AnswerCodeError(f"回答数が設問数（{questionnaire.num_questions}問）と一致しません: {len(answers)}")
+    body = bytes([CODEC_VERSION]) + questionnaire.layout_fingerprint[:_LAYOUT_TAG_SIZE] + pack_answers(answers)
+    data = body + bytes([zlib.crc32(body) & 0xFF])
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def decode_answers(code, questionnaire):
+    """
+    回答コードを回答のリストに戻す
+
+    Raises:
+        AnswerCodeError: 形式・チェックサムが不正、または別の診断票の回答コードの場合
+    """
+    _check_questionnaire(questionnaire)
+    try:
+        data = base64.urlsafe_b64decode(code + "=" * (-len(code) % 4))
+    except (ValueError, TypeError) as e:
+        raise AnswerCodeError("回答コードを読み取れません") from e
+    if len(data) < _HEADER_SIZE + 1:
+        raise AnswerCodeError("回答コードが短すぎます")
+
+    body, checksum = data[:-1], data[-1]
+    if zlib.crc32(body) & 0xFF != checksum:
+        raise AnswerCodeError("回答コードが壊れています")
+    if body[0] != CODEC_VERSION:
+        raise AnswerCodeError(f"未対応の回答コードのバージョンです: {body[0]}")
+    if body[1:_HEADER_SIZE] != questionnaire.layout_fingerprint[:_LAYOUT_TAG_SIZE]:
+        raise AnswerCodeError(f"診断票 {questionnaire.id} の回答コードではありません")
+    return unpack_answers(body[_HEADER_SIZE:], questionnaire.num_questions)
@@ -0,0 +1,49 @@
+"""
+ADAMS 事業推進力診断ツール - セッションの回答（1問1バイトの固定長）
+
+回答中のセッションは、設問の通し番号をそのまま添字にした bytearray（1問1バイト、
+0 は未回答）で回答を持つ。37問なら本体は37バイトで、設問ごとの辞書のキー・値の
+オブジェクトを持たない。ラジオボタンの選択状態はここから毎回作り直す。
+numpy に依存しないため、イントロ・設問ページでも読み込める
+（採点時は numpy.frombuffer でコピーなしに 1×設問数 の int8 配列として読める）。
+"""
+
+
+class AnswerSheet:
+    """1人分の回答（設問の通し番号 → 点数。0 は未回答）"""
+
+    __slots__ = ("data",)
+
+    def __init__(self, num_questions):
+        self.data = bytearray(num_questions)
+
+    @classmethod
+    def from_answers(cls, answers):
+        """通し番号順の回答（回答コードを展開したものなど）から作る"""
+        sheet = cls(len(answers))
+        sheet.data[:] = bytes(answers)
+        return sheet
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, index):
+        """index 問目に回答済みか"""
+        return self.data[index] != 0
+
+    def get(self, index):
+        """index 問目の回答（未回答なら None）"""
+        return self.data[index] or None
+
+    def set(self, index, value):
+        """index 問目の回答を書き込む（None で未回答に戻す）"""
+        self.data[index] = value or 0
+
+    @property
+    def answered(self):
+        """回答済みの設問数"""
+        return len(self.data) - self.data.count(0)
+
+    def answers(self):
+        """通し番号順の回答のリスト（encode_answers() に渡す形）"""
+        return list(self.data)
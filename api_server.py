@@ -0,0 +1,466 @@
+"""
+ADAMS 事業推進力診断ツール - 採点・PDFレポートの HTTP API
+
+CRM やパートナーポータルから画面を介さずに診断結果とPDFを取得するための
+asyncio ベースの HTTP サーバー（標準ライブラリのみ）。採点はイベントループ内
+（一括採点はスレッド）で行い、PDF生成は上限付きのプロセスプールで実行する。
+
+    python api_server.py --port 8080 --workers 4
+
+    GET  /healthz             稼働状況とプールの状態
+    GET  /metrics             Prometheus 形式のメトリクス
+    GET  /v1/instruments      利用できる診断票
+    POST /v1/score            採点（1件: {"answers": [...]} / 一括: {"respondents": [{...}, ...]}）
+    POST /v1/report           PDFレポート1件（application/pdf をチャンク転送）
+    POST /v1/reports          PDFレポート一括（application/zip をチャンク転送）
+
+回答は設問の通し番号順の整数配列（"answers"）か回答コード（"answer_code"）で渡す。
+診断票は "instrument"（省略時は既定の診断票）で指定する。
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+from answer_codec import AnswerCodeError, decode_answers, encode_answers
+from metrics import REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE, span
+from questionnaire import QuestionnaireError, get_questionnaire, get_registry
+
+logger = logging.getLogger(__name__)
+
+# リクエストボディの上限（バイト）と、一括リクエストの最大件数
+MAX_BODY_BYTES = 10 * 1024 * 1024
+MAX_BULK = 1000
+
+# PDF・ZIP をチャンク転送で送り出す単位（バイト）
+CHUNK_SIZE = 64 * 1024
+
+# pdf_report_generator.RADAR_RENDERERS / PDF_MODES と同じ（受付時に検証するため、reportlab を読み込まずに持つ）
+RADAR_RENDERERS = ("vector", "matplotlib")
+PDF_MODES = ("standard", "compact")
+
+STATUS_TEXT = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+API_REQUESTS = REGISTRY.counter(
+    "adams_api_requests_total", "API のリクエスト数", ("path", "status"))
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+
+
+# ===== ワーカープロセス =====
+
+def _init_worker():
+    """ワーカー起動時に1回だけPDFモジュールを読み込み、フォントを登録する"""
+    from pdf_report_generator import register_fonts
+    register_fonts()
+
+
+def _render_report(diagnostic_data, report_args, path):
+    """
+    1件分のPDFを path に生成する（ワーカープロセスで実行）
+
+    診断データは採点に使った診断票のものを受け取る（ワーカー側で読み直すと、
+    診断票の再読み込みをはさんで別の版になることがあるため）。
+    """
+    from pdf_report_generator import generate_pdf_report
+
+    started = time.perf_counter()
+    generate_pdf_report(diagnostic_data=diagnostic_data, output=path, **report_args)
+    return time.perf_counter() - started
+
+
+# ===== 採点 =====
+
+def _answers_of(item, questionnaire):
+    """リクエスト1件分の回答（設問の通し番号順の整数リスト）"""
+    if "answer_code" in item:
+        try:
+            return decode_answers(item["answer_code"], questionnaire)
+        except AnswerCodeError as e:
+            raise HTTPError(400, str(e)) from None
+    answers = item.get("answers")
+    if not isinstance(answers, list) or len(answers) != questionnaire.num_questions:
+        raise HTTPError(400, f"answers は {questionnaire.num_questions} 個の整数の配列である必要があります")
+    # JSON の true / false は Python では int の一種のため、明示的に除く
+    if not all(isinstance(value, int) and not isinstance(value, bool) and value in questionnaire.options
+               for value in answers):
+        raise HTTPError(400, f"answers の値は {sorted(questionnaire.options)} のいずれかである必要があります")
+    return answers
+
+
+def score_answers(questionnaire, answer_rows):
+    """
+    回答の一覧を一括採点し、画面の calculate_scores() / get_rank() と同じ項目を返す
+
+    Returns:
+        list: 回答者ごとの結果の辞書
+    """
+    from scoring_engine import RANKS, RANK_LABELS
+
+    scores = questionnaire.scoring_engine.score(answer_rows)
+    results = []
+    for i, answers in enumerate(answer_rows):
+        axis_scores, axis_max_scores, total_score, max_total_score, percentage = scores.row(i)
+        rank_idx = int(scores.rank_index[i])
+        results.append({
+            "instrument": questionnaire.key,
+            "axis_scores": axis_scores,
+            "axis_max_scores": axis_max_scores,
+            "total_score": total_score,
+            "max_total_score": max_total_score,
+            "percentage": percentage,
+            "rank": RANKS[rank_idx],
+            "rank_label": RANK_LABELS[rank_idx],
+            "answer_code": encode_answers(answers, questionnaire),
+        })
+    return results
+
+
+def _report_args(result, item):
+    """採点結果とリクエストの任意項目から generate_pdf_report() の引数を作る"""
+    args = {name: result[name] for name in (
+        "axis_scores", "axis_max_scores", "total_score", "max_total_score", "percentage", "rank", "rank_label")}
+    args["company_name"] = str(item.get("company_name", ""))
+    args["radar_renderer"] = item.get("radar_renderer", "vector")
+    if args["radar_renderer"] not in RADAR_RENDERERS:
+        raise HTTPError(400, f"未対応の radar_renderer です: {args['radar_renderer']}")
+    args["mode"] = item.get("mode", "standard")
+    if args["mode"] not in PDF_MODES:
+        raise HTTPError(400, f"未対応の mode です: {args['mode']}")
+    try:
+        args["report_date"] = date.fromisoformat(item["report_date"]) if item.get("report_date") else date.today()
+    except (TypeError, ValueError):
+        raise HTTPError(400, "report_date は YYYY-MM-DD 形式で指定してください") from None
+    return args
+
+
+def _safe_filename(name):
+    return re.sub(r"[^\w.-]", "_", str(name)) or "report"
+
+
+# ===== サーバー =====
+
+class APIServer:
+    """HTTP/1.1（keep-alive 対応）の最小限のサーバーとルーティング"""
+
+    def __init__(self, workers=None, max_pending=None):
+        self.workers = workers or os.cpu_count() or 1
+        # プールに積めるPDF生成の上限（空きがなければ 503 を返して呼び出し側に再試行させる）
+        self.max_pending = max_pending or self.workers * 8
+        self.pending = 0
+        self.pool = None
+        self.server = None
+        self.routes = {
+            ("GET", "/healthz"): self.handle_health,
+            ("GET", "/metrics"): self.handle_metrics,
+            ("GET", "/v1/instruments"): self.handle_instruments,
+            ("POST", "/v1/score"): self.handle_score,
+            ("POST", "/v1/report"): self.handle_report,
+            ("POST", "/v1/reports"): self.handle_reports,
+        }
+
+    async def start(self, host="127.0.0.1", port=8080):
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+        self.server = await asyncio.start_server(self._handle_connection, host, port)
+        return self.server
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.pool is not None:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+
+    # ===== HTTP =====
+
+    async def _read_request(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, target, version = line.decode("latin-1").split()
+        except ValueError:
+            raise HTTPError(400, "不正なリクエスト行です") from None
+        headers = {}
+        while True:
+            header = await reader.readline()
+            if header in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = header.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length") or 0)
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, f"リクエストボディは {MAX_BODY_BYTES} バイトまでです")
+        body = await reader.readexactly(length) if length else b""
+        return method, target.split("?", 1)[0], version, headers, body
+
+    @staticmethod
+    def _head(status, headers):
+        lines = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    async def _send(self, writer, status, body, content_type, headers=None):
+        writer.write(self._head(status, {
+            "Content-Type": content_type, "Content-Length": len(body), **(headers or {})}) + body)
+        await writer.drain()
+
+    async def _send_json(self, writer, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        await self._send(writer, status, body, "application/json; charset=utf-8", headers)
+
+    async def _send_file(self, writer, path, content_type, filename):
+        """ファイルをチャンク転送で送る（読み込みはスレッドで行い、イベントループを止めない）"""
+        writer.write(self._head(200, {
+            "Content-Type": content_type,
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Transfer-Encoding": "chunked",
+        }))
+        with open(path, "rb") as f:
+            while True:
+                chunk = await asyncio.to_thread(f.read, CHUNK_SIZE)
+                if not chunk:
+                    break
+                writer.write(f"{len(chunk):x}\r\n".encode("ascii") + chunk + b"\r\n")
+                await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except asyncio.IncompleteReadError:
+                    break
+                except HTTPError as e:
+                    await self._send_json(writer, e.status, {"error": {"code": e.status, "message": e.message}})
+                    break
+                if request is None:
+                    break
+                method, path, version, headers, body = request
+
+                status = 200
+                handler = self.routes.get((method, path))
+                try:
+                    if handler is None:
+                        known = any(route_path == path for _, route_path in self.routes)
+                        raise HTTPError(405 if known else 404, f"{method} {path} はありません")
+                    await handler(writer, body)
+                except HTTPError as e:
+                    status = e.status
+                    await self._send_json(writer, e.status, {"error": {"code": e.status, "message": e.message}},
+                                          e.headers)
+                except Exception as e:
+                    status = 500
+                    logger.exception("API の処理に失敗しました: %s %s", method, path)
+                    await self._send_json(writer, 500, {"error": {"code": 500, "message": f"{type(e).__name__}: {e}"}})
+                API_REQUESTS.inc(path=path if handler else "other", status=str(status))
+
+                if headers.get("connection", "").lower() == "close" or version == "HTTP/1.0":
+                    break
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+        finally:
+            writer.close()
+
+    # ===== リクエストの解釈 =====
+
+    @staticmethod
+    def _parse_json(body):
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "JSON として読み込めません") from None
+        if not isinstance(payload, dict):
+            raise HTTPError(400, "JSON オブジェクトを送ってください")
+        return payload
+
+    @staticmethod
+    def _questionnaire(payload):
+        instrument_id = payload.get("instrument")
+        if instrument_id is not None and not isinstance(instrument_id, str):
+            raise HTTPError(400, "instrument は診断票のIDの文字列で指定してください")
+        try:
+            return get_questionnaire(instrument_id)
+        except QuestionnaireError as e:
+            raise HTTPError(400, str(e)) from None
+
+    @staticmethod
+    def _items(payload):
+        """一括（respondents）なら各要素、そうでなければ1件として扱う"""
+        if "respondents" not in payload:
+            return [payload], False
+        items = payload["respondents"]
+        if not isinstance(items, list) or not items or not all(isinstance(item, dict) for item in items):
+            raise HTTPError(400, "respondents はオブジェクトの配列である必要があります")
+        if len(items) > MAX_BULK:
+            raise HTTPError(413, f"一括リクエストは {MAX_BULK} 件までです")
+        return items, True
+
+    async def _score(self, payload):
+        questionnaire = self._questionnaire(payload)
+        items, bulk = self._items(payload)
+        answer_rows = []
+        for i, item in enumerate(items):
+            try:
+                answer_rows.append(_answers_of(item, questionnaire))
+            except HTTPError as e:
+                if bulk:
+                    e.message = f"respondents[{i}]: {e.message}"
+                raise
+        with span("api.score"):
+            if bulk:
+                results = await asyncio.to_thread(score_answers, questionnaire, answer_rows)
+            else:
+                results = score_answers(questionnaire, answer_rows)
+        return questionnaire, items, results, bulk
+
+    async def _render(self, questionnaire, report_args_list, directory):
+        """
+        PDFをプロセスプールで並行生成し、生成したファイルのパスを返す
+
+        プールに同時に積むのは最大でワーカー数分（空いている枠がそれより少なければその数）で、
+        件数の多い一括リクエストは1件終わるごとに次を積む。そのため、件数が max_pending を
+        超えていても、空いている枠があれば受け付ける。
+        """
+        window = min(len(report_args_list), self.workers, self.max_pending - self.pending)
+        if window <= 0:
+            raise HTTPError(503, "PDF生成が混み合っています。しばらくしてから再試行してください",
+                            {"Retry-After": "5"})
+        self.pending += window
+        try:
+            loop = asyncio.get_running_loop()
+            slots = asyncio.Semaphore(window)
+            paths = [os.path.join(directory, f"{i}.pdf") for i in range(len(report_args_list))]
+
+            async def render(args, path):
+                async with slots:
+                    await loop.run_in_executor(self.pool, _render_report, questionnaire.diagnostic_data,
+                                               args, path)
+
+            # 1件が失敗しても、生成中の他の件が終わるまで待つ（枠と作業ディレクトリを先に手放さないため）
+            with span("api.render"):
+                results = await asyncio.gather(*(render(args, path) for args, path in zip(report_args_list, paths)),
+                                               return_exceptions=True)
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+            return paths
+        finally:
+            self.pending -= window
+
+    # ===== ハンドラー =====
+
+    async def handle_health(self, writer, body):
+        await self._send_json(writer, 200, {
+            "status": "ok", "workers": self.workers, "pending": self.pending, "max_pending": self.max_pending})
+
+    async def handle_metrics(self, writer, body):
+        await self._send(writer, 200, REGISTRY.render().encode("utf-8"), METRICS_CONTENT_TYPE)
+
+    async def handle_instruments(self, writer, body):
+        instruments = []
+        for instrument_id in get_registry().instruments():
+            try:
+                questionnaire = get_questionnaire(instrument_id)
+            except QuestionnaireError:
+                continue
+            instruments.append({
+                "id": questionnaire.id, "version": questionnaire.version, "title": questionnaire.title,
+                "num_questions": questionnaire.num_questions, "axes": list(questionnaire.axis_names),
+                "options": {str(value): label for value, label in questionnaire.options.items()},
+            })
+        await self._send_json(writer, 200, {"instruments": instruments})
+
+    async def handle_score(self, writer, body):
+        _, items, results, bulk = await self._score(self._parse_json(body))
+        if bulk:
+            for item, result in zip(items, results):
+                if "id" in item:
+                    result["id"] = item["id"]
+            await self._send_json(writer, 200, {"results": results})
+        else:
+            await self._send_json(writer, 200, results[0])
+
+    async def handle_report(self, writer, body):
+        payload = self._parse_json(body)
+        if "respondents" in payload:
+            raise HTTPError(400, "複数件のレポートは /v1/reports に送ってください")
+        questionnaire, items, results, _ = await self._score(payload)
+        report_args = _report_args(results[0], items[0])
+        with tempfile.TemporaryDirectory(prefix="adams-api-") as tmp_dir:
+            path, = await self._render(questionnaire, [report_args], tmp_dir)
+            filename = f"ADAMS_report_{report_args['report_date'].strftime('%Y%m%d')}.pdf"
+            await self._send_file(writer, path, "application/pdf", filename)
+
+    async def handle_reports(self, writer, body):
+        payload = self._parse_json(body)
+        if "respondents" not in payload:
+            raise HTTPError(400, "respondents を指定してください（1件なら /v1/report）")
+        questionnaire, items, results, _ = await self._score(payload)
+        report_args_list = [_report_args(result, item) for result, item in zip(results, items)]
+        names = [f"{_safe_filename(item.get('id', i + 1))}.pdf" for i, item in enumerate(items)]
+
+        with tempfile.TemporaryDirectory(prefix="adams-api-") as tmp_dir:
+            paths = await self._render(questionnaire, report_args_list, tmp_dir)
+            zip_path = os.path.join(tmp_dir, "reports.zip")
+            manifest = [{"file": name, **{key: result[key] for key in ("total_score", "percentage", "rank")},
+                         **({"id": item["id"]} if "id" in item else {})}
+                        for name, item, result in zip(names, items, results)]
+            await asyncio.to_thread(_write_zip, zip_path, zip(names, paths), manifest)
+            await self._send_file(writer, zip_path, "application/zip", "ADAMS_reports.zip")
+
+
+def _write_zip(zip_path, entries, manifest):
+    with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, path in entries:
+            zf.write(path, arcname=name)
+        zf.writestr("manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2))
+
+
+async def serve(host, port, workers, max_pending):
+    api = APIServer(workers, max_pending)
+    server = await api.start(host, port)
+    print(f"ADAMS API listening on http://{host}:{port} (workers: {api.workers})")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await api.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="診断の採点・PDFレポート生成 HTTP API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="PDF生成のワーカープロセス数")
+    parser.add_argument("--max-pending", type=int, help="同時に受け付けるPDF生成の上限（既定: ワーカー数×8）")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.max_pending))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+ADAMS 事業推進力診断ツール - 画面用アセット（ロゴ・CSS）
+
+ロゴとCSSは起動時に一度だけリポジトリ内のファイルから読み込み、メモリ上に保持する。
+外部URLへのアクセスは行わないため、ネットワークのない環境でも同じように表示される。
+
+    ロゴ  st.image() にバイト列で渡す（Streamlit のメディア領域に内容ハッシュのURLで置かれ、
+          再実行のたびに送るのはURLだけになる）
+    CSS   静的配信（server.enableStaticServing）が有効なら app/static/adams.css を
+          内容ハッシュ付きのURLで <link> し、無効なら圧縮した <style> を埋め込む
+"""
+
+import hashlib
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+ASSET_DIR = os.path.dirname(os.path.abspath(__file__))
+LOGO_PATH = os.path.join(ASSET_DIR, "adams_logo.png")
+CSS_PATH = os.path.join(ASSET_DIR, "static", "adams.css")
+
+# 静的配信時のURL（アプリのベースパスからの相対）
+CSS_URL = "app/static/adams.css"
+
+
+def _read(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError as e:
+        logger.warning("アセットを読み込めません: %s (%s)", path, e)
+        return None
+
+
+def minify_css(css):
+    """コメントと余分な空白を取り除く（埋め込み時の送信量を減らすため）"""
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};:,>])\s*", r"\1", css)
+    return css.replace(";}", "}").strip()
+
+
+LOGO_PNG = _read(LOGO_PATH)
+CSS = (_read(CSS_PATH) or b"").decode("utf-8")
+CSS_MINIFIED = minify_css(CSS)
+# CSS を変更したらURLが変わり、ブラウザのキャッシュが使われなくなる
+CSS_VERSION = hashlib.sha256(CSS.encode("utf-8")).hexdigest()[:12]
+
+
+def css_tag(static_serving):
+    """
+    ページに埋め込むCSSのタグ
+
+    Args:
+        static_serving: Streamlit の静的配信が有効か
+
+    Returns:
+        str: <link>（静的配信時）または <style>
+    """
+    if static_serving and CSS:
+        return f'<link rel="stylesheet" href="{CSS_URL}?v={CSS_VERSION}">'
+    return f"<style>{CSS_MINIFIED}</style>"
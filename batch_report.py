@@ -0,0 +1,314 @@
+"""
+ADAMS 事業推進力診断ツール - PDFレポート一括生成CLI
+
+回答者ファイル（CSV / JSON / JSON Lines）を読み込み、プロセスプールで
+全コアを使ってPDFレポートを並列生成する。
+
+    python batch_report.py respondents.csv --output-dir reports/
+    python batch_report.py respondents.jsonl --zip reports.zip --resume
+
+CSV は id, company_name, q1〜qN 列、JSON は {"id", "company_name", "answers": [...]} 形式。
+出力先には manifest.jsonl（1件ごとの結果と所要時間）と failures.jsonl を書き出し、
+--resume 指定時は manifest で成功済みの回答者をスキップする。
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import shutil
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from diagnostic_data import diagnostic_data
+from scoring_engine import MAX_ANSWER, ScoringEngine, RANKS, RANK_LABELS
+
+MANIFEST_NAME = "manifest.jsonl"
+FAILURES_NAME = "failures.jsonl"
+
+
+def _parse_answers(answers, num_questions, max_answer):
+    """1件分の回答を整数のリストにする（不正なら理由を添えて ValueError）"""
+    if not isinstance(answers, (list, tuple)):
+        raise ValueError("answers がリストではありません")
+    if len(answers) != num_questions:
+        raise ValueError(f"回答数が {num_questions} ではありません ({len(answers)})")
+    parsed = []
+    for number, value in enumerate(answers, 1):
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"q{number} が整数ではありません ({value!r})") from None
+        if not 0 <= value <= max_answer:
+            raise ValueError(f"q{number} が 0〜{max_answer} の範囲外です ({value})")
+        parsed.append(value)
+    return parsed
+
+
+def load_respondents(path, num_questions, max_answer=MAX_ANSWER):
+    """
+    回答者ファイルを読み込む（回答に不備のある行は除外し、理由を返す）
+
+    Returns:
+        tuple: (回答者情報のリスト [{"id", "company_name"}], N×設問数 の回答行列,
+                不備のある回答者の manifest 行のリスト [{"id", "status": "error", "error"}])
+    """
+    ext = os.path.splitext(path)[1].lower()
+    records = []
+
+    if ext == ".csv":
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            for row in csv.DictReader(f):
+                answers = [row.get(f"q{i}") for i in range(1, num_questions + 1)]
+                if None in answers:
+                    answers = f"q{answers.index(None) + 1} 列がありません"
+                records.append((row.get("id", ""), row.get("company_name", ""), answers))
+    elif ext in (".json", ".jsonl", ".ndjson"):
+        with open(path, encoding="utf-8") as f:
+            if ext == ".json":
+                items = json.load(f)
+            else:
+                items = []
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        items.append(json.loads(line))
+                    except json.JSONDecodeError as e:
+                        items.append(f"JSONとして読めません ({e})")
+        for item in items:
+            if not isinstance(item, dict):
+                records.append(("", "", item if isinstance(item, str) else "オブジェクトではありません"))
+            else:
+                records.append((str(item.get("id", "")), item.get("company_name", ""),
+                                item.get("answers", "answers がありません")))
+    else:
+        raise ValueError(f"未対応のファイル形式です: {path}")
+
+    respondents = []
+    rows = []
+    invalid = []
+    # IDとPDFのファイル名 -> 何件目か（同じIDや、同じファイル名になるIDは後の方を除外する）
+    seen_ids = {}
+    seen_files = {}
+    for i, (respondent_id, company_name, answers) in enumerate(records, 1):
+        respondent_id = respondent_id or f"{i:06d}"
+        filename = _safe_filename(respondent_id)
+        try:
+            if isinstance(answers, str):
+                raise ValueError(answers)
+            if respondent_id in seen_ids:
+                raise ValueError(f"ID が {seen_ids[respondent_id]}件目と重複しています")
+            if filename in seen_files:
+                raise ValueError(f"PDFのファイル名 {filename} が {seen_files[filename]}件目と重複しています")
+            rows.append(_parse_answers(answers, num_questions, max_answer))
+        except ValueError as e:
+            invalid.append({"id": respondent_id, "status": "error", "error": f"{i}件目: {e}"})
+            continue
+        seen_ids[respondent_id] = seen_files[filename] = i
+        respondents.append({"id": respondent_id, "company_name": company_name or ""})
+
+    matrix = np.array(rows, dtype=np.int8).reshape(-1, num_questions)
+    return respondents, matrix, invalid
+
+
+def _safe_filename(respondent_id):
+    return re.sub(r"[^\w.-]", "_", str(respondent_id)) + ".pdf"
+
+
+def _read_manifest(path):
+    """
+    manifest.jsonl から成功済みの回答者IDと、記録済みの失敗を読み出す（途中で切れた行は無視）
+
+    Returns:
+        tuple: (成功済みの回答者IDの集合, 記録済みの失敗の (id, error) の集合)
+    """
+    done = set()
+    recorded = set()
+    if not os.path.exists(path):
+        return done, recorded
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if entry.get("status") == "ok":
+                done.add(entry["id"])
+            else:
+                recorded.add((entry.get("id"), entry.get("error")))
+    return done, recorded
+
+
+# ===== ワーカープロセス =====
+
+def _init_worker():
+    """ワーカー起動時に1回だけPDFモジュールを読み込み、フォントを登録する"""
+    from pdf_report_generator import register_fonts
+    register_fonts()
+
+
+def _render_report(job):
+    """1件分のPDFを一時ファイルに直接生成し、出力先を原子的に置き換える"""
+    from pdf_report_generator import generate_pdf_report
+
+    started = time.perf_counter()
+    tmp_path = job["path"] + ".tmp"
+    try:
+        generate_pdf_report(diagnostic_data=diagnostic_data, output=tmp_path, **job["report_args"])
+        os.replace(tmp_path, job["path"])
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return time.perf_counter() - started
+
+
+# ===== メイン処理 =====
+
+def build_jobs(respondents, answers, output_dir, skip_ids, radar_renderer="vector", mode="standard"):
+    """回答行列を一括採点し、未生成の回答者分のジョブを作る"""
+    scores = ScoringEngine(diagnostic_data).score(answers)
+    jobs = []
+    for i, respondent in enumerate(respondents):
+        if respondent["id"] in skip_ids:
+            continue
+        axis_scores, axis_max_scores, total_score, max_total_score, percentage = scores.row(i)
+        rank_idx = int(scores.rank_index[i])
+        jobs.append({
+            "id": respondent["id"],
+            "path": os.path.join(output_dir, _safe_filename(respondent["id"])),
+            "report_args": {
+                "axis_scores": axis_scores,
+                "axis_max_scores": axis_max_scores,
+                "total_score": total_score,
+                "max_total_score": max_total_score,
+                "percentage": percentage,
+                "rank": RANKS[rank_idx],
+                "rank_label": RANK_LABELS[rank_idx],
+                "company_name": respondent["company_name"],
+                "radar_renderer": radar_renderer,
+                "mode": mode,
+            },
+        })
+    return jobs
+
+
+def run_batch(jobs, output_dir, workers, invalid=(), recorded=frozenset()):
+    """
+    ジョブをプロセスプールで実行し、完了ごとに manifest に追記する
+
+    invalid（読み込み時に除外した回答者）は生成せず、失敗として manifest と failures に記録する
+    （recorded にある、前回までに manifest に記録済みの失敗は manifest に重ねて書かない）。
+
+    Returns:
+        tuple: (生成に成功した件の所要時間のリスト, 失敗の一覧（invalid を含む）)
+    """
+    timings = []
+    failures = list(invalid)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+
+    with open(manifest_path, "a", encoding="utf-8") as manifest, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        for entry in invalid:
+            if (entry["id"], entry["error"]) not in recorded:
+                manifest.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            print(f"{entry['id']}: 回答に不備があるためスキップします - {entry['error']}", file=sys.stderr)
+        manifest.flush()
+        futures = {pool.submit(_render_report, job): job for job in jobs}
+        for done, future in enumerate(as_completed(futures), 1):
+            job = futures[future]
+            try:
+                elapsed = future.result()
+                entry = {"id": job["id"], "status": "ok", "file": os.path.basename(job["path"]),
+                         "seconds": round(elapsed, 4)}
+                timings.append(elapsed)
+            except Exception as e:
+                entry = {"id": job["id"], "status": "error", "error": f"{type(e).__name__}: {e}"}
+                failures.append(entry)
+
+            manifest.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            manifest.flush()
+            print(f"[{done}/{len(jobs)}] {job['id']}: {entry['status']}"
+                  + (f" ({entry['seconds']:.2f}s)" if "seconds" in entry else f" - {entry['error']}"),
+                  file=sys.stderr)
+
+    with open(os.path.join(output_dir, FAILURES_NAME), "w", encoding="utf-8") as f:
+        for entry in failures:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    return timings, failures
+
+
+def write_zip(staging_dir, zip_path):
+    """作業ディレクトリのPDFと manifest をZIPにまとめる（一時ファイル経由）"""
+    tmp_path = zip_path + ".tmp"
+    with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for name in sorted(os.listdir(staging_dir)):
+            if name.endswith(".pdf") or name in (MANIFEST_NAME, FAILURES_NAME):
+                zf.write(os.path.join(staging_dir, name), arcname=name)
+    os.replace(tmp_path, zip_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="診断レポートPDFを一括生成します")
+    parser.add_argument("input", help="回答者ファイル（.csv / .json / .jsonl）")
+    dest = parser.add_mutually_exclusive_group(required=True)
+    dest.add_argument("--output-dir", help="PDFの出力ディレクトリ")
+    dest.add_argument("--zip", help="PDFをまとめるZIPファイル")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="ワーカープロセス数（既定: CPUコア数）")
+    parser.add_argument("--resume", action="store_true",
+                        help="manifest で成功済みの回答者をスキップして再開する")
+    parser.add_argument("--radar-renderer", choices=("vector", "matplotlib"), default="vector",
+                        help="レーダーチャートの描画方式（既定: vector）")
+    parser.add_argument("--mode", choices=("standard", "compact"), default="standard",
+                        help="PDFの出力モード（compact: ASCII85 なし・画像を縮小した小さいPDF）")
+    args = parser.parse_args(argv)
+
+    # ZIP出力時は隣の作業ディレクトリに生成し、最後にまとめる（中断後も再開可能）
+    output_dir = args.output_dir or args.zip + ".parts"
+    if not args.resume and os.path.exists(os.path.join(output_dir, MANIFEST_NAME)):
+        parser.error(f"{output_dir} に前回の manifest があります。再開する場合は --resume を指定してください")
+    os.makedirs(output_dir, exist_ok=True)
+
+    scoring_engine = ScoringEngine(diagnostic_data)
+    respondents, answers, invalid = load_respondents(args.input, scoring_engine.num_questions,
+                                                     scoring_engine.max_answer)
+    skip_ids, recorded = (_read_manifest(os.path.join(output_dir, MANIFEST_NAME)) if args.resume
+                          else (set(), set()))
+    jobs = build_jobs(respondents, answers, output_dir, skip_ids, args.radar_renderer, args.mode)
+
+    total = len(respondents) + len(invalid)
+    print(f"{total}件中 {len(jobs)}件を生成します（スキップ: {len(respondents) - len(jobs)}件, "
+          f"回答の不備: {len(invalid)}件, ワーカー: {args.workers}）", file=sys.stderr)
+
+    started = time.perf_counter()
+    timings, failures = run_batch(jobs, output_dir, args.workers, invalid, recorded)
+    wall = time.perf_counter() - started
+
+    if timings:
+        print(f"成功: {len(timings)}件 / 失敗: {len(failures)}件 / 全体: {wall:.1f}s / "
+              f"1件あたり 平均 {np.mean(timings):.2f}s, p95 {np.percentile(timings, 95):.2f}s",
+              file=sys.stderr)
+    if failures:
+        print(f"失敗一覧: {os.path.join(output_dir, FAILURES_NAME)}", file=sys.stderr)
+
+    if args.zip:
+        write_zip(output_dir, args.zip)
+        # 生成に失敗した件がなければ作業ディレクトリは不要（回答の不備は再開しても直らないため数えない）
+        if len(failures) == len(invalid):
+            shutil.rmtree(output_dir)
+        print(f"ZIPを出力しました: {args.zip}", file=sys.stderr)
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,293 @@
+"""
+ADAMS 事業推進力診断ツール - ベンチマークスイート
+
+採点・レーダーチャート描画・PDF生成・画面操作（intro → questions → results）の
+所要時間を計測し、パーセンタイル・ピークメモリ・PDFサイズを JSON に保存する。
+
+    python benchmark_suite.py --output bench.json
+    python benchmark_suite.py --only pdf --compare bench.json
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime
+
+import numpy as np
+
+from diagnostic_data import diagnostic_data
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# サンプル回答（全軸に差が出るよう固定の乱数で作る）
+_rng = np.random.default_rng(20240101)
+NUM_QUESTIONS = sum(len(axis_data["questions"]) for axis_data in diagnostic_data.values())
+
+
+def _sample_report_args(answers):
+    """回答1件分から generate_pdf_report() の引数を作る"""
+    from scoring_engine import ScoringEngine, RANKS, RANK_LABELS
+
+    scores = ScoringEngine(diagnostic_data).score(answers)
+    axis_scores, axis_max_scores, total_score, max_total_score, percentage = scores.row(0)
+    rank_idx = int(scores.rank_index[0])
+    return {
+        "axis_scores": axis_scores,
+        "axis_max_scores": axis_max_scores,
+        "total_score": total_score,
+        "max_total_score": max_total_score,
+        "percentage": percentage,
+        "rank": RANKS[rank_idx],
+        "rank_label": RANK_LABELS[rank_idx],
+        "company_name": "ベンチマーク株式会社",
+        "report_date": date(2024, 1, 1),
+    }
+
+
+# ===== 計測 =====
+
+def summarize(samples):
+    """所要時間（秒）のリストからパーセンタイルなどの統計を作る（単位: ミリ秒）"""
+    ms = np.array(samples) * 1000
+    return {
+        "n": len(ms),
+        "mean_ms": float(ms.mean()),
+        "min_ms": float(ms.min()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p90_ms": float(np.percentile(ms, 90)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+    }
+
+
+def measure(fn, repeat, warmup=1):
+    """fn を warmup 回空実行してから repeat 回計測し、別に1回 tracemalloc でピークメモリを測る"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    result = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stats = summarize(samples)
+    stats["peak_memory_kb"] = peak / 1024
+    if isinstance(result, (bytes, bytearray)):
+        stats["output_bytes"] = len(result)
+    elif hasattr(result, "getbuffer"):
+        stats["output_bytes"] = result.getbuffer().nbytes
+    return stats
+
+
+# ===== ベンチマーク =====
+
+def bench_scoring(repeat):
+    """calculate_scores() と同じ N=1 の採点と、N=10000 の一括採点"""
+    from answer_sheet import AnswerSheet
+    from scoring_engine import ScoringEngine
+
+    engine = ScoringEngine(diagnostic_data)
+    answers = _rng.integers(1, 5, size=(1, engine.num_questions))
+    session_answers = AnswerSheet.from_answers(answers[0].tolist())
+    batch = _rng.integers(1, 5, size=(10000, engine.num_questions))
+
+    return {
+        "scoring.calculate_scores": measure(
+            lambda: engine.score(engine.answers_from_session(session_answers)).row(0), repeat),
+        "scoring.batch_10000": measure(lambda: engine.score(batch), max(3, repeat // 10)),
+    }
+
+
+def bench_radar(repeat):
+    """画面用・PDF用の matplotlib 描画（キャッシュなし/あり）と reportlab のベクター描画"""
+    from radar_chart import RadarChartCache, render_radar_png, normalize_scores
+    from pdf_report_generator import build_radar_drawing
+
+    args = _sample_report_args(_rng.integers(1, 5, size=(1, NUM_QUESTIONS)))
+    scores = normalize_scores(args["axis_scores"], args["axis_max_scores"])
+    labels = [diagnostic_data[axis]["english_label"] for axis in args["axis_scores"]]
+    cache = RadarChartCache()
+
+    return {
+        "radar.matplotlib_web": measure(lambda: render_radar_png(scores, labels, "web"), max(3, repeat // 4)),
+        "radar.matplotlib_pdf": measure(lambda: render_radar_png(scores, labels, "pdf"), max(3, repeat // 4)),
+        "radar.cache_hit_web": measure(lambda: cache.get_png(scores, labels, "web"), repeat),
+        "radar.vector_pdf": measure(
+            lambda: build_radar_drawing(args["axis_scores"], args["axis_max_scores"], diagnostic_data), repeat),
+    }
+
+
+_COLD_PDF_SCRIPT = """
+import json, sys, time
+sys.path.insert(0, {here!r})
+started = time.perf_counter()
+from pdf_report_generator import generate_pdf_report
+from diagnostic_data import diagnostic_data
+from datetime import date
+args = json.loads(sys.argv[1])
+args["report_date"] = date.fromisoformat(args["report_date"])
+buffer = generate_pdf_report(diagnostic_data=diagnostic_data, **args)
+print(time.perf_counter() - started)
+"""
+
+
+def bench_pdf(repeat):
+    """PDF生成（フォント登録を含む新規プロセスでの初回 / 登録済みプロセスでの2回目以降）"""
+    from pdf_report_generator import generate_pdf_report, PDF_MODES
+
+    args = _sample_report_args(_rng.integers(1, 5, size=(1, NUM_QUESTIONS)))
+
+    # コールド: import・フォント登録・テンプレート構築を含めて新規プロセスで計測
+    payload = json.dumps({**args, "report_date": args["report_date"].isoformat()}, ensure_ascii=False)
+    script = _COLD_PDF_SCRIPT.format(here=HERE)
+    cold = []
+    for _ in range(max(3, repeat // 4)):
+        output = subprocess.run([sys.executable, "-c", script, payload],
+                                check=True, capture_output=True, text=True).stdout
+        cold.append(float(output.strip().splitlines()[-1]))
+
+    results = {"pdf.cold_process": summarize(cold)}
+    # 出力モードごとのサイズと所要時間（standard は従来の名前のまま記録し、過去の結果と比較できるようにする）
+    for renderer in ("vector", "matplotlib"):
+        for mode in PDF_MODES:
+            name = f"pdf.warm_{renderer}" if mode == "standard" else f"pdf.warm_{renderer}_{mode}"
+            results[name] = measure(
+                lambda: generate_pdf_report(diagnostic_data=diagnostic_data, radar_renderer=renderer, mode=mode,
+                                            **args),
+                repeat)
+
+    # BytesIO を経由せずファイルに直接書き込む場合
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "report.pdf")
+        results["pdf.warm_vector_to_file"] = measure(
+            lambda: generate_pdf_report(diagnostic_data=diagnostic_data, output=path, **args), repeat)
+        results["pdf.warm_vector_to_file"]["output_bytes"] = os.path.getsize(path)
+    return results
+
+
+def bench_session(repeat):
+    """Streamlit AppTest で intro → questions → 全問回答 → results → PDFのダウンロード準備 を通しで操作"""
+    from streamlit.testing.v1 import AppTest
+
+    # 計測対象以外のバックグラウンド処理は止める
+    os.environ.setdefault("ADAMS_WARMUP", "0")
+    os.environ.setdefault("ADAMS_RESULT_SINK", "none")
+    app_path = os.path.join(HERE, "streamlit_app.py")
+    stages = {"intro": [], "questions": [], "answer_all": [], "results": [], "pdf": []}
+
+    def session():
+        at = AppTest.from_file(app_path, default_timeout=120)
+        started = time.perf_counter()
+        at.run()
+        stages["intro"].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        at.button[0].click().run()
+        stages["questions"].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        for radio in at.radio:
+            radio.set_value(int(_rng.integers(1, 5)))
+        at.run()
+        stages["answer_all"].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        next(b for b in at.button if "診断結果" in b.label).click().run()
+        stages["results"].append(time.perf_counter() - started)
+
+        # PDFは結果ページの表示時にバックグラウンドで生成されるため、ダウンロードボタンが出るまでを計測する
+        started = time.perf_counter()
+        while not at.get("download_button"):
+            if time.perf_counter() - started > 120:
+                raise RuntimeError("PDFの生成が終わりません")
+            time.sleep(0.05)
+            at.run()
+        stages["pdf"].append(time.perf_counter() - started)
+
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+
+    runs = max(2, repeat // 5)
+    total = []
+    for _ in range(runs + 1):
+        started = time.perf_counter()
+        session()
+        total.append(time.perf_counter() - started)
+
+    # 1回目はモジュールの読み込みを含むため除外する
+    results = {"session.total": summarize(total[1:])}
+    for stage, samples in stages.items():
+        results[f"session.{stage}"] = summarize(samples[1:])
+    return results
+
+
+BENCHMARKS = {
+    "scoring": bench_scoring,
+    "radar": bench_radar,
+    "pdf": bench_pdf,
+    "session": bench_session,
+}
+
+
+# ===== 出力 =====
+
+def print_results(results, baseline=None):
+    baseline = (baseline or {}).get("results", {})
+    print(f"{'benchmark':32} {'p50 ms':>10} {'p90 ms':>10} {'p99 ms':>10} {'peak KB':>10} {'bytes':>10}  vs baseline")
+    for name, stats in results.items():
+        line = (f"{name:32} {stats['p50_ms']:10.2f} {stats['p90_ms']:10.2f} {stats['p99_ms']:10.2f} "
+                f"{stats.get('peak_memory_kb', float('nan')):10.0f} {stats.get('output_bytes', ''):>10}")
+        if name in baseline:
+            change = (stats["p50_ms"] / baseline[name]["p50_ms"] - 1) * 100
+            line += f"  {change:+.1f}% (p50)"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="診断ツールのホットパスを計測します")
+    parser.add_argument("--repeat", type=int, default=20, help="各ベンチマークの計測回数")
+    parser.add_argument("--only", action="append", choices=sorted(BENCHMARKS),
+                        help="実行するベンチマーク群（複数指定可）")
+    parser.add_argument("--output", help="結果を保存する JSON ファイル")
+    parser.add_argument("--compare", help="比較対象の結果 JSON ファイル")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name in args.only or BENCHMARKS:
+        print(f"running {name} ...", file=sys.stderr)
+        results.update(BENCHMARKS[name](args.repeat))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if args.output:
+        report = {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"saved {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""
+ADAMS 事業推進力診断ツール - 保存済み診断結果の集計（コホート分析）
+
+result_sink の SQLite（diagnoses テーブル）に追記された診断結果を、
+前回集計した行ID以降の分だけ読み込んで集計テーブルに加算する。
+ダッシュボードは集計テーブルだけを読むため、保存件数が増えても表示は重くならない。
+行IDの読み出しから集計の加算・行IDの更新までを1つの書き込みトランザクションで行うため、
+ダッシュボードの複数のレプリカやこのCLIが同時に集計しても同じ行を二重に数えない。
+
+    python cohort_analytics.py --db data/diagnoses.sqlite3
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from collections import Counter
+
+from answer_codec import AnswerCodeError, decode_answers
+from questionnaire import get_questionnaire
+from result_sink import DEFAULT_DB_PATH, SQLiteSink
+
+# 1回のトランザクションで取り込む行数
+REFRESH_CHUNK = 5000
+
+# 総合スコアを軸と同じテーブルで扱うための名前
+TOTAL_AXIS = "総合"
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS agg_state (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS agg_axis_hist (
+        axis TEXT NOT NULL,
+        score INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (axis, score)
+    );
+    CREATE TABLE IF NOT EXISTS agg_question_hist (
+        question INTEGER NOT NULL,
+        answer INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (question, answer)
+    );
+    CREATE TABLE IF NOT EXISTS agg_rank (
+        rank TEXT PRIMARY KEY,
+        count INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS agg_daily (
+        day TEXT NOT NULL,
+        axis TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        score_sum INTEGER NOT NULL,
+        PRIMARY KEY (day, axis)
+    );
+    CREATE TABLE IF NOT EXISTS agg_daily_rank (
+        day TEXT NOT NULL,
+        rank TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (day, rank)
+    );
+"""
+
+
+class IncrementalAggregator:
+    """
+    diagnoses テーブルの行IDをウォーターマークにした増分集計の共通部分
+
+    サブクラスは集計テーブルの SCHEMA、ウォーターマークの名前（agg_state のキー）と、
+    取り込んだ行を集計テーブルに加算する _apply(conn, rows) を定義する。
+    参照用の接続（self.conn）はスレッド間で共有し、取り込みは refresh() ごとに開く接続で行う
+    （共有の接続でトランザクションを始めると、同時に refresh() したスレッドどうしが衝突するため）。
+    同じインスタンスの refresh() は1つずつ行い、後から呼んだ側は先の取り込みが終わってから残りを取り込む。
+    """
+
+    SCHEMA = ""
+    WATERMARK = "last_row_id"
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        self.db_path = db_path
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._import_lock = threading.Lock()
+        self.conn = self._connect()
+        self.conn.execute(SQLiteSink.SCHEMA)
+        self.conn.executescript(self.SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+
+    def _watermark(self, conn):
+        row = conn.execute("SELECT value FROM agg_state WHERE name = ?", (self.WATERMARK,)).fetchone()
+        return row[0] if row else 0
+
+    def refresh(self, chunk=REFRESH_CHUNK):
+        """
+        前回の集計以降に追加された行を集計テーブルに加算する
+
+        Returns:
+            int: 新たに取り込んだ行数
+        """
+        processed = 0
+        with self._import_lock:
+            conn = self._connect()
+            try:
+                while True:
+                    # 行IDの読み出しから更新までを書き込みロックの中で行う（他のプロセスと同じ行を取り込まない）
+                    conn.execute("BEGIN IMMEDIATE")
+                    with conn:
+                        rows = conn.execute(
+                            "SELECT id, created_at, payload FROM diagnoses WHERE id > ? ORDER BY id LIMIT ?",
+                            (self._watermark(conn), chunk),
+                        ).fetchall()
+                        if rows:
+                            self._apply(conn, rows)
+                            conn.execute(
+                                "INSERT INTO agg_state VALUES (?, ?) "
+                                "ON CONFLICT (name) DO UPDATE SET value = excluded.value",
+                                (self.WATERMARK, rows[-1][0]),
+                            )
+                    if not rows:
+                        return processed
+                    processed += len(rows)
+            finally:
+                conn.close()
+
+    def _apply(self, conn, rows):
+        """取り込んだ行 [(id, created_at, payload)] を conn で集計テーブルに加算する（refresh() のトランザクション内で呼ぶ）"""
+        raise NotImplementedError
+
+    def close(self):
+        self.conn.close()
+
+
+class CohortAggregates(IncrementalAggregator):
+    """診断結果の増分集計（件数・合計・ヒストグラム）"""
+
+    SCHEMA = SCHEMA
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, questionnaire=None):
+        self.questionnaire = questionnaire or get_questionnaire()
+        self.axis_names = list(self.questionnaire.axis_names)
+        self.axis_max_scores = dict(self.questionnaire.axis_max_scores)
+        self.axis_max_scores[TOTAL_AXIS] = self.questionnaire.max_total_score
+        super().__init__(db_path)
+
+    # ===== 増分集計 =====
+
+    def _apply(self, conn, rows):
+        axis_hist = Counter()
+        question_hist = Counter()
+        ranks = Counter()
+        daily = Counter()
+        daily_sums = Counter()
+        daily_ranks = Counter()
+
+        for _, created_at, payload in rows:
+            try:
+                result = json.loads(payload)
+            except ValueError:
+                continue
+            day = created_at[:10]
+            scores = {axis: result.get(f"{axis}スコア") for axis in self.axis_names}
+            if None in scores.values():
+                continue
+            scores[TOTAL_AXIS] = result.get("総合スコア", sum(scores.values()))
+
+            for axis, score in scores.items():
+                axis_hist[(axis, score)] += 1
+                daily[(day, axis)] += 1
+                daily_sums[(day, axis)] += score
+            for question, answer in enumerate(self._answers(result)):
+                question_hist[(question, answer)] += 1
+            ranks[result.get("ランク", "?")] += 1
+            daily_ranks[(day, result.get("ランク", "?"))] += 1
+
+        conn.executemany(
+            "INSERT INTO agg_axis_hist VALUES (?, ?, ?) "
+            "ON CONFLICT (axis, score) DO UPDATE SET count = count + excluded.count",
+            [(axis, score, count) for (axis, score), count in axis_hist.items()],
+        )
+        conn.executemany(
+            "INSERT INTO agg_question_hist VALUES (?, ?, ?) "
+            "ON CONFLICT (question, answer) DO UPDATE SET count = count + excluded.count",
+            [(question, answer, count) for (question, answer), count in question_hist.items()],
+        )
+        conn.executemany(
+            "INSERT INTO agg_rank VALUES (?, ?) "
+            "ON CONFLICT (rank) DO UPDATE SET count = count + excluded.count",
+            list(ranks.items()),
+        )
+        conn.executemany(
+            "INSERT INTO agg_daily VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (day, axis) DO UPDATE SET count = count + excluded.count, "
+            "score_sum = score_sum + excluded.score_sum",
+            [(day, axis, count, daily_sums[(day, axis)]) for (day, axis), count in daily.items()],
+        )
+        conn.executemany(
+            "INSERT INTO agg_daily_rank VALUES (?, ?, ?) "
+            "ON CONFLICT (day, rank) DO UPDATE SET count = count + excluded.count",
+            [(day, rank, count) for (day, rank), count in daily_ranks.items()],
+        )
+
+    def _answers(self, result):
+        """保存行の設問ごとの回答（回答コード、または以前の形式の回答リスト）"""
+        if "回答コード" in result:
+            try:
+                return decode_answers(result["回答コード"], self.questionnaire)
+            except AnswerCodeError:
+                return []  # 別の診断票の回答は設問別の集計に含めない
+        return result.get("回答", [])
+
+    # ===== 集計結果の参照 =====
+
+    def total_count(self):
+        row = self.conn.execute(
+            "SELECT SUM(count) FROM agg_axis_hist WHERE axis = ?", (TOTAL_AXIS,)
+        ).fetchone()
+        return row[0] or 0
+
+    def axis_histograms(self):
+        """軸（と総合）ごとのスコア分布 {軸: {スコア: 件数}}"""
+        hist = {axis: {} for axis in [*self.axis_names, TOTAL_AXIS]}
+        for axis, score, count in self.conn.execute(
+                "SELECT axis, score, count FROM agg_axis_hist ORDER BY axis, score"):
+            hist.setdefault(axis, {})[score] = count
+        return hist
+
+    def axis_summary(self):
+        """軸ごとの件数・平均スコア・平均達成率(%)"""
+        summary = {}
+        for axis, hist in self.axis_histograms().items():
+            count = sum(hist.values())
+            mean = sum(score * n for score, n in hist.items()) / count if count else 0.0
+            summary[axis] = {
+                "count": count,
+                "mean": mean,
+                "mean_pct": mean / self.axis_max_scores[axis] * 100 if axis in self.axis_max_scores else 0.0,
+            }
+        return summary
+
+    def question_histograms(self):
+        """設問（0始まりの通し番号）ごとの回答分布 {設問: {回答: 件数}}"""
+        hist = {}
+        for question, answer, count in self.conn.execute(
+                "SELECT question, answer, count FROM agg_question_hist ORDER BY question, answer"):
+            hist.setdefault(question, {})[answer] = count
+        return hist
+
+    def rank_mix(self):
+        return dict(self.conn.execute("SELECT rank, count FROM agg_rank ORDER BY rank").fetchall())
+
+    def daily_trend(self):
+        """日ごとの件数と各軸の平均達成率(%) [(日付, 軸, 件数, 平均達成率)]"""
+        return [
+            (day, axis, count, score_sum / count / self.axis_max_scores[axis] * 100)
+            for day, axis, count, score_sum in self.conn.execute(
+                "SELECT day, axis, count, score_sum FROM agg_daily ORDER BY day")
+            if axis in self.axis_max_scores
+        ]
+
+    def daily_rank_mix(self):
+        """日ごとのランク構成 [(日付, ランク, 件数)]"""
+        return self.conn.execute("SELECT day, rank, count FROM agg_daily_rank ORDER BY day, rank").fetchall()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="保存済み診断結果の集計テーブルを更新します")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    args = parser.parse_args(argv)
+
+    aggregates = CohortAggregates(args.db)
+    processed = aggregates.refresh()
+    print(f"{processed}件を集計しました（累計 {aggregates.total_count()}件）")
+    for rank, count in aggregates.rank_mix().items():
+        print(f"  ランク{rank}: {count}件")
+    aggregates.close()
+
+
+if __name__ == "__main__":
+    main()
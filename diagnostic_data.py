@@ -0,0 +1,20 @@
+"""
+ADAMS 事業推進力診断ツール - 診断データ定義モジュール
+
+設問・改善テーマの定義は instruments/ の診断票ファイルに移した（questionnaire.py 参照）。
+このモジュールは既定の診断票を従来の辞書形式で公開する。
+Streamlit に依存しないため、画面・PDF・バッチ処理のいずれからも読み込める。
+
+import 時点の定義を固定して返すため、ファイルの更新を反映したい場合は
+questionnaire.get_questionnaire() を使う。
+"""
+
+from questionnaire import get_questionnaire
+
+_questionnaire = get_questionnaire()
+
+# 診断データ（軸名 → english_label / icon / questions / improvement_themes）
+diagnostic_data = _questionnaire.diagnostic_data
+
+# 回答オプション（点数 → 表示名）
+options = _questionnaire.options
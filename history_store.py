@@ -0,0 +1,214 @@
+"""
+ADAMS 事業推進力診断ツール - 企業ごとの再診断履歴
+
+企業名を入力した診断結果を SQLite に記録し、前回・直近N回の診断を
+（担当者, 企業キー, 診断日時）の索引で引く。参照は1社分の索引範囲だけを読むため、
+記録件数（担当企業数）が増えても前回の診断の取得時間は変わらない。
+
+履歴は担当者（コンサルタント）ごとに分け、アクセストークン付きのURL（?history=<トークン>）で
+開いたセッションだけが記録・参照できる。トークンのないセッションは他社の結果を見られない。
+
+    ADAMS_HISTORY_DB      保存先（既定: 診断結果と同じ data/diagnoses.sqlite3）
+    ADAMS_HISTORY_TOKENS  担当者ごとのトークン（"担当者ID:トークン" のカンマ区切り。未設定なら履歴は無効）
+"""
+
+import hmac
+import json
+import os
+import sqlite3
+import threading
+import unicodedata
+from dataclasses import dataclass
+from datetime import datetime
+
+from result_sink import DEFAULT_DB_PATH
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        owner TEXT NOT NULL DEFAULT '',
+        company_key TEXT NOT NULL,
+        company_name TEXT NOT NULL,
+        diagnosed_at TEXT NOT NULL,
+        instrument TEXT NOT NULL,
+        answer_code TEXT NOT NULL,
+        total_score INTEGER NOT NULL,
+        max_total_score INTEGER NOT NULL,
+        percentage REAL NOT NULL,
+        axis_scores TEXT NOT NULL
+    );
+"""
+
+INDEX = "CREATE INDEX IF NOT EXISTS history_owner_company_date " \
+        "ON history (owner, company_key, diagnosed_at DESC, id DESC)"
+
+
+def history_owner(token, tokens=None):
+    """
+    アクセストークンに対応する担当者ID
+
+    Args:
+        token: URL の ?history= の値
+        tokens: "担当者ID:トークン" のカンマ区切り（既定: ADAMS_HISTORY_TOKENS）
+
+    Returns:
+        str: 担当者ID（トークンが空・不一致、または設定がなければ None）
+    """
+    tokens = os.environ.get("ADAMS_HISTORY_TOKENS", "") if tokens is None else tokens
+    if not token:
+        return None
+    owner = None
+    for entry in tokens.split(","):
+        entry_owner, _, entry_token = entry.strip().partition(":")
+        # 一致した時点で抜けず、全件と比べる（照合時間からトークンを推測させない）
+        if entry_owner and entry_token and hmac.compare_digest(token.encode("utf-8"),
+                                                               entry_token.encode("utf-8")):
+            owner = entry_owner
+    return owner
+
+
+def company_key(company_name):
+    """企業名の照合用キー（全角・半角、大文字・小文字、空白の違いを無視する）"""
+    return "".join(unicodedata.normalize("NFKC", company_name).casefold().split())
+
+
+@dataclass
+class HistoryEntry:
+    """履歴の1件（axis_scores は軸名 → 点数）"""
+    id: int
+    company_name: str
+    diagnosed_at: datetime
+    instrument: str
+    answer_code: str
+    total_score: int
+    max_total_score: int
+    percentage: float
+    axis_scores: dict
+
+    def as_previous(self):
+        """generate_pdf_report(previous=...) に渡す形"""
+        return {
+            "diagnosed_at": self.diagnosed_at.date(),
+            "axis_scores": self.axis_scores,
+            "total_score": self.total_score,
+            "max_total_score": self.max_total_score,
+            "percentage": self.percentage,
+        }
+
+
+def score_deltas(previous_axis_scores, axis_scores, axis_max_scores):
+    """
+    前回と今回の軸スコアの差分（両方にある軸だけ。診断票の改訂で軸が変わっても比較できる範囲で出す）
+
+    Returns:
+        list: 軸ごとの (軸名, 前回, 今回, 差分, 最大点) のタプル
+    """
+    return [
+        (axis_name, previous_axis_scores[axis_name], score, score - previous_axis_scores[axis_name],
+         axis_max_scores[axis_name])
+        for axis_name, score in axis_scores.items()
+        if axis_name in previous_axis_scores
+    ]
+
+
+def format_delta(diff):
+    """差分の表記（▲ 増加 / ▼ 減少 / ± 変化なし）"""
+    if diff > 0:
+        return f"▲ {diff}"
+    if diff < 0:
+        return f"▼ {-diff}"
+    return "± 0"
+
+
+class HistoryStore:
+    """担当者・企業ごとの診断履歴（複数のスクリプトスレッドから1つの接続を共有する）"""
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+        self._lock = threading.Lock()
+
+    def _migrate(self):
+        """担当者の列がない履歴（以前の形式）に列を追加する（既存の行はどの担当者からも参照されない）"""
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(history)")]
+        with self.conn:
+            if "owner" not in columns:
+                self.conn.execute("ALTER TABLE history ADD COLUMN owner TEXT NOT NULL DEFAULT ''")
+            self.conn.execute("DROP INDEX IF EXISTS history_company_date")
+            self.conn.execute(INDEX)
+
+    def record(self, owner, company_name, questionnaire, answer_code, axis_scores, total_score, percentage,
+               diagnosed_at=None):
+        """
+        担当者の履歴に診断結果を記録する（同じ企業・同じ日に同じ回答が記録済みなら、その行を使う）
+
+        Returns:
+            int: 記録した（または記録済みの）行ID
+        """
+        diagnosed_at = diagnosed_at or datetime.now()
+        key = company_key(company_name)
+        with self._lock, self.conn:
+            row = self.conn.execute(
+                "SELECT id FROM history WHERE owner = ? AND company_key = ? AND answer_code = ? "
+                "AND instrument = ? AND substr(diagnosed_at, 1, 10) = ? LIMIT 1",
+                (owner, key, answer_code, questionnaire.key, diagnosed_at.date().isoformat()),
+            ).fetchone()
+            if row is not None:
+                return row[0]
+            cursor = self.conn.execute(
+                "INSERT INTO history (owner, company_key, company_name, diagnosed_at, instrument, answer_code, "
+                "total_score, max_total_score, percentage, axis_scores) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (owner, key, company_name.strip(), diagnosed_at.isoformat(timespec="seconds"), questionnaire.key,
+                 answer_code, total_score, questionnaire.max_total_score, percentage,
+                 json.dumps(axis_scores, ensure_ascii=False)),
+            )
+            return cursor.lastrowid
+
+    def _select(self, where, params, n):
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT id, company_name, diagnosed_at, instrument, answer_code, total_score, max_total_score, "
+                f"percentage, axis_scores FROM history WHERE {where} "
+                "ORDER BY diagnosed_at DESC, id DESC LIMIT ?",
+                (*params, n),
+            ).fetchall()
+        return [
+            HistoryEntry(row_id, name, datetime.fromisoformat(diagnosed_at), instrument, answer_code,
+                         total_score, max_total_score, percentage, json.loads(axis_scores))
+            for row_id, name, diagnosed_at, instrument, answer_code, total_score, max_total_score,
+            percentage, axis_scores in rows
+        ]
+
+    def latest(self, owner, company_name, n=5):
+        """担当者の履歴にある企業の直近 n 回の診断（新しい順）"""
+        return self._select("owner = ? AND company_key = ?", (owner, company_key(company_name)), n)
+
+    def previous(self, owner, company_name, current_id):
+        """current_id の診断の直前の診断（なければ None。後から別の診断が記録されていても変わらない）"""
+        entries = self._select(
+            "owner = ? AND company_key = ? "
+            "AND (diagnosed_at, id) < (SELECT diagnosed_at, id FROM history WHERE id = ?)",
+            (owner, company_key(company_name), current_id), 1)
+        return entries[0] if entries else None
+
+    def close(self):
+        self.conn.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_history_store():
+    """プロセス内で共有する履歴ストア"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            default_path = os.environ.get("ADAMS_RESULT_DB", DEFAULT_DB_PATH)
+            _store = HistoryStore(os.environ.get("ADAMS_HISTORY_DB", default_path))
+        return _store
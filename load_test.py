@@ -0,0 +1,466 @@
+"""
+ADAMS 事業推進力診断ツール - 同時セッションの負荷試験
+
+ローカルに起動した Streamlit アプリ（--url で起動済みのアプリも指定できる）に、
+ブラウザと同じ WebSocket のメッセージ（BackMsg / ForwardMsg）で N 人の仮想ユーザーを
+同時に接続し、intro → 全問回答 → results → PDFのダウンロード を操作する。
+ページごとの応答時間（p50/p95/p99）とエラー率、サーバープロセスの CPU 使用率・RSS の推移
+（/proc から1秒ごとに取得）を表示し、JSON に保存する。
+
+    python load_test.py --users 20 --think-time 1.0 --output load.json
+    python load_test.py --url http://127.0.0.1:8501 --pid 12345 --users 50 --ramp-up 30
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+import urllib.request
+from datetime import datetime
+from http.cookies import SimpleCookie
+
+import numpy as np
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# 計測する段階（answer は1問ごと、pdf_ready は結果ページの表示からダウンロードボタンが出るまで）
+STAGES = ("intro", "questions", "answer", "results", "pdf_ready", "pdf_download")
+
+# 画面のボタン（ラベルの一部で探す）
+START_BUTTON = "診断を始める"
+RESULTS_BUTTON = "診断結果を見る"
+
+XSRF_COOKIE_NAME = "_streamlit_xsrf"
+
+# 実行が途中で打ち切られて再実行される場合（st.rerun）は、続く実行の完了まで待つ
+_FINISHED = (ForwardMsg.FINISHED_SUCCESSFULLY, ForwardMsg.FINISHED_FRAGMENT_RUN_SUCCESSFULLY)
+
+
+class StageError(Exception):
+    """画面の操作に失敗した（スクリプトの例外・要素が見つからない・タイムアウト）"""
+
+
+# ===== 仮想ユーザー =====
+
+class VirtualUser:
+    """1セッション分のブラウザの代わり（ウィジェットの状態を保持し、再実行を要求する）"""
+
+    def __init__(self, base_url, query_string="", timeout=120.0):
+        self.base_url = base_url.rstrip("/")
+        self.query_string = query_string
+        self.timeout = timeout
+        self.ws = None
+        self.page_script_hash = ""
+        self.widget_states = {}   # ウィジェットID -> WidgetState（ブラウザと同じく毎回すべて送る）
+        self.buttons = {}         # ラベル -> ウィジェットID
+        self.radios = {}          # ウィジェットID -> (選択肢, フラグメントID)
+        self.download_url = None
+        self.auto_reruns = {}     # フラグメントID -> 間隔（秒）
+        self.exceptions = []
+
+    async def connect(self):
+        """WebSocket で接続する（XSRF 保護が有効なら、トップページで受け取ったトークンを添える）"""
+        xsrf_token = await asyncio.to_thread(self._fetch_xsrf_token)
+        parsed = urllib.parse.urlsplit(self.base_url)
+        scheme = "wss" if parsed.scheme == "https" else "ws"
+        headers = {"Cookie": f"{XSRF_COOKIE_NAME}={xsrf_token}"} if xsrf_token else {}
+        self.ws = await websockets.connect(
+            f"{scheme}://{parsed.netloc}{parsed.path}/_stcore/stream",
+            subprotocols=["streamlit", xsrf_token] if xsrf_token else ["streamlit"],
+            additional_headers=headers, max_size=None, open_timeout=self.timeout)
+
+    def _fetch_xsrf_token(self):
+        with urllib.request.urlopen(self.base_url + "/", timeout=self.timeout) as response:
+            cookie = SimpleCookie()
+            for header in response.headers.get_all("Set-Cookie") or ():
+                cookie.load(header)
+        return cookie[XSRF_COOKIE_NAME].value if XSRF_COOKIE_NAME in cookie else None
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+
+    async def rerun(self, triggers=(), fragment_id="", auto=False):
+        """スクリプトの再実行を要求し、実行が終わるまで画面の更新を受け取る"""
+        msg = BackMsg()
+        client_state = msg.rerun_script
+        client_state.query_string = self.query_string
+        client_state.page_script_hash = self.page_script_hash
+        client_state.fragment_id = fragment_id
+        client_state.is_auto_rerun = auto
+        client_state.widget_states.widgets.extend(self.widget_states.values())
+        for widget_id in triggers:
+            client_state.widget_states.widgets.add(id=widget_id, trigger_value=True)
+        if not fragment_id:
+            # ページ全体の再実行では画面が作り直されるため、要素の一覧も作り直す
+            self.buttons.clear()
+            self.radios.clear()
+            self.download_url = None
+        await self.ws.send(msg.SerializeToString())
+        await asyncio.wait_for(self._receive_until_finished(), self.timeout)
+        if self.exceptions:
+            raise StageError(self.exceptions.pop())
+
+    async def _receive_until_finished(self):
+        while True:
+            msg = ForwardMsg()
+            msg.ParseFromString(await self.ws.recv())
+            kind = msg.WhichOneof("type")
+            if kind == "new_session":
+                self.page_script_hash = msg.new_session.page_script_hash
+            elif kind == "delta" and msg.delta.WhichOneof("type") == "new_element":
+                self._on_element(msg.delta.new_element, msg.delta.fragment_id)
+            elif kind == "auto_rerun":
+                self.auto_reruns[msg.auto_rerun.fragment_id] = msg.auto_rerun.interval
+            elif kind == "stop_auto_rerun":
+                self.auto_reruns.clear()
+            elif kind == "script_finished" and msg.script_finished in _FINISHED:
+                return
+
+    def _on_element(self, element, fragment_id):
+        kind = element.WhichOneof("type")
+        if kind == "button":
+            self.buttons[element.button.label] = element.button.id
+        elif kind == "radio":
+            self.radios[element.radio.id] = (list(element.radio.options), fragment_id)
+        elif kind == "download_button":
+            self.download_url = element.download_button.url
+        elif kind == "exception":
+            self.exceptions.append(f"{element.exception.type}: {element.exception.message}")
+
+    def button(self, label):
+        for button_label, widget_id in self.buttons.items():
+            if label in button_label:
+                return widget_id
+        raise StageError(f"ボタンが見つかりません: {label}")
+
+    async def click(self, label):
+        await self.rerun(triggers=(self.button(label),))
+
+    async def choose(self, widget_id, option):
+        """ラジオボタンの選択（値は表示文字列で送る。ラジオを含むフラグメントだけが再実行される）"""
+        _, fragment_id = self.radios[widget_id]
+        self.widget_states[widget_id] = WidgetState(id=widget_id, string_value=option)
+        await self.rerun(fragment_id=fragment_id)
+
+    async def wait_for_download(self, poll_timeout):
+        """PDFの生成中は st.fragment(run_every=...) の自動再実行をブラウザと同じ間隔で送る"""
+        started = time.perf_counter()
+        while self.download_url is None:
+            if time.perf_counter() - started > poll_timeout:
+                raise StageError("PDFのダウンロードボタンが表示されません")
+            if not self.auto_reruns:
+                raise StageError("PDFの生成状況を確認するフラグメントがありません")
+            fragment_id, interval = next(iter(self.auto_reruns.items()))
+            await asyncio.sleep(interval)
+            await self.rerun(fragment_id=fragment_id, auto=True)
+
+    async def download(self):
+        """ダウンロードボタンのURLからPDFを取得する（PDFでなければエラー。バイト数を返す）"""
+        url = urllib.parse.urljoin(self.base_url + "/", self.download_url.lstrip("/"))
+
+        def fetch():
+            with urllib.request.urlopen(url, timeout=self.timeout) as response:
+                body = response.read()
+            if not body.startswith(b"%PDF"):
+                raise StageError(f"PDFではない応答です（{len(body)}バイト）")
+            return len(body)
+        return await asyncio.to_thread(fetch)
+
+
+# ===== シナリオ =====
+
+class LoadTest:
+    """仮想ユーザーの並行実行と、段階ごとの所要時間・エラーの記録"""
+
+    def __init__(self, base_url, users, iterations=1, ramp_up=0.0, think_time=1.0, page_think_time=2.0,
+                 jitter=0.5, query_string="", timeout=120.0, seed=None):
+        self.base_url = base_url
+        self.users = users
+        self.iterations = iterations
+        self.ramp_up = ramp_up
+        self.think_time = think_time
+        self.page_think_time = page_think_time
+        self.jitter = jitter
+        self.query_string = query_string
+        self.timeout = timeout
+        self.random = random.Random(seed)
+        self.samples = {stage: [] for stage in STAGES}
+        self.errors = {stage: [] for stage in STAGES}
+        self.active_users = 0
+        self.completed = 0
+
+    async def think(self, seconds):
+        """考える時間（平均 seconds 秒、±jitter の割合で揺らす）"""
+        if seconds > 0:
+            await asyncio.sleep(seconds * self.random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    async def timed(self, stage, operation):
+        started = time.perf_counter()
+        try:
+            result = await operation
+        except (StageError, asyncio.TimeoutError, OSError, websockets.ConnectionClosed) as e:
+            self.errors[stage].append(f"{type(e).__name__}: {e}")
+            raise StageError(f"{stage}: {e}") from e
+        self.samples[stage].append(time.perf_counter() - started)
+        return result
+
+    async def walk(self, user):
+        """1人分の診断（intro → 全問回答 → results → PDF）"""
+        async def open_intro():
+            await user.connect()
+            await user.rerun()
+
+        await self.timed("intro", open_intro())
+        await self.think(self.page_think_time)
+        await self.timed("questions", user.click(START_BUTTON))
+
+        for widget_id, (options, _) in list(user.radios.items()):
+            await self.think(self.think_time)
+            await self.timed("answer", user.choose(widget_id, self.random.choice(options)))
+
+        await self.think(self.page_think_time)
+        await self.timed("results", user.click(RESULTS_BUTTON))
+        await self.timed("pdf_ready", user.wait_for_download(self.timeout))
+        await self.timed("pdf_download", user.download())
+
+    async def run_user(self, index):
+        await asyncio.sleep(self.ramp_up * index / max(self.users, 1))
+        for _ in range(self.iterations):
+            user = VirtualUser(self.base_url, self.query_string, self.timeout)
+            self.active_users += 1
+            try:
+                await self.walk(user)
+                self.completed += 1
+            except StageError:
+                pass  # 失敗した段階は errors に記録済み。次の周回は新しいセッションで始める
+            finally:
+                self.active_users -= 1
+                try:
+                    await user.close()
+                except Exception:
+                    pass
+
+    async def run(self, sampler=None):
+        sampler_task = asyncio.create_task(sampler.run(self)) if sampler else None
+        started = time.perf_counter()
+        await asyncio.gather(*[self.run_user(index) for index in range(self.users)])
+        elapsed = time.perf_counter() - started
+        if sampler_task:
+            sampler_task.cancel()
+        return elapsed
+
+    def summary(self):
+        """段階ごとの件数・エラー率・パーセンタイル（ミリ秒）"""
+        stats = {}
+        for stage in STAGES:
+            ms = np.array(self.samples[stage]) * 1000
+            attempts = len(ms) + len(self.errors[stage])
+            stats[stage] = {
+                "n": len(ms),
+                "errors": len(self.errors[stage]),
+                "error_rate": len(self.errors[stage]) / attempts if attempts else 0.0,
+                **({
+                    "mean_ms": float(ms.mean()),
+                    "p50_ms": float(np.percentile(ms, 50)),
+                    "p95_ms": float(np.percentile(ms, 95)),
+                    "p99_ms": float(np.percentile(ms, 99)),
+                    "max_ms": float(ms.max()),
+                } if len(ms) else {}),
+            }
+        return stats
+
+
+# ===== サーバーの CPU・メモリ =====
+
+class ProcessSampler:
+    """/proc/<pid> から CPU 使用率（%、1コア=100）と RSS を一定間隔で記録する（Linux のみ）"""
+
+    def __init__(self, pid, interval=1.0):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._clock_ticks = os.sysconf("SC_CLK_TCK")
+
+    def available(self):
+        return os.path.exists(f"/proc/{self.pid}/stat")
+
+    def _read(self):
+        with open(f"/proc/{self.pid}/stat") as f:
+            # 2番目の項目（実行ファイル名）に空白を含みうるため、閉じ括弧より後ろを分割する
+            fields = f.read().rsplit(")", 1)[1].split()
+        cpu_seconds = (int(fields[11]) + int(fields[12])) / self._clock_ticks  # utime + stime
+        rss_kb = 0
+        with open(f"/proc/{self.pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss_kb = int(line.split()[1])
+                    break
+        return cpu_seconds, rss_kb
+
+    async def run(self, load_test):
+        started = time.perf_counter()
+        previous_wall, previous_cpu = started, self._read()[0]
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                cpu_seconds, rss_kb = self._read()
+            except OSError:
+                return  # プロセスが終了した
+            now = time.perf_counter()
+            self.samples.append({
+                "t": round(now - started, 2),
+                "cpu_percent": (cpu_seconds - previous_cpu) / (now - previous_wall) * 100,
+                "rss_mb": rss_kb / 1024,
+                "active_users": load_test.active_users,
+                "completed": load_test.completed,
+            })
+            previous_wall, previous_cpu = now, cpu_seconds
+
+    def summary(self):
+        if not self.samples:
+            return {}
+        cpu = [sample["cpu_percent"] for sample in self.samples]
+        rss = [sample["rss_mb"] for sample in self.samples]
+        return {
+            "cpu_percent_mean": sum(cpu) / len(cpu),
+            "cpu_percent_max": max(cpu),
+            "rss_mb_first": rss[0],
+            "rss_mb_max": max(rss),
+            "rss_mb_last": rss[-1],
+        }
+
+
+# ===== アプリの起動 =====
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_app(port, log_path):
+    """
+    streamlit run で診断アプリを起動し、ヘルスチェックが通るまで待つ
+
+    結果の保存とウォームアップ以外は本番と同じ設定にする（環境変数で上書きできる）。
+    PDFのキャッシュは試験ごとに空のディレクトリを使う。
+
+    Returns:
+        subprocess.Popen: 起動したプロセス
+    """
+    env = dict(os.environ)
+    env.setdefault("ADAMS_RESULT_SINK", "none")
+    env.setdefault("ADAMS_PDF_CACHE_DIR", tempfile.mkdtemp(prefix="adams-load-pdf-"))
+    log = open(log_path, "w", encoding="utf-8")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", os.path.join(HERE, "streamlit_app.py"),
+         "--server.port", str(port), "--server.address", "127.0.0.1",
+         "--server.headless", "true", "--browser.gatherUsageStats", "false"],
+        cwd=HERE, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    health_url = f"http://127.0.0.1:{port}/_stcore/health"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"アプリが起動しませんでした（ログ: {log_path}）")
+        try:
+            with urllib.request.urlopen(health_url, timeout=1) as response:
+                if response.status == 200:
+                    return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"アプリのヘルスチェックが通りません（ログ: {log_path}）")
+
+
+# ===== 出力 =====
+
+def print_summary(stats, resources, elapsed, load_test):
+    print(f"{load_test.users} users x {load_test.iterations} iterations: "
+          f"{load_test.completed} completed in {elapsed:.1f}s")
+    print(f"{'stage':14} {'n':>6} {'error':>7} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'max ms':>10}")
+    for stage, stage_stats in stats.items():
+        line = f"{stage:14} {stage_stats['n']:6d} {stage_stats['error_rate']:6.1%}"
+        if stage_stats["n"]:
+            line += "".join(f" {stage_stats[key]:10.1f}" for key in ("p50_ms", "p95_ms", "p99_ms", "max_ms"))
+        print(line)
+    if resources:
+        print(f"server CPU {resources['cpu_percent_mean']:.0f}% mean / {resources['cpu_percent_max']:.0f}% max, "
+              f"RSS {resources['rss_mb_first']:.0f} -> {resources['rss_mb_max']:.0f} MB max")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="同時セッションの負荷試験を行います")
+    parser.add_argument("--users", type=int, default=10, help="同時に操作する仮想ユーザー数")
+    parser.add_argument("--iterations", type=int, default=1, help="1ユーザーあたりの診断回数")
+    parser.add_argument("--ramp-up", type=float, default=10.0, help="全ユーザーが開始するまでの秒数")
+    parser.add_argument("--think-time", type=float, default=1.0, help="設問ごとの考える時間（秒、平均）")
+    parser.add_argument("--page-think-time", type=float, default=2.0, help="ページを読む時間（秒、平均）")
+    parser.add_argument("--jitter", type=float, default=0.5, help="考える時間の揺らぎ（平均に対する割合）")
+    parser.add_argument("--query", default="", help="URLのクエリ文字列（例: instrument=adams-business）")
+    parser.add_argument("--timeout", type=float, default=120.0, help="1操作あたりのタイムアウト（秒）")
+    parser.add_argument("--url", help="起動済みのアプリのURL（省略時はローカルで起動する）")
+    parser.add_argument("--pid", type=int, help="--url のアプリのプロセスID（CPU・RSS を記録する）")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="CPU・RSS の記録間隔（秒）")
+    parser.add_argument("--seed", type=int, help="回答と考える時間の乱数シード")
+    parser.add_argument("--output", help="結果を保存する JSON ファイル")
+    args = parser.parse_args(argv)
+
+    process = None
+    if args.url:
+        base_url, pid = args.url, args.pid
+    else:
+        port = _free_port()
+        log_path = os.path.join(tempfile.gettempdir(), f"adams-load-test-{port}.log")
+        print(f"starting app on port {port} (log: {log_path}) ...", file=sys.stderr)
+        process = start_app(port, log_path)
+        base_url, pid = f"http://127.0.0.1:{port}", process.pid
+
+    sampler = ProcessSampler(pid, args.sample_interval) if pid else None
+    if sampler and not sampler.available():
+        print(f"/proc/{pid} を読めないため CPU・RSS は記録しません", file=sys.stderr)
+        sampler = None
+
+    load_test = LoadTest(base_url, args.users, args.iterations, args.ramp_up, args.think_time,
+                         args.page_think_time, args.jitter, args.query, args.timeout, args.seed)
+    try:
+        elapsed = asyncio.run(load_test.run(sampler))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    stats = load_test.summary()
+    resources = sampler.summary() if sampler else {}
+    print_summary(stats, resources, elapsed, load_test)
+
+    if args.output:
+        report = {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "config": {name: value for name, value in vars(args).items() if name != "output"},
+            "elapsed_seconds": elapsed,
+            "completed": load_test.completed,
+            "stages": stats,
+            "errors": {stage: messages[:20] for stage, messages in load_test.errors.items() if messages},
+            "resources": resources,
+            "timeline": sampler.samples if sampler else [],
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"saved {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""
+ADAMS 事業推進力診断ツール - 処理時間の計測とメトリクス出力
+
+結果ページ・PDF生成の各段階やページ遷移の所要時間を、プロセス内のカウンタと
+ヒストグラムに記録し、Prometheus のテキスト形式で出力する。記録は
+perf_counter とロック付きの加算だけなので、本番でも常時有効にしておける。
+
+出力先（どちらも未設定なら記録のみ）:
+    ADAMS_METRICS_FILE      一定間隔で書き出すファイル（node_exporter の textfile collector 形式）
+    ADAMS_METRICS_INTERVAL  書き出し間隔（秒、既定: 15）
+    ADAMS_METRICS_PORT      /metrics を返す HTTP サーバーのポート
+"""
+
+import atexit
+import logging
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# 所要時間（秒）のバケット境界。画面の1段階（数ms）からPDF生成（数秒）までを覆う
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = [*zip(labelnames, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """単調増加のカウンタ（ラベルの値の組ごと）"""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels[name] for name in self.labelnames), 0)
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge:
+    """任意に上下する値（ラベルの値の組ごと。最後に set() した値を出力する）"""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels[name] for name in self.labelnames), 0)
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram:
+    """固定バケットのヒストグラム（件数・合計・バケットごとの件数）"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # ラベルの値の組 -> [バケットごとの件数（累積前、最後は +Inf）, 合計]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, **labels):
+        series = self._series.get(tuple(labels[name] for name in self.labelnames))
+        return sum(series[0]) if series else 0
+
+    def render(self):
+        with self._lock:
+            snapshot = sorted((key, list(counts), total) for key, (counts, total) in self._series.items())
+        for key, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, (("le", _format_value(bound)),))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class MetricsRegistry:
+    """メトリクスの登録と Prometheus テキスト形式への書き出し"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"{name} は別の種類のメトリクスとして登録済みです")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets)
+
+    def add_collector(self, collect):
+        """出力のたびに呼ぶ関数を登録する（ゲージを出力時点の値に更新するため）"""
+        with self._lock:
+            if collect not in self._collectors:
+                self._collectors.append(collect)
+
+    def render(self):
+        """全メトリクスを Prometheus のテキスト形式（exposition format 0.0.4）で返す"""
+        with self._lock:
+            collectors = list(self._collectors)
+        for collect in collectors:
+            try:
+                collect()
+            except Exception:
+                logger.exception("メトリクスの集計に失敗しました: %s", getattr(collect, "__qualname__", collect))
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        """ファイルに書き出す（読み手が書きかけを見ないよう、一時ファイルから置き換える）"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".metrics-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(self.render())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "adams_stage_duration_seconds", "結果ページ・PDF生成の処理段階ごとの所要時間（秒）", ("stage",))
+STAGE_ERRORS = REGISTRY.counter(
+    "adams_stage_errors_total", "例外で終了した処理段階の回数", ("stage",))
+PAGE_SECONDS = REGISTRY.histogram(
+    "adams_page_render_duration_seconds", "ページごとのスクリプト実行時間（秒）", ("page",))
+PAGE_TRANSITIONS = REGISTRY.counter(
+    "adams_page_transitions_total", "ページ遷移の回数（from_page=start はセッション開始）", ("from_page", "to_page"))
+
+
+@contextmanager
+def span(stage, histogram=STAGE_SECONDS, errors=STAGE_ERRORS, label="stage"):
+    """
+    with ブロックの所要時間をヒストグラムに記録する
+
+    例外で抜けた場合も時間は記録し、エラー回数を数える。st.rerun() / st.stop() は
+    BaseException のためエラーには数えない。
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        if errors is not None:
+            errors.inc(**{label: stage})
+        raise
+    finally:
+        histogram.observe(time.perf_counter() - started, **{label: stage})
+
+
+def page_span(page):
+    """ページ1回分の描画の所要時間を記録する"""
+    return span(page, histogram=PAGE_SECONDS, errors=None, label="page")
+
+
+# ===== 出力 =====
+
+def _serve_http(host, port):
+    """/metrics を返す HTTP サーバーを作る（http.server は使うときだけ読み込む）"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = REGISTRY.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), MetricsHandler)
+
+
+def _write_periodically(path, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            REGISTRY.write_textfile(path)
+        except OSError as e:
+            logger.warning("メトリクスの書き出しに失敗しました: %s", e)
+
+
+_exporter_lock = threading.Lock()
+_exporter_started = False
+
+
+def start_exporter():
+    """環境変数の設定に従って出力を開始する（プロセスごとに1回だけ）"""
+    global _exporter_started
+    with _exporter_lock:
+        if _exporter_started:
+            return
+        _exporter_started = True
+
+    path = os.environ.get("ADAMS_METRICS_FILE")
+    if path:
+        interval = float(os.environ.get("ADAMS_METRICS_INTERVAL", "15"))
+        threading.Thread(target=_write_periodically, args=(path, interval),
+                         name="adams-metrics-file", daemon=True).start()
+        atexit.register(REGISTRY.write_textfile, path)
+
+    port = os.environ.get("ADAMS_METRICS_PORT")
+    if port:
+        try:
+            server = _serve_http(os.environ.get("ADAMS_METRICS_HOST", "127.0.0.1"), int(port))
+        except OSError as e:
+            logger.warning("メトリクスのHTTPサーバーを起動できません: %s", e)
+            return
+        threading.Thread(target=server.serve_forever, name="adams-metrics-http", daemon=True).start()
+        logger.info("メトリクスを http://%s:%s/metrics で公開しています", *server.server_address[:2])
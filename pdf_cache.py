@@ -0,0 +1,199 @@
+"""
+ADAMS 事業推進力診断ツール - PDFレポートのディスクキャッシュ
+
+レポートの入力（スコア・企業名・診断日・描画方式）とテンプレートのバージョン、
+診断データの内容から作ったハッシュをキーに、生成済みPDFをディスクに保存する。
+同じホスト上の複数の Streamlit レプリカから共有でき、合計サイズが上限を超えたら
+最終利用が古いものから削除する。
+
+    ADAMS_PDF_CACHE_DIR     保存先（既定: <一時ディレクトリ>/adams_pdf_cache）
+    ADAMS_PDF_CACHE_MAX_MB  合計サイズの上限（既定: 512）
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from metrics import REGISTRY
+
+try:
+    import fcntl
+except ImportError:  # Windows ではプロセス間ロックなしで動かす
+    fcntl = None
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "adams_pdf_cache")
+DEFAULT_MAX_MB = 512
+
+_LOCK_NAME = ".lock"
+
+CACHE_REQUESTS = REGISTRY.counter(
+    "adams_pdf_cache_requests_total", "PDFキャッシュの参照回数（result=hit/miss）", ("result",))
+
+
+def _fingerprint(diagnostic_data):
+    """診断データ（設問・改善テーマの文面）の内容ハッシュ"""
+    payload = json.dumps(diagnostic_data, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class PDFDiskCache:
+    """内容アドレス方式のPDFキャッシュ（ファイル名 = 入力のハッシュ）"""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._fingerprints = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # ===== キー =====
+
+    def make_key(self, report_args, diagnostic_data, template_version):
+        """generate_pdf_report() に渡す引数からキャッシュキーを作る"""
+        # 診断票の再読み込みで作られた辞書の id が再利用されないよう、辞書への参照も保持する
+        data_id = id(diagnostic_data)
+        if data_id not in self._fingerprints:
+            self._fingerprints[data_id] = (diagnostic_data, _fingerprint(diagnostic_data))
+
+        canonical = {
+            "template_version": template_version,
+            "diagnostic_data": self._fingerprints[data_id][1],
+            # 辞書は軸の順序がレイアウトに影響するため、順序付きのペアにする
+            **{name: (list(value.items()) if isinstance(value, dict) else value)
+               for name, value in report_args.items()},
+        }
+        payload = json.dumps(canonical, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path_for(self, key):
+        # 1ディレクトリのファイル数を抑えるため先頭2文字で振り分ける
+        return os.path.join(self.directory, key[:2], key + ".pdf")
+
+    # ===== 読み書き =====
+
+    def get(self, key):
+        """キャッシュ済みのPDFのパス（なければ None）。利用時刻を更新して LRU の順序に反映する"""
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put_from(self, key, write):
+        """
+        write(path) で一時ファイルにPDFを書き込み、rename でキャッシュに追加する
+        （他プロセスに書きかけを見せない）
+
+        Returns:
+            file: 追加したPDFを読み込み用に開いたファイル（直後に追い出されても読める）
+        """
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        os.close(fd)
+        try:
+            write(tmp_path)
+            f = open(tmp_path, "rb")
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        self.evict()
+        return f
+
+    def open_or_build(self, key, build_to):
+        """
+        キャッシュにあればそのPDFを開き、なければ build_to(path) で生成して保存する
+
+        PDF をメモリに読み込まずにファイルとして返すため、呼び出し側は
+        一定の大きさずつ読み出して、一定のメモリのまま送り出せる。
+
+        Args:
+            key: make_key() で作ったキー
+            build_to: 渡されたパスにPDFを書き込む関数
+
+        Returns:
+            file: PDF を読み込み用に開いたファイル（呼び出し側で閉じる）
+        """
+        path = self.get(key)
+        if path is not None:
+            try:
+                f = open(path, "rb")
+                self.hits += 1
+                CACHE_REQUESTS.inc(result="hit")
+                return f
+            except FileNotFoundError:
+                pass  # 開く直前に他のレプリカが削除した
+
+        self.misses += 1
+        CACHE_REQUESTS.inc(result="miss")
+        return self.put_from(key, build_to)
+
+    # ===== 追い出し =====
+
+    def _entries(self):
+        for sub in os.scandir(self.directory):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if entry.name.endswith(".pdf"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    yield entry.path, stat.st_size, stat.st_mtime
+
+    def evict(self):
+        """合計サイズが上限を超えていたら、最終利用が古いものから削除する（レプリカ間で排他）"""
+        with open(os.path.join(self.directory, _LOCK_NAME), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                entries = sorted(self._entries(), key=lambda entry: entry[2])
+                total = sum(size for _, size, _ in entries)
+                for path, size, _ in entries:
+                    if total <= self.max_bytes:
+                        break
+                    try:
+                        os.unlink(path)
+                    except FileNotFoundError:
+                        pass
+                    total -= size
+                    self.evictions += 1
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def stats(self):
+        entries = list(self._entries())
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "files": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+        }
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_default_cache():
+    """環境変数の設定で作るプロセス共有のキャッシュ"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = PDFDiskCache(
+                directory=os.environ.get("ADAMS_PDF_CACHE_DIR", DEFAULT_CACHE_DIR),
+                max_bytes=int(float(os.environ.get("ADAMS_PDF_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024),
+            )
+        return _default_cache
+
@@ -0,0 +1,150 @@
+"""
+ADAMS 事業推進力診断ツール - PDFレポートのバックグラウンド生成
+
+結果ページの表示時にPDF生成をバックグラウンドのジョブとして投入し、
+スクリプトの実行を待たせずにディスクキャッシュ（pdf_cache）へ書き込む。
+ジョブはキャッシュキー（入力のハッシュ）で重複を除くため、同じ結果を開いた
+複数のセッションや再描画から何度投入しても生成は1回だけになる。
+
+    ADAMS_PDF_JOB_WORKERS  生成を行うスレッド数（既定: 1）
+"""
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date
+
+from metrics import REGISTRY, span
+from pdf_cache import get_default_cache
+
+logger = logging.getLogger(__name__)
+
+# 状態を保持しておく完了済みジョブの数（超えたら古いものから忘れる。PDF自体はキャッシュに残る）
+MAX_FINISHED_JOBS = 1024
+
+PDF_JOBS = REGISTRY.counter(
+    "adams_pdf_jobs_total", "PDF生成ジョブの投入と結果（result=submitted/deduplicated/done/error）", ("result",))
+
+
+class PDFJobManager:
+    """キャッシュキーごとに1つだけ実行されるPDF生成ジョブの管理"""
+
+    def __init__(self, cache=None, workers=1):
+        self.cache = cache or get_default_cache()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="adams-pdf-job")
+        self._jobs = OrderedDict()  # キー -> (Future, 生成関数)
+        self._lock = threading.Lock()
+
+    def key_for(self, diagnostic_data, report_args):
+        """generate_pdf_report() の引数からジョブ（＝キャッシュ）のキーを作る"""
+        from pdf_report_generator import REPORT_TEMPLATE_VERSION
+        return self.cache.make_key(report_args, diagnostic_data, REPORT_TEMPLATE_VERSION)
+
+    @staticmethod
+    def _builder(diagnostic_data, report_args):
+        from pdf_report_generator import generate_pdf_report
+        return lambda path: generate_pdf_report(diagnostic_data=diagnostic_data, output=path, **report_args)
+
+    def _run(self, key, build_to):
+        try:
+            with span("pdf.job"):
+                self.cache.open_or_build(key, build_to).close()
+        except Exception:
+            PDF_JOBS.inc(result="error")
+            logger.exception("PDF生成ジョブに失敗しました: %s", key)
+            raise
+        PDF_JOBS.inc(result="done")
+
+    def submit(self, diagnostic_data, **report_args):
+        """
+        PDF生成ジョブを投入する（同じ入力のジョブが投入済みなら何もしない。失敗したジョブは
+        discard() するまで再実行しない）
+
+        report_date を省略すると今日の日付で固定する（日付もキーの一部になる）。
+
+        Returns:
+            str: ジョブのキー（status() / open() に渡す）
+        """
+        if report_args.get("report_date") is None:
+            report_args["report_date"] = date.today()
+        key = self.key_for(diagnostic_data, report_args)
+
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None:
+                PDF_JOBS.inc(result="deduplicated")
+                return key
+            build_to = self._builder(diagnostic_data, report_args)
+            if self.cache.get(key) is None:
+                future = self._executor.submit(self._run, key, build_to)
+                PDF_JOBS.inc(result="submitted")
+            else:
+                # 他のレプリカや以前のプロセスが生成済み
+                future = Future()
+                future.set_result(None)
+            self._jobs[key] = (future, build_to)
+            self._jobs.move_to_end(key)
+            self._forget_finished()
+        return key
+
+    def _forget_finished(self):
+        finished = [key for key, (future, _) in self._jobs.items() if future.done()]
+        for key in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[key]
+
+    def status(self, key):
+        """
+        ジョブの状態
+
+        Returns:
+            str: "running" / "done" / "error"、未投入なら None
+        """
+        job = self._jobs.get(key)
+        if job is None:
+            return "done" if self.cache.get(key) is not None else None
+        future = job[0]
+        if not future.done():
+            return "running"
+        return "error" if future.exception() is not None else "done"
+
+    def error(self, key):
+        """失敗したジョブの例外（失敗していなければ None）"""
+        job = self._jobs.get(key)
+        if job is None or not job[0].done():
+            return None
+        return job[0].exception()
+
+    def discard(self, key):
+        """ジョブの記録を消す（失敗したジョブを次の submit() で再実行するため）"""
+        with self._lock:
+            self._jobs.pop(key, None)
+
+    def open(self, key):
+        """
+        完了したジョブのPDFを開く（完了後にキャッシュから追い出されていたら、その場で生成し直す）
+
+        Returns:
+            file: PDF を読み込み用に開いたファイル（呼び出し側で閉じる）
+        """
+        job = self._jobs.get(key)
+        if job is None:
+            path = self.cache.get(key)
+            if path is None:
+                raise KeyError(f"PDF生成ジョブがありません: {key}")
+            return open(path, "rb")
+        return self.cache.open_or_build(key, job[1])
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_pdf_jobs():
+    """プロセス内で共有するジョブ管理（全セッションで重複を除く）"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = PDFJobManager(workers=int(os.environ.get("ADAMS_PDF_JOB_WORKERS", "1")))
+        return _manager
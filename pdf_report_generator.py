@@ -5,40 +5,499 @@ ADAMS 事業推進力診断ツール - PDF診断レポート生成モジュー
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
 from reportlab.lib.units import mm
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Image
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Image, KeepTogether
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase import pdfdoc, pdfmetrics
+from reportlab.pdfbase.pdfutils import asciiBase85Decode
+from reportlab.pdfgen.canvas import Canvas
 from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.graphics.shapes import Drawing
+from reportlab.graphics.shapes import Drawing, Circle, String
 from reportlab.graphics.charts.spider import SpiderChart
+from functools import lru_cache
 from io import BytesIO
 from datetime import datetime
-import matplotlib.pyplot as plt
-import numpy as np
+from math import pi, cos, sin
+from xml.sax.saxutils import escape
+import copy
+import os
+import threading
+
+from metrics import span
 
 # ハイブリッドフォント設定: 英数字=Arial、日本語=Noto Sans CJK
-try:
-    # 日本語フォントの登録
-    pdfmetrics.registerFont(TTFont('NotoSans', '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc', subfontIndex=0))
-    pdfmetrics.registerFont(TTFont('NotoSans-Bold', '/usr/share/fonts/opentype/noto/NotoSansCJK-Bold.ttc', subfontIndex=0))
-    FONT_NAME = 'NotoSans'
-    FONT_BOLD = 'NotoSans-Bold'
-except Exception as e:
-    # フォールバック: 標準フォントを使用
-    from reportlab.pdfbase.cidfonts import UnicodeCIDFont
-    pdfmetrics.registerFont(UnicodeCIDFont('HeiseiMin-W3'))
-    pdfmetrics.registerFont(UnicodeCIDFont('HeiseiKakuGo-W5'))
-    FONT_NAME = 'HeiseiMin-W3'
-    FONT_BOLD = 'HeiseiKakuGo-W5'
+# .ttc の読み込みは重いため import 時ではなく register_fonts() の初回呼び出しで登録する
+FONT_NAME = None
+FONT_BOLD = None
+_font_lock = threading.Lock()
+
+# 埋め込まない日本語フォント（閲覧側のフォントで表示される。Noto Sans CJK がない環境のフォールバック用）
+CID_FONT_NAME = 'HeiseiMin-W3'
+CID_FONT_BOLD = 'HeiseiKakuGo-W5'
+_cid_registered = False
+
+
+def _register_cid_fonts():
+    global _cid_registered
+    if not _cid_registered:
+        from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+        pdfmetrics.registerFont(UnicodeCIDFont(CID_FONT_NAME))
+        pdfmetrics.registerFont(UnicodeCIDFont(CID_FONT_BOLD))
+        _cid_registered = True
+    return CID_FONT_NAME, CID_FONT_BOLD
+
+
+def register_fonts():
+    """日本語フォントを登録（プロセスごとに1回だけ。2回目以降は登録済みの名前を返す）"""
+    global FONT_NAME, FONT_BOLD
+    with _font_lock:
+        if FONT_NAME is not None:
+            return FONT_NAME, FONT_BOLD
+        try:
+            # 日本語フォントの登録
+            pdfmetrics.registerFont(TTFont('NotoSans', '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc', subfontIndex=0))
+            pdfmetrics.registerFont(TTFont('NotoSans-Bold', '/usr/share/fonts/opentype/noto/NotoSansCJK-Bold.ttc', subfontIndex=0))
+            FONT_BOLD = 'NotoSans-Bold'
+            FONT_NAME = 'NotoSans'
+        except Exception as e:
+            # フォールバック: 標準フォントを使用
+            FONT_NAME, FONT_BOLD = _register_cid_fonts()
+        return FONT_NAME, FONT_BOLD
 
 # ADAMSブランドカラー
 ADAMS_NAVY = colors.HexColor('#243666')
 ADAMS_ACCENT = colors.HexColor('#4a90e2')
 ADAMS_GOLD = colors.HexColor('#d4af37')
+# 前回の診断（レーダーチャートの破線）と比較表の増減の色
+PREVIOUS_COLOR = colors.HexColor('#888888')
+DELTA_UP_COLOR = colors.HexColor('#2e7d32')
+DELTA_DOWN_COLOR = colors.HexColor('#c62828')
+
+# レポートテンプレートのバージョン（レイアウトや文面を変えたら上げる。PDFキャッシュのキーに含まれる）
+REPORT_TEMPLATE_VERSION = 4
+
+# レーダーチャートの描画方式（vector: reportlab のベクター描画 / matplotlib: PNG 埋め込み）
+RADAR_RENDERERS = ("vector", "matplotlib")
+
+# 出力モード
+#   standard  日本語フォントを埋め込み（サブセット）、ストリームは ASCII85 + Flate
+#   compact   メール送付・保管向け。ストリームは Flate のみ（_FlateOnlyDocument）、
+#             PNG のチャートは配置サイズに合わせて縮小し透過を外す
+# 日本語フォントはどちらのモードも、登録済み（解析済み）の TTFont から使った文字だけを埋め込む
+PDF_MODES = ("standard", "compact")
+# compact で埋め込む画像の解像度の上限（配置サイズに対する ppi）と色数
+COMPACT_IMAGE_PPI = 110
+COMPACT_IMAGE_COLORS = 64
+
+
+
+class _FlateOnlyDocument(pdfdoc.PDFDocument):
+    """
+    ストリームを Flate のみで書き出す PDFDocument（compact モード用）
+
+    reportlab は ASCII85 の有無をプロセス全体の rl_config.useA85 から決めるため、
+    設定は変えずにこの文書のページと画像のストリームだけ ASCII85 を外す。
+    """
+
+    def addPage(self, page):
+        # PDFPage.check_format と同じストリームを、フィルタを Flate のみにして先に作っておく
+        if not page.Contents and page.stream:
+            contents = pdfdoc.PDFStream()
+            if page.compression:
+                contents.filters = [pdfdoc.PDFZCompress]
+            contents.content = page.stream
+            contents.__Comment__ = "page stream"
+            page.Contents = contents
+        super().addPage(page)
+
+    def Reference(self, obj, name=None):
+        if isinstance(obj, pdfdoc.PDFImageXObject) and obj._filters[:1] == ('ASCII85Decode',):
+            obj.streamContent = asciiBase85Decode(obj.streamContent)
+            obj._filters = obj._filters[1:]
+        return super().Reference(obj, name)
+
+
+class _FlateOnlyCanvas(Canvas):
+    """_FlateOnlyDocument に書き出す Canvas（doc.build の canvasmaker）"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._doc.__class__ = _FlateOnlyDocument
+
+
+@lru_cache(maxsize=32)
+def downsample_png(png, width, ppi=COMPACT_IMAGE_PPI, colors=COMPACT_IMAGE_COLORS):
+    """
+    PNG を配置幅 width（ポイント）で ppi になる大きさまで縮小し、透過を白で塗りつぶして減色する
+
+    reportlab は透過を別の画像（SMask）として埋め込むため、不透明にするだけでも小さくなる。
+    同じチャートの画像（レーダーチャートのキャッシュが返す同じPNG）は変換済みの結果を使い回す。
+
+    Returns:
+        bytes: PNG データ
+    """
+    from PIL import Image as PILImage
+
+    img = PILImage.open(BytesIO(png))
+    target_width = round(width / 72 * ppi)
+    if img.width > target_width:
+        img = img.resize((target_width, round(img.height * target_width / img.width)), PILImage.LANCZOS)
+    if img.mode != "RGB":
+        background = PILImage.new("RGB", img.size, "white")
+        background.paste(img, mask=img.convert("RGBA").getchannel("A"))
+        img = background
+    # 線と塗りの数色に縁のぼかしが加わる程度の画像のため、少ない色数でも見た目は変わらない
+    img = img.quantize(colors).convert("RGB")
+    out = BytesIO()
+    img.save(out, format="PNG", optimize=True)
+    return out.getvalue()
+
+
+def build_radar_drawing(axis_scores, axis_max_scores, diagnostic_data, size=80*mm, previous_axis_scores=None):
+    """
+    reportlab のベクター図形でレーダーチャートを作成（matplotlib 版と同じ軸配置・0〜4 の目盛り）
+
+    previous_axis_scores を指定すると前回の診断を灰色の破線で重ねる（前回にない軸は今回の値で埋める）。
+
+    Returns:
+        Drawing: PDFにそのまま配置できる図形
+    """
+    labels = list(axis_scores.keys())
+    scores = [axis_scores[label] / axis_max_scores[label] * 4 for label in labels]
+
+    drawing = Drawing(size, size)
+    cx = cy = size / 2
+    radius = size * 0.36  # 外側に英語ラベルの余白を残す
+
+    # 背景と同心円の目盛り（1〜4）
+    drawing.add(Circle(cx, cy, radius, fillColor=colors.HexColor('#f8f9fa'), strokeColor=None))
+    for ring in (1, 2, 3, 4):
+        drawing.add(Circle(cx, cy, radius * ring / 4, fillColor=None,
+                           strokeColor=colors.HexColor('#c8c8c8'), strokeWidth=0.6))
+        drawing.add(String(cx + 2, cy + radius * ring / 4 + 1, str(ring),
+                           fontName='Helvetica', fontSize=6, fillColor=colors.grey))
+
+    chart = SpiderChart()
+    chart.x = cx - radius
+    chart.y = cy - radius
+    chart.width = chart.height = radius * 2
+    # matplotlib の極座標と同じく右（東）から反時計回りに配置
+    chart.startAngle = 0
+    chart.direction = 'anticlockwise'
+    # 2本目は最大値 4 の透明な系列（目盛りの外周を 4 に固定するため）
+    chart.data = [scores, [4] * len(labels)]
+    if previous_axis_scores is not None:
+        chart.data.append([previous_axis_scores.get(label, axis_scores[label]) / axis_max_scores[label] * 4
+                           for label in labels])
+    chart.labels = [diagnostic_data[label]["english_label"] for label in labels]
+
+    chart.strands[0].strokeColor = ADAMS_NAVY
+    chart.strands[0].strokeWidth = 1.5
+    chart.strands[0].fillColor = colors.Color(*ADAMS_ACCENT.rgb(), alpha=0.25)
+    chart.strands[1].strokeColor = None
+    chart.strands[1].strokeWidth = 0
+    chart.strands[1].fillColor = None
+    chart.strands[2].strokeColor = PREVIOUS_COLOR
+    chart.strands[2].strokeWidth = 1
+    chart.strands[2].strokeDashArray = (3, 2)
+    chart.strands[2].fillColor = None
+
+    chart.spokes.strokeColor = colors.HexColor('#c8c8c8')
+    chart.spokes.strokeWidth = 0.6
+    chart.spokes.labelRadius = 1.1
+    chart.spokeLabels.fontName = 'Helvetica-Bold'
+    chart.spokeLabels.fontSize = 7
+    chart.spokeLabels.fillColor = colors.black
+    drawing.add(chart)
+
+    # データ点のマーカー
+    n = len(scores)
+    for i, score in enumerate(scores):
+        angle = 2 * pi * i / n
+        r = radius * score / 4
+        drawing.add(Circle(cx + r * cos(angle), cy + r * sin(angle), 2,
+                           fillColor=ADAMS_NAVY, strokeColor=None))
+
+    return drawing
+
+
+def build_delta_section(template, previous, axis_scores, axis_max_scores, total_score, max_total_score):
+    """
+    前回の診断との比較（見出しと軸ごとの差分表）
+
+    Returns:
+        list: KeepTogether に渡すフローアブル
+    """
+    from history_store import format_delta, score_deltas
+
+    previous_date = previous["diagnosed_at"].strftime('%Y年%m月%d日')
+    heading = Paragraph(f"【前回の診断との比較】（前回: {previous_date}）", template.heading2_style)
+
+    rows = [['診断軸', '前回', '今回', '増減']]
+    diffs = []
+    for axis_name, before, after, diff, max_score in score_deltas(previous["axis_scores"], axis_scores,
+                                                                  axis_max_scores):
+        rows.append([axis_name, f"{before} / {max_score}", f"{after} / {max_score}", format_delta(diff)])
+        diffs.append(diff)
+    total_diff = total_score - previous["total_score"]
+    rows.append(['総合スコア', f"{previous['total_score']} / {previous['max_total_score']}",
+                 f"{total_score} / {max_total_score}", format_delta(total_diff)])
+    diffs.append(total_diff)
+
+    table = Table(rows, colWidths=[60*mm, 35*mm, 35*mm, 20*mm])
+    table.setStyle(template.delta_table_style)
+    # 増加は緑、減少は赤で示す
+    table.setStyle(TableStyle([
+        ('TEXTCOLOR', (3, row), (3, row), DELTA_UP_COLOR if diff > 0 else DELTA_DOWN_COLOR)
+        for row, diff in enumerate(diffs, start=1) if diff != 0
+    ]))
+    return [heading, table]
+
+
+class ReportTemplate:
+    """
+    レポートの静的部分（スタイル・表スタイル・固定文面の段落）をまとめたテンプレート
+
+    回答者に依存しない部分はプロセスごとに1回だけ組み立て、各レポートでは
+    評価表・チャート・スコア表・TOP3 などの動的な部分だけを追加する。
+    段落は解析済みのものを浅いコピーで使い回す（レイアウト結果を複数スレッドで共有しないため）。
+    """
+
+    def __init__(self, fonts=None):
+        font_name, font_bold = fonts or register_fonts()
+        
+        # スタイルシート
+        styles = getSampleStyleSheet()
+        
+        # カスタムスタイルの定義
+        self.title_style = ParagraphStyle(
+            'CustomTitle',
+            fontName=font_bold,
+            fontSize=24,
+            textColor=ADAMS_NAVY,
+            alignment=TA_CENTER,
+            spaceAfter=20,
+            leading=30
+        )
+        
+        self.heading1_style = ParagraphStyle(
+            'CustomHeading1',
+            fontName=font_bold,
+            fontSize=18,
+            textColor=ADAMS_NAVY,
+            spaceAfter=12,
+            spaceBefore=12,
+            leading=24
+        )
+        
+        self.heading2_style = ParagraphStyle(
+            'CustomHeading2',
+            fontName=font_bold,
+            fontSize=14,
+            textColor=ADAMS_NAVY,
+            spaceAfter=10,
+            spaceBefore=10,
+            leading=18
+        )
+        
+        self.body_style = ParagraphStyle(
+            'CustomBody',
+            fontName=font_name,
+            fontSize=10,
+            leading=16,
+            spaceAfter=6
+        )
+        
+        self.small_style = ParagraphStyle(
+            'CustomSmall',
+            fontName=font_name,
+            fontSize=8,
+            textColor=colors.grey,
+            alignment=TA_RIGHT,
+            leading=12
+        )
+        
+        self.company_style = ParagraphStyle(
+            'Company',
+            parent=styles['Normal'],
+            fontName=font_bold,
+            fontSize=16,
+            alignment=TA_CENTER,
+            spaceAfter=10
+        )
+        
+        self.date_style = ParagraphStyle(
+            'Date',
+            parent=styles['Normal'],
+            fontName=font_name,
+            fontSize=12,
+            alignment=TA_CENTER
+        )
+        
+        # 総合評価テーブル（セル結合レイアウト）
+        self.eval_table_style = TableStyle([
+            # フォント設定（Arial）
+            ('FONT', (0, 0), (-1, -1), font_name, 11),
+            ('FONT', (0, 0), (0, -1), font_bold, 11),
+            ('FONT', (1, 0), (2, 0), font_bold, 20),  # 1行目のランク部分を大きく
+            
+            # セル結合
+            ('SPAN', (1, 1), (2, 1)),  # 2行目: スコア部分を結合
+            ('SPAN', (1, 2), (2, 2)),  # 3行目: 達成率部分を結合
+            
+            # 背景色
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#fff9e6')),  # 薄い黄色
+            ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#fff9e6')),
+            
+            # テキスト色
+            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+            
+            # 罫線
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            
+            # 配置
+            ('ALIGN', (0, 0), (0, -1), 'LEFT'),      # 左列は左揃え
+            ('ALIGN', (1, 0), (1, 0), 'CENTER'),     # 1行目のランク（A）は中央揃え
+            ('ALIGN', (2, 0), (2, 0), 'LEFT'),       # 1行目の「優良レベル」は左揃え
+            ('ALIGN', (1, 1), (2, 2), 'CENTER'),     # 2-3行目の結合セルは中央揃え
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            
+            # パディング
+            ('PADDING', (0, 0), (-1, -1), 8),
+        ])
+        
+        # 各軸のスコアテーブル（コンパクト化）
+        self.score_table_style = TableStyle([
+            ('FONT', (0, 0), (-1, 0), font_bold, 10),
+            ('FONT', (0, 1), (-1, -1), font_name, 9),
+            ('BACKGROUND', (0, 0), (-1, 0), ADAMS_NAVY),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+            ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+            ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('PADDING', (0, 0), (-1, -1), 5),
+        ])
+        
+        # 前回との比較表（スコア表と同じ体裁で、最終行の総合スコアを太字にする）
+        self.delta_table_style = TableStyle(
+            self.score_table_style.getCommands() + [('FONT', (0, -1), (-1, -1), font_bold, 9)])
+        
+        # ===== 固定文面の段落 =====
+        self.cover_title = Paragraph("事業推進力診断レポート", self.title_style)
+        
+        # 著作権表示
+        copyright_text = "© 株式会社ADAMS Management Consulting Office<br/>本診断レポートの無断転用を禁じます"
+        self.cover_copyright = Paragraph(copyright_text, self.small_style)
+        
+        self.section1_heading = Paragraph("1. 総合評価", self.heading1_style)
+        
+        # ランク基準
+        self.rank_criteria_heading = Paragraph("【ランク基準】", self.heading2_style)
+        rank_criteria = """
+        • <b>Aランク（85%以上）</b>: 優良レベル - 事業推進力が非常に高い状態<br/>
+        • <b>Bランク（70-84%）</b>: 標準レベル - 事業推進の基盤がしっかりしている<br/>
+        • <b>Cランク（55-69%）</b>: 要改善レベル - 改善の余地が大きい状態<br/>
+        • <b>Dランク（55%未満）</b>: 危機レベル - 早急な改善が必要な状態
+        """
+        self.rank_criteria = Paragraph(rank_criteria, self.body_style)
+        
+        # 総合診断コメント（達成率の閾値ごとに用意しておく）
+        self.comment_heading = Paragraph("【総合診断コメント】", self.heading2_style)
+        self.comments = [
+            (85, Paragraph("素晴らしい結果です。事業推進力が非常に高い状態を維持されています。現状を維持しつつ、さらなる成長に向けた新たな挑戦を検討される段階です。", self.body_style)),
+            (70, Paragraph("良好な状態です。事業推進の基盤がしっかりしています。弱点となっている軸を強化することで、さらなる飛躍が期待できます。", self.body_style)),
+            (55, Paragraph("改善の余地が大きい状態です。優先改善課題から着手し、段階的に事業推進力を高めていくことをお勧めします。", self.body_style)),
+            (None, Paragraph("早急な改善が必要な状態です。まずは優先度の高い課題から集中的に取り組むことが重要です。", self.body_style)),
+        ]
+        
+        self.previous_legend = Paragraph("実線: 今回の診断 / 灰色の破線: 前回の診断", self.small_style)
+        self.score_table_heading = Paragraph("【各軸詳細スコア】", self.heading2_style)
+        
+        self.section3_heading = Paragraph("3. 優先改善課題 TOP3", self.heading1_style)
+        self.themes_heading = Paragraph("【取り組むと良いテーマ（ヒント）】", self.body_style)
+        
+        # ===== まとめページ =====
+        self.section4_heading = Paragraph("4. まとめと次のステップ", self.heading1_style)
+        self.summary_template = """
+        本診断レポートでは、貴社の事業推進力を{num_axes}つの軸から総合的に評価いたしました。<br/>
+        <br/>
+        診断結果を踏まえ、以下のステップで改善を進めることをお勧めします:<br/>
+        <br/>
+        <b>Step 1:</b> 優先改善課題TOP3から、最も取り組みやすい課題を1つ選定<br/>
+        <b>Step 2:</b> 選定した課題について、具体的な改善アクションプランを策定<br/>
+        <b>Step 3:</b> 3ヶ月を目安に改善活動を実施<br/>
+        <b>Step 4:</b> 改善状況を確認するため、再診断を実施<br/>
+        <br/>
+        事業推進力の向上は、一朝一夕には実現できませんが、着実に取り組むことで<br/>
+        必ず成果につながります。本診断レポートが、貴社のさらなる発展の一助となれば幸いです。
+        """
+        
+        # フッター
+        footer_text = """
+        <br/><br/>
+        本診断レポートに関するご質問、改善支援のご相談は、<br/>
+        株式会社ADAMS Management Consulting Officeまでお気軽にお問い合わせください。<br/>
+        <br/>
+        © 株式会社ADAMS Management Consulting Office<br/>
+        本診断レポートの無断転用を禁じます
+        """
+        self.footer = Paragraph(footer_text, self.small_style)
+        
+        # 改善テーマの段落（診断データの文面ごとに初回利用時に作成）
+        self._theme_paragraphs = {}
+        # 軸の数・名前に依存する段落（診断票の軸構成ごとに初回利用時に作成）
+        self._axis_paragraphs = {}
+
+    @staticmethod
+    def clone(flowable):
+        """固定文面の段落をレポートごとに複製（解析結果は共有し、レイアウト状態は分ける）"""
+        return copy.copy(flowable)
+
+    def comment(self, percentage):
+        """達成率に応じた総合診断コメント"""
+        for threshold, paragraph in self.comments:
+            if threshold is None or percentage >= threshold:
+                return self.clone(paragraph)
+
+    def theme(self, theme):
+        """改善テーマ1行分の段落"""
+        paragraph = self._theme_paragraphs.get(theme)
+        if paragraph is None:
+            paragraph = self._theme_paragraphs[theme] = Paragraph(f"  {theme}", self.body_style)
+        return self.clone(paragraph)
+
+    def axis_paragraphs(self, diagnostic_data):
+        """診断データの軸構成から作る段落（セクション2の見出し・凡例・まとめ）"""
+        axes = tuple((name, axis.get("english_label", name)) for name, axis in diagnostic_data.items())
+        paragraphs = self._axis_paragraphs.get(axes)
+        if paragraphs is None:
+            legend_text = " / ".join(f"{label}={name}" for name, label in axes)
+            paragraphs = self._axis_paragraphs[axes] = {
+                "section2_heading": Paragraph(f"2. {len(axes)}軸バランス分析と詳細スコア", self.heading1_style),
+                "legend": Paragraph(f"<b>【凡例】</b> {legend_text}", self.body_style),
+                "summary": Paragraph(self.summary_template.format(num_axes=len(axes)), self.body_style),
+            }
+        return {key: self.clone(paragraph) for key, paragraph in paragraphs.items()}
+
+
+_report_template = None
+_template_lock = threading.Lock()
+
+
+def get_report_template():
+    """プロセス内で共有するレポートテンプレート（初回呼び出し時に作成。出力モードによらず共通）"""
+    global _report_template
+    with _template_lock:
+        if _report_template is None:
+            _report_template = ReportTemplate(register_fonts())
+        return _report_template
+
 
 def generate_pdf_report(axis_scores, axis_max_scores, total_score, max_total_score, 
-                       percentage, rank, rank_label, diagnostic_data, company_name=""):
+                       percentage, rank, rank_label, diagnostic_data, company_name="",
+                       radar_renderer="vector", report_date=None, output=None, mode="standard",
+                       previous=None):
     """
     診断結果からPDFレポートを生成
     
@@ -52,118 +511,67 @@ def generate_pdf_report(axis_scores, axis_max_scores, total_score, max_total_sco
         rank_label: ランクラベル
         diagnostic_data: 診断データ辞書
         company_name: 企業名（オプション）
+        radar_renderer: レーダーチャートの描画方式（"vector" / "matplotlib"）
+        report_date: 表紙の診断日（date / datetime。省略時は今日）
+        output: 出力先のファイルパス、または write() を持つバイナリストリーム
+            （省略時は BytesIO に出力する。指定するとPDFを出力先に直接書き込み、
+            メモリ上に余分なコピーを持たない）
+        mode: 出力モード（"standard" / "compact"。PDF_MODES 参照）
+        previous: 同じ企業の前回の診断（HistoryEntry.as_previous() の形。指定すると
+            レーダーチャートに前回を重ね、前回との比較表を追加する）
     
     Returns:
-        BytesIO: PDF バッファ
+        BytesIO: PDF バッファ（output 指定時は output をそのまま返す）
     """
-    buffer = BytesIO()
+    if mode not in PDF_MODES:
+        raise ValueError(f"未対応の出力モードです: {mode}")
+    
+    # 初回はフォント登録とテンプレートの組み立てを含む
+    with span("pdf.template"):
+        template = get_report_template()
+        axis_paragraphs = template.axis_paragraphs(diagnostic_data)
+    static = template.clone
+    
+    buffer = BytesIO() if output is None else output
     doc = SimpleDocTemplate(
-        buffer,
+        os.fspath(buffer) if isinstance(buffer, os.PathLike) else buffer,
         pagesize=A4,
         rightMargin=20*mm,
         leftMargin=20*mm,
         topMargin=20*mm,
-        bottomMargin=20*mm
+        bottomMargin=20*mm,
+        # 作成日時・文書IDを固定し、同じ入力からは同じバイト列を生成する
+        invariant=1
     )
     
     # ストーリー（コンテンツ）を格納するリスト
     story = []
     
-    # スタイルシート
-    styles = getSampleStyleSheet()
-    
-    # カスタムスタイルの定義
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        fontName=FONT_BOLD,
-        fontSize=24,
-        textColor=ADAMS_NAVY,
-        alignment=TA_CENTER,
-        spaceAfter=20,
-        leading=30
-    )
-    
-    heading1_style = ParagraphStyle(
-        'CustomHeading1',
-        fontName=FONT_BOLD,
-        fontSize=18,
-        textColor=ADAMS_NAVY,
-        spaceAfter=12,
-        spaceBefore=12,
-        leading=24
-    )
-    
-    heading2_style = ParagraphStyle(
-        'CustomHeading2',
-        fontName=FONT_BOLD,
-        fontSize=14,
-        textColor=ADAMS_NAVY,
-        spaceAfter=10,
-        spaceBefore=10,
-        leading=18
-    )
-    
-    body_style = ParagraphStyle(
-        'CustomBody',
-        fontName=FONT_NAME,
-        fontSize=10,
-        leading=16,
-        spaceAfter=6
-    )
-    
-    small_style = ParagraphStyle(
-        'CustomSmall',
-        fontName=FONT_NAME,
-        fontSize=8,
-        textColor=colors.grey,
-        alignment=TA_RIGHT,
-        leading=12
-    )
-    
     # ===== 表紙 =====
     story.append(Spacer(1, 30*mm))
     
-    story.append(Paragraph("事業推進力診断レポート", title_style))
+    story.append(static(template.cover_title))
     story.append(Spacer(1, 10*mm))
     
     if company_name:
-        company_style = ParagraphStyle(
-            'Company',
-            parent=styles['Normal'],
-            fontName=FONT_BOLD,
-            fontSize=16,
-            alignment=TA_CENTER,
-            spaceAfter=10
-        )
-        story.append(Paragraph(f"{company_name} 様", company_style))
+        # 企業名は利用者の入力のため、Paragraph のマークアップとして解釈させない
+        story.append(Paragraph(f"{escape(company_name)} 様", template.company_style))
         story.append(Spacer(1, 5*mm))
     
     # 診断日時
-    diag_date = datetime.now().strftime('%Y年%m月%d日')
-    date_style = ParagraphStyle(
-        'Date',
-        parent=styles['Normal'],
-        fontName=FONT_NAME,
-        fontSize=12,
-        alignment=TA_CENTER
-    )
-    story.append(Paragraph(f"診断日時: {diag_date}", date_style))
+    diag_date = (report_date or datetime.now()).strftime('%Y年%m月%d日')
+    story.append(Paragraph(f"診断日時: {diag_date}", template.date_style))
     
     story.append(Spacer(1, 40*mm))
     
-    # 著作権表示
-    copyright_text = "© 株式会社ADAMS Management Consulting Office<br/>本診断レポートの無断転用を禁じます"
-    story.append(Paragraph(copyright_text, small_style))
+    story.append(static(template.cover_copyright))
     
     story.append(PageBreak())
     
     # ===== 総合評価ページ =====
-    story.append(Paragraph("1. 総合評価", heading1_style))
+    story.append(static(template.section1_heading))
     story.append(Spacer(1, 5*mm))
     
-    # 総合評価テーブル
-    rank_color = ADAMS_GOLD if rank == "A" else ADAMS_ACCENT if rank == "B" else colors.orange if rank == "C" else colors.red
-    
     # 総合評価テーブル（セル結合レイアウト）
     eval_data = [
         ['総合ランク', f'{rank}', rank_label],
@@ -172,120 +580,52 @@ def generate_pdf_report(axis_scores, axis_max_scores, total_score, max_total_sco
     ]
     
     eval_table = Table(eval_data, colWidths=[40*mm, 40*mm, 70*mm])
-    eval_table.setStyle(TableStyle([
-        # フォント設定（Arial）
-        ('FONT', (0, 0), (-1, -1), FONT_NAME, 11),
-        ('FONT', (0, 0), (0, -1), FONT_BOLD, 11),
-        ('FONT', (1, 0), (2, 0), FONT_BOLD, 20),  # 1行目のランク部分を大きく
-        
-        # セル結合
-        ('SPAN', (1, 1), (2, 1)),  # 2行目: スコア部分を結合
-        ('SPAN', (1, 2), (2, 2)),  # 3行目: 達成率部分を結合
-        
-        # 背景色
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#fff9e6')),  # 薄い黄色
-        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#fff9e6')),
-        
-        # テキスト色
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        
-        # 罫線
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        
-        # 配置
-        ('ALIGN', (0, 0), (0, -1), 'LEFT'),      # 左列は左揃え
-        ('ALIGN', (1, 0), (1, 0), 'CENTER'),     # 1行目のランク（A）は中央揃え
-        ('ALIGN', (2, 0), (2, 0), 'LEFT'),       # 1行目の「優良レベル」は左揃え
-        ('ALIGN', (1, 1), (2, 2), 'CENTER'),     # 2-3行目の結合セルは中央揃え
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        
-        # パディング
-        ('PADDING', (0, 0), (-1, -1), 8),
-    ]))
+    eval_table.setStyle(template.eval_table_style)
     
     story.append(eval_table)
     story.append(Spacer(1, 10*mm))
     
     # ランク基準
-    story.append(Paragraph("【ランク基準】", heading2_style))
-    rank_criteria = """
-    • <b>Aランク（85%以上）</b>: 優良レベル - 事業推進力が非常に高い状態<br/>
-    • <b>Bランク（70-84%）</b>: 標準レベル - 事業推進の基盤がしっかりしている<br/>
-    • <b>Cランク（55-69%）</b>: 要改善レベル - 改善の余地が大きい状態<br/>
-    • <b>Dランク（55%未満）</b>: 危機レベル - 早急な改善が必要な状態
-    """
-    story.append(Paragraph(rank_criteria, body_style))
+    story.append(static(template.rank_criteria_heading))
+    story.append(static(template.rank_criteria))
     story.append(Spacer(1, 10*mm))
     
     # 総合診断コメント
-    story.append(Paragraph("【総合診断コメント】", heading2_style))
-    
-    if percentage >= 85:
-        comment = "素晴らしい結果です。事業推進力が非常に高い状態を維持されています。現状を維持しつつ、さらなる成長に向けた新たな挑戦を検討される段階です。"
-    elif percentage >= 70:
-        comment = "良好な状態です。事業推進の基盤がしっかりしています。弱点となっている軸を強化することで、さらなる飛躍が期待できます。"
-    elif percentage >= 55:
-        comment = "改善の余地が大きい状態です。優先改善課題から着手し、段階的に事業推進力を高めていくことをお勧めします。"
-    else:
-        comment = "早急な改善が必要な状態です。まずは優先度の高い課題から集中的に取り組むことが重要です。"
-    
-    story.append(Paragraph(comment, body_style))
+    story.append(static(template.comment_heading))
+    story.append(template.comment(percentage))
     
     story.append(PageBreak())
     
-    # ===== 6軸バランス分析と各軸詳細スコア（1ページに統合） =====
-    story.append(Paragraph("2. 6軸バランス分析と詳細スコア", heading1_style))
+    # ===== 軸バランス分析と各軸詳細スコア（1ページに統合） =====
+    story.append(axis_paragraphs["section2_heading"])
     story.append(Spacer(1, 3*mm))
     
-    # レーダーチャートを生成
-    labels = list(axis_scores.keys())
-    scores = [axis_scores[label] / axis_max_scores[label] * 4 for label in labels]
-    
-    # Matplotlibで正円のレーダーチャートを生成
-    fig = plt.figure(figsize=(5, 5))
-    ax = fig.add_subplot(111, polar=True, aspect='equal')  # aspect='equal'で正円に
-    
-    angles = np.linspace(0, 2 * np.pi, len(labels), endpoint=False).tolist()
-    scores_plot = scores + scores[:1]
-    angles_plot = angles + angles[:1]
-    
-    ax.plot(angles_plot, scores_plot, 'o-', linewidth=2, color='#243666', markersize=8)
-    ax.fill(angles_plot, scores_plot, alpha=0.25, color='#4a90e2')
-    
-    # 英語ラベルを使用
-    english_labels = [diagnostic_data[label]["english_label"] for label in labels]
-    ax.set_thetagrids(np.degrees(angles), english_labels, fontsize=9, weight='bold')
-    ax.set_ylim(0, 4)
-    ax.set_yticks([1, 2, 3, 4])
-    ax.set_yticklabels(['1', '2', '3', '4'], fontsize=8)
-    ax.grid(True, linewidth=0.8, alpha=0.3)
-    
-    ax.set_facecolor('#f8f9fa')
-    fig.patch.set_facecolor('white')
-    
-    # アスペクト比を固定して正円を保つ
-    fig.tight_layout()
-    
-    # 画像をバッファに保存
-    img_buffer = BytesIO()
-    fig.savefig(img_buffer, format='png', bbox_inches='tight', dpi=150)
-    img_buffer.seek(0)
-    plt.close()
-    
-    # PDFに画像を追加（小さめ）
-    radar_img = Image(img_buffer, width=80*mm, height=80*mm)
+    # レーダーチャート（既定はベクター描画。matplotlib 版は画面と共有のキャッシュ経由）
+    if radar_renderer not in RADAR_RENDERERS:
+        raise ValueError(f"未対応のレーダーチャート描画方式です: {radar_renderer}")
+    previous_axis_scores = previous["axis_scores"] if previous else None
+    with span(f"pdf.radar_{radar_renderer}"):
+        if radar_renderer == "vector":
+            radar_img = build_radar_drawing(axis_scores, axis_max_scores, diagnostic_data,
+                                            previous_axis_scores=previous_axis_scores)
+        else:
+            from radar_chart import get_radar_png
+            radar_png = get_radar_png(axis_scores, axis_max_scores, diagnostic_data, profile="pdf",
+                                      previous_axis_scores=previous_axis_scores)
+            if mode == "compact":
+                radar_png = downsample_png(radar_png, 80*mm)
+            radar_img = Image(BytesIO(radar_png), width=80*mm, height=80*mm)
+    radar_img.hAlign = 'CENTER'
     story.append(radar_img)
     story.append(Spacer(1, 3*mm))
     
-    # 凡例（簡潔化）
-    legend_text = """
-    <b>【凡例】</b> Vision=ビジョン / Planning=計画管理 / Organization=組織 / Time Mgmt=時間管理 / KPI=数値管理 / Profitability=収益性
-    """
-    story.append(Paragraph(legend_text, body_style))
+    story.append(axis_paragraphs["legend"])
+    if previous:
+        story.append(static(template.previous_legend))
     story.append(Spacer(1, 5*mm))
     
     # 各軸のスコアテーブル（コンパクト化）
-    story.append(Paragraph("【各軸詳細スコア】", heading2_style))
+    story.append(static(template.score_table_heading))
     score_data = [['診断軸', 'スコア', '達成率', '評価']]
     
     for axis_name, score in axis_scores.items():
@@ -308,24 +648,20 @@ def generate_pdf_report(axis_scores, axis_max_scores, total_score, max_total_sco
         ])
     
     score_table = Table(score_data, colWidths=[60*mm, 35*mm, 30*mm, 25*mm])
-    score_table.setStyle(TableStyle([
-        ('FONT', (0, 0), (-1, 0), FONT_BOLD, 10),
-        ('FONT', (0, 1), (-1, -1), FONT_NAME, 9),
-        ('BACKGROUND', (0, 0), (-1, 0), ADAMS_NAVY),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-        ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('PADDING', (0, 0), (-1, -1), 5),
-    ]))
+    score_table.setStyle(template.score_table_style)
     
     story.append(score_table)
     
+    # 前回の診断との比較（ページをまたぐ場合は表ごと次のページに送る）
+    if previous:
+        story.append(Spacer(1, 5*mm))
+        story.append(KeepTogether(build_delta_section(template, previous, axis_scores, axis_max_scores,
+                                                      total_score, max_total_score)))
+    
     story.append(PageBreak())
     
     # ===== 優先改善課題 TOP3ページ =====
-    story.append(Paragraph("3. 優先改善課題 TOP3", heading1_style))
+    story.append(static(template.section3_heading))
     story.append(Spacer(1, 5*mm))
     
     sorted_axes = sorted(axis_scores.items(), 
@@ -349,52 +685,36 @@ def generate_pdf_report(axis_scores, axis_max_scores, total_score, max_total_sco
         
         themes = diagnostic_data[axis_name]["improvement_themes"][level]
         
-        story.append(Paragraph(f"{medals[i]} {positions[i]}: {icon} {axis_name}", heading2_style))
-        story.append(Paragraph(f"現在のスコア: {score}/{max_score} 点 ({pct:.1f}%)", body_style))
+        story.append(Paragraph(f"{medals[i]} {positions[i]}: {icon} {axis_name}", template.heading2_style))
+        story.append(Paragraph(f"現在のスコア: {score}/{max_score} 点 ({pct:.1f}%)", template.body_style))
         story.append(Spacer(1, 3*mm))
         
-        story.append(Paragraph("【取り組むと良いテーマ（ヒント）】", body_style))
+        story.append(static(template.themes_heading))
         for theme in themes:
-            story.append(Paragraph(f"  {theme}", body_style))
+            story.append(template.theme(theme))
         
         story.append(Spacer(1, 5*mm))
     
     story.append(PageBreak())
     
     # ===== まとめページ =====
-    story.append(Paragraph("4. まとめと次のステップ", heading1_style))
+    story.append(static(template.section4_heading))
     story.append(Spacer(1, 5*mm))
-    
-    summary_text = """
-    本診断レポートでは、貴社の事業推進力を6つの軸から総合的に評価いたしました。<br/>
-    <br/>
-    診断結果を踏まえ、以下のステップで改善を進めることをお勧めします:<br/>
-    <br/>
-    <b>Step 1:</b> 優先改善課題TOP3から、最も取り組みやすい課題を1つ選定<br/>
-    <b>Step 2:</b> 選定した課題について、具体的な改善アクションプランを策定<br/>
-    <b>Step 3:</b> 3ヶ月を目安に改善活動を実施<br/>
-    <b>Step 4:</b> 改善状況を確認するため、再診断を実施<br/>
-    <br/>
-    事業推進力の向上は、一朝一夕には実現できませんが、着実に取り組むことで<br/>
-    必ず成果につながります。本診断レポートが、貴社のさらなる発展の一助となれば幸いです。
-    """
-    story.append(Paragraph(summary_text, body_style))
+    story.append(axis_paragraphs["summary"])
     
     story.append(Spacer(1, 20*mm))
     
     # フッター
-    footer_text = """
-    <br/><br/>
-    本診断レポートに関するご質問、改善支援のご相談は、<br/>
-    株式会社ADAMS Management Consulting Officeまでお気軽にお問い合わせください。<br/>
-    <br/>
-    © 株式会社ADAMS Management Consulting Office<br/>
-    本診断レポートの無断転用を禁じます
-    """
-    story.append(Paragraph(footer_text, small_style))
+    story.append(static(template.footer))
     
-    # PDFを生成
-    doc.build(story)
+    # PDFを生成（レイアウトとPDFへの書き出し）
+    with span("pdf.build"):
+        if mode == "compact":
+            doc.build(story, canvasmaker=_FlateOnlyCanvas)
+        else:
+            doc.build(story)
     
-    buffer.seek(0)
+    if output is None:
+        buffer.seek(0)
     return buffer
+
@@ -0,0 +1,328 @@
+"""
+ADAMS 事業推進力診断ツール - 母集団の中での順位（パーセンタイル）
+
+保存済み診断結果（result_sink の diagnoses テーブル）から、軸・総合スコアごとの
+度数分布（ScoreSketch）を業種×従業員規模のセグメント別に保持する。スコアは
+0〜最大点の整数なので、点数ごとの件数がそのまま誤差のない分位点スケッチになり、
+件数の加算でマージできる。セグメントの分布を足し合わせて「業種のみ」「規模のみ」
+「全体」の分布を作る。
+
+新しい結果は前回取り込んだ行ID以降だけをバックグラウンドで集計テーブルに取り込み
+（cohort_analytics.IncrementalAggregator。同じDBを使う複数のレプリカで二重に数えない）、
+各プロセスは前回読んだ後に更新されたセグメントの行だけを集計テーブルから読み直す。
+結果ページでのパーセンタイルの計算は保存件数によらず一定の時間で終わる。
+
+    python percentile_rank.py --db data/diagnoses.sqlite3
+
+    ADAMS_PERCENTILE_REFRESH_INTERVAL  取り込みの間隔（秒、既定: 30）
+"""
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from cohort_analytics import REFRESH_CHUNK, TOTAL_AXIS, IncrementalAggregator
+from questionnaire import get_questionnaire
+from result_sink import DEFAULT_DB_PATH
+
+logger = logging.getLogger(__name__)
+
+# セグメントの選択肢（結果の保存行には "業種" / "従業員規模" として記録する）
+INDUSTRIES = ("製造業", "建設業", "卸売・小売業", "情報通信業", "サービス業", "医療・福祉", "その他")
+COMPANY_SIZES = ("〜10名", "11〜50名", "51〜100名", "101〜300名", "301名以上")
+UNSPECIFIED = "未回答"
+# 業種・規模を問わない集計のキー
+ALL = "*"
+
+# パーセンタイルを表示するのに必要な件数（足りないセグメントはより広いセグメントで比べる）
+MIN_SEGMENT_COUNT = 30
+
+# バックグラウンドで新しい結果を取り込む間隔（秒）
+REFRESH_INTERVAL = 30.0
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS agg_state (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS agg_segment_hist (
+        industry TEXT NOT NULL,
+        company_size TEXT NOT NULL,
+        axis TEXT NOT NULL,
+        score INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        updated_row_id INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (industry, company_size, axis, score)
+    );
+"""
+
+
+class ScoreSketch:
+    """0〜max_score の整数スコアの度数分布（add() の件数を足し合わせるだけでマージできる）"""
+
+    __slots__ = ("counts", "count")
+
+    def __init__(self, max_score):
+        self.counts = [0] * (max_score + 1)
+        self.count = 0
+
+    def add(self, score, n=1):
+        self.counts[min(max(int(score), 0), len(self.counts) - 1)] += n
+        self.count += n
+
+    def percentile(self, score):
+        """
+        score の母集団内のパーセンタイル（下回る件数＋同点の半数。0〜100）
+
+        Returns:
+            float: パーセンタイル（件数が0なら None）
+        """
+        if not self.count:
+            return None
+        score = min(max(int(score), 0), len(self.counts) - 1)
+        below = sum(self.counts[:score])
+        return (below + self.counts[score] / 2) / self.count * 100
+
+    def quantile(self, q):
+        """分位点（q=0.5 で中央値）のスコア"""
+        if not self.count:
+            return None
+        target = q * self.count
+        cumulative = 0
+        for score, n in enumerate(self.counts):
+            cumulative += n
+            if cumulative >= target and n:
+                return score
+        return len(self.counts) - 1
+
+
+def segment_of(result):
+    """保存行の（業種, 従業員規模）。未回答や選択肢にない値は UNSPECIFIED"""
+    industry = result.get("業種")
+    company_size = result.get("従業員規模")
+    return (industry if industry in INDUSTRIES else UNSPECIFIED,
+            company_size if company_size in COMPANY_SIZES else UNSPECIFIED)
+
+
+def segment_label(industry, company_size):
+    """比較したセグメントの表示名"""
+    parts = [value for value in (industry, company_size) if value != ALL]
+    return "・".join(parts) if parts else "全体"
+
+
+class PopulationRanking(IncrementalAggregator):
+    """セグメント別のスコア分布と、それに基づくパーセンタイル"""
+
+    SCHEMA = SCHEMA
+    WATERMARK = "percentile_last_row_id"
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, questionnaire=None):
+        self.questionnaire = questionnaire or get_questionnaire()
+        self.axis_max_scores = dict(self.questionnaire.axis_max_scores)
+        self.axis_max_scores[TOTAL_AXIS] = self.questionnaire.max_total_score
+        super().__init__(db_path)
+        self._migrate()
+
+        # (業種, 規模, 軸) -> ScoreSketch。業種・規模は ALL を含む4通りに加算しておく
+        self._sketches = {}
+        # 読み込み済みのセグメント別の件数と、そのとき読んだ行の最大の updated_row_id（プロセスごと）
+        self._segment_counts = {}
+        self._loaded_row_id = -1
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._load()
+
+    def _migrate(self):
+        """updated_row_id 列のない集計テーブル（以前の形式）に列を追加する（既存の行は 0 として初回に読む）"""
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(agg_segment_hist)")]
+        with self.conn:
+            if "updated_row_id" not in columns:
+                self.conn.execute("ALTER TABLE agg_segment_hist ADD COLUMN updated_row_id INTEGER NOT NULL DEFAULT 0")
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS agg_segment_hist_updated ON agg_segment_hist (updated_row_id)")
+
+    # ===== 分布の読み込みと更新 =====
+
+    def _add(self, industry, company_size, axis, score, n):
+        for segment_industry in (industry, ALL):
+            for segment_size in (company_size, ALL):
+                key = (segment_industry, segment_size, axis)
+                sketch = self._sketches.get(key)
+                if sketch is None:
+                    sketch = self._sketches[key] = ScoreSketch(self.axis_max_scores[axis])
+                sketch.add(score, n)
+
+    def _load(self):
+        """
+        前回読んだ後に更新されたセグメント別の分布を読み、業種のみ・規模のみ・全体の分布に差分を反映する
+
+        集計テーブルは他のプロセスも更新するため、自分で取り込んだ行に限らずDBから読み直す。
+        取り込みは1件ずつ直列に、行IDの昇順でコミットされるため、読んだ行の最大の行ID以下の更新はすべて読み終えている。
+        """
+        rows = self.conn.execute(
+            "SELECT industry, company_size, axis, score, count, updated_row_id FROM agg_segment_hist "
+            "WHERE updated_row_id > ?", (self._loaded_row_id,)).fetchall()
+        with self._lock:
+            for industry, company_size, axis, score, count, updated_row_id in rows:
+                self._loaded_row_id = max(self._loaded_row_id, updated_row_id)
+                if axis not in self.axis_max_scores:
+                    continue
+                key = (industry, company_size, axis, score)
+                diff = count - self._segment_counts.get(key, 0)
+                self._segment_counts[key] = count
+                if diff:
+                    self._add(industry, company_size, axis, score, diff)
+        return len(rows)
+
+    def refresh(self, chunk=REFRESH_CHUNK):
+        """
+        前回以降に保存された結果を集計テーブルに取り込み、他のプロセスが取り込んだ分も含めて分布を読み直す
+
+        Returns:
+            int: このプロセスが新たに取り込んだ行数
+        """
+        with self._refresh_lock:
+            processed = super().refresh(chunk)
+            self._load()
+        return processed
+
+    def _apply(self, conn, rows):
+        hist = Counter()
+        for _, _, payload in rows:
+            try:
+                result = json.loads(payload)
+            except ValueError:
+                continue
+            scores = {axis: result.get(f"{axis}スコア") for axis in self.questionnaire.axis_names}
+            if None in scores.values():
+                continue  # 別の診断票の結果は含めない
+            scores[TOTAL_AXIS] = result.get("総合スコア", sum(scores.values()))
+            industry, company_size = segment_of(result)
+            for axis, score in scores.items():
+                hist[(industry, company_size, axis, score)] += 1
+
+        # 分布は _load() で読み直すため、ここでは集計テーブルだけを更新する
+        conn.executemany(
+            "INSERT INTO agg_segment_hist VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (industry, company_size, axis, score) DO UPDATE "
+            "SET count = count + excluded.count, updated_row_id = excluded.updated_row_id",
+            [(*key, count, rows[-1][0]) for key, count in hist.items()],
+        )
+
+    # ===== パーセンタイル =====
+
+    def count(self, industry=ALL, company_size=ALL):
+        sketch = self._sketches.get((industry, company_size, TOTAL_AXIS))
+        return sketch.count if sketch else 0
+
+    def segment_for(self, industry=None, company_size=None, min_count=MIN_SEGMENT_COUNT):
+        """
+        件数が min_count 以上の、できるだけ絞り込んだセグメント
+        （業種×規模 → 業種 → 規模 → 全体の順に探す）
+
+        Returns:
+            tuple: (業種, 規模)。全体でも足りなければ None
+        """
+        industry = industry if industry in INDUSTRIES else ALL
+        company_size = company_size if company_size in COMPANY_SIZES else ALL
+        candidates = [(industry, company_size), (industry, ALL), (ALL, company_size), (ALL, ALL)]
+        for segment in dict.fromkeys(candidates):
+            if self.count(*segment) >= min_count:
+                return segment
+        return None
+
+    def rank(self, axis_scores, total_score, industry=None, company_size=None, min_count=MIN_SEGMENT_COUNT):
+        """
+        軸ごと・総合のパーセンタイル
+
+        Args:
+            axis_scores: 各軸のスコア辞書
+            total_score: 総合スコア
+            industry: 業種（INDUSTRIES のいずれか。None なら業種で絞り込まない）
+            company_size: 従業員規模（COMPANY_SIZES のいずれか。None なら規模で絞り込まない）
+            min_count: 比較に必要な件数
+
+        Returns:
+            dict: {"segment": (業種, 規模), "label": 表示名, "count": 件数,
+                   "percentiles": {軸名 / TOTAL_AXIS: パーセンタイル}, "medians": {...}}。
+                  比較できる件数がなければ None
+        """
+        segment = self.segment_for(industry, company_size, min_count)
+        if segment is None:
+            return None
+        percentiles = {}
+        medians = {}
+        with self._lock:
+            for axis, score in [*axis_scores.items(), (TOTAL_AXIS, total_score)]:
+                sketch = self._sketches.get((*segment, axis))
+                if sketch is not None and sketch.count:
+                    percentiles[axis] = sketch.percentile(score)
+                    medians[axis] = sketch.quantile(0.5)
+        return {
+            "segment": segment,
+            "label": segment_label(*segment),
+            "count": self.count(*segment),
+            "percentiles": percentiles,
+            "medians": medians,
+        }
+
+    # ===== バックグラウンド更新 =====
+
+    def _refresh_periodically(self, interval):
+        while True:
+            try:
+                processed = self.refresh()
+                if processed:
+                    logger.info("パーセンタイルの分布に%d件を取り込みました", processed)
+            except Exception:
+                logger.exception("パーセンタイルの分布を更新できません")
+            time.sleep(interval)
+
+    def start(self, interval=REFRESH_INTERVAL):
+        """新しい結果を interval 秒ごとに取り込むスレッドを開始する（初回の取り込みもこのスレッドで行う）"""
+        threading.Thread(target=self._refresh_periodically, args=(interval,),
+                         name="adams-percentile-refresh", daemon=True).start()
+        return self
+
+
+_ranking = None
+_ranking_lock = threading.Lock()
+
+
+def get_population_ranking():
+    """
+    プロセス内で共有するパーセンタイル計算（初回呼び出し時にバックグラウンド更新を開始する）
+
+    Returns:
+        PopulationRanking: 保存済みの診断結果がまだなければ None
+    """
+    global _ranking
+    with _ranking_lock:
+        db_path = os.environ.get("ADAMS_RESULT_DB", DEFAULT_DB_PATH)
+        if _ranking is None and os.path.exists(db_path):
+            _ranking = PopulationRanking(db_path).start(
+                float(os.environ.get("ADAMS_PERCENTILE_REFRESH_INTERVAL", REFRESH_INTERVAL)))
+        return _ranking
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="保存済み診断結果からパーセンタイルの分布を更新します")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    args = parser.parse_args(argv)
+
+    ranking = PopulationRanking(args.db)
+    processed = ranking.refresh()
+    print(f"{processed}件を取り込みました（累計 {ranking.count()}件）")
+    for industry in (*INDUSTRIES, UNSPECIFIED):
+        count = ranking.count(industry, ALL)
+        if count:
+            print(f"  {industry}: {count}件")
+    ranking.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+ADAMS 事業推進力診断ツール - 診断票（設問定義）の読み込みとコンパイル
+
+診断票は instruments/<診断票ID>.json に置く。読み込んだ定義は
+設問の通し番号（0始まり）・軸ごとの先頭位置・最大点を前計算した
+Questionnaire にコンパイルし、ファイルが更新されたら次の参照時に読み直す。
+複数の診断票を同じプロセスで並行して扱える。
+
+    ADAMS_INSTRUMENT_DIR  診断票の置き場所（既定: instruments/）
+    ADAMS_INSTRUMENT      既定の診断票ID（既定: adams-business）
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from array import array
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION = 1
+
+DEFAULT_INSTRUMENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "instruments")
+DEFAULT_INSTRUMENT = "adams-business"
+
+IMPROVEMENT_LEVELS = ("high", "medium", "low")
+
+
+class QuestionnaireError(ValueError):
+    """診断票の定義が不正"""
+
+
+class Questionnaire:
+    """
+    コンパイル済みの診断票（読み取り専用として扱う）
+
+    設問は軸の順に並べた通し番号で参照する。i 番目の軸の設問は
+    offsets[i] 〜 offsets[i + 1] - 1 番。
+    """
+
+    def __init__(self, spec, source_path=None, mtime=None):
+        if spec.get("schema_version") != SCHEMA_VERSION:
+            raise QuestionnaireError(f"未対応の schema_version です: {spec.get('schema_version')}")
+        for field in ("id", "version", "title", "options", "axes"):
+            if field not in spec:
+                raise QuestionnaireError(f"{field} がありません")
+
+        self.id = spec["id"]
+        self.version = str(spec["version"])
+        self.title = spec["title"]
+        self.source_path = source_path
+        self.mtime = mtime
+
+        # 回答の選択肢（表示順）
+        self.options = {}
+        for option in spec["options"]:
+            value = option["value"]
+            if not isinstance(value, int) or value < 1:
+                raise QuestionnaireError(f"選択肢の値は1以上の整数である必要があります: {value!r}")
+            self.options[value] = option["label"]
+        if not self.options:
+            raise QuestionnaireError("選択肢がありません")
+        self.option_values = tuple(self.options)
+        self.max_answer = max(self.options)
+
+        axes = spec["axes"]
+        if not axes:
+            raise QuestionnaireError("診断軸がありません")
+        self.axis_names = tuple(axis["name"] for axis in axes)
+        if len(set(self.axis_names)) != len(self.axis_names):
+            raise QuestionnaireError("診断軸の名前が重複しています")
+        self.english_labels = tuple(axis.get("english_label", axis["name"]) for axis in axes)
+        self.icons = tuple(axis.get("icon", "📌") for axis in axes)
+        self.improvement_themes = tuple(axis.get("improvement_themes", {}) for axis in axes)
+        for name, themes in zip(self.axis_names, self.improvement_themes):
+            missing = [level for level in IMPROVEMENT_LEVELS if level not in themes]
+            if missing:
+                raise QuestionnaireError(f"{name} の改善テーマに {', '.join(missing)} がありません")
+
+        # 設問の通し番号・軸ごとの先頭位置・各設問の軸番号
+        self.questions = tuple(question for axis in axes for question in axis["questions"])
+        self.question_counts = tuple(len(axis["questions"]) for axis in axes)
+        if 0 in self.question_counts:
+            raise QuestionnaireError("各軸に1問以上の設問が必要です")
+        self.offsets = array("H", [0])
+        for count in self.question_counts:
+            self.offsets.append(self.offsets[-1] + count)
+        self.question_axis = array("B", [i for i, count in enumerate(self.question_counts) for _ in range(count)])
+        self.num_questions = len(self.questions)
+
+        self.axis_max_scores = {name: count * self.max_answer
+                                for name, count in zip(self.axis_names, self.question_counts)}
+        self.max_total_score = sum(self.axis_max_scores.values())
+
+        # 定義の内容ハッシュ（キャッシュキーや保存結果に使う）
+        canonical = json.dumps(spec, ensure_ascii=False, sort_keys=True)
+        self.fingerprint = hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+        # 回答の並び（軸・設問数・選択肢）だけのハッシュ。文面の修正では変わらない（回答コードの照合用）
+        layout = json.dumps([self.axis_names, self.question_counts, self.option_values], ensure_ascii=False)
+        self.layout_fingerprint = hashlib.sha256(layout.encode("utf-8")).digest()
+
+        # 従来の diagnostic_data 形式（PDF・チャート・集計はこの形で受け取る）
+        self.diagnostic_data = {
+            name: {
+                "english_label": label,
+                "icon": icon,
+                "questions": list(self.questions[self.offsets[i]:self.offsets[i + 1]]),
+                "improvement_themes": themes,
+            }
+            for i, (name, label, icon, themes) in enumerate(
+                zip(self.axis_names, self.english_labels, self.icons, self.improvement_themes))
+        }
+
+        self._scoring_engine = None
+
+    @classmethod
+    def load(cls, path):
+        """JSON ファイルから読み込んでコンパイルする"""
+        mtime = os.stat(path).st_mtime_ns
+        with open(path, encoding="utf-8") as f:
+            try:
+                spec = json.load(f)
+            except ValueError as e:
+                raise QuestionnaireError(f"{path} を読み込めません: {e}") from e
+        try:
+            return cls(spec, source_path=path, mtime=mtime)
+        except (KeyError, TypeError, AttributeError) as e:
+            raise QuestionnaireError(f"{path} の形式が不正です: {type(e).__name__}: {e}") from e
+
+    @property
+    def key(self):
+        """保存結果に記録する診断票の識別子"""
+        return f"{self.id}@{self.version}"
+
+    def axis_questions(self, axis_idx):
+        """axis_idx 番目（0始まり）の軸の設問の通し番号"""
+        return range(self.offsets[axis_idx], self.offsets[axis_idx + 1])
+
+    @property
+    def scoring_engine(self):
+        """この診断票の一括採点エンジン（numpy を遅延読み込みするため初回参照時に生成）"""
+        if self._scoring_engine is None:
+            from scoring_engine import ScoringEngine
+            self._scoring_engine = ScoringEngine(self.diagnostic_data, max_answer=self.max_answer)
+        return self._scoring_engine
+
+
+class QuestionnaireRegistry:
+    """診断票ディレクトリの読み込みと、ファイル更新時の再読み込み"""
+
+    def __init__(self, directory=DEFAULT_INSTRUMENT_DIR, check_interval=1.0):
+        self.directory = directory
+        # 更新の確認（stat）は診断票ごとに check_interval 秒に1回まで
+        self.check_interval = check_interval
+        self._models = {}
+        self._checked_at = {}
+        self._failed_mtimes = {}  # 読み込みに失敗したファイルの更新時刻（同じ内容を読み直さない）
+        self._lock = threading.Lock()
+
+    def path_for(self, instrument_id):
+        return os.path.join(self.directory, f"{instrument_id}.json")
+
+    def instruments(self):
+        """利用できる診断票IDの一覧"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(name[:-len(".json")] for name in names if name.endswith(".json"))
+
+    def get(self, instrument_id=None):
+        """
+        コンパイル済みの診断票を返す（ファイルが更新されていれば読み直す）
+
+        更新後のファイルが不正な場合は、ログに記録して読み込み済みの定義を使い続ける。
+        """
+        instrument_id = instrument_id or os.environ.get("ADAMS_INSTRUMENT", DEFAULT_INSTRUMENT)
+        if os.sep in instrument_id or instrument_id.startswith("."):
+            raise QuestionnaireError(f"不正な診断票IDです: {instrument_id}")
+
+        now = time.monotonic()
+        model = self._models.get(instrument_id)
+        if model is not None and now - self._checked_at.get(instrument_id, 0) < self.check_interval:
+            return model
+
+        with self._lock:
+            model = self._models.get(instrument_id)
+            path = self.path_for(instrument_id)
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                if model is None:
+                    raise QuestionnaireError(f"診断票が見つかりません: {path}") from None
+                mtime = model.mtime
+            self._checked_at[instrument_id] = now
+            if model is not None and mtime in (model.mtime, self._failed_mtimes.get(instrument_id)):
+                return model
+
+            try:
+                new_model = Questionnaire.load(path)
+            except (OSError, QuestionnaireError) as e:
+                if model is None:
+                    raise
+                self._failed_mtimes[instrument_id] = mtime
+                logger.error("診断票 %s の再読み込みに失敗したため、前の定義を使います: %s", instrument_id, e)
+                return model
+            if new_model.id != instrument_id:
+                raise QuestionnaireError(f"{path} の id がファイル名と一致しません: {new_model.id}")
+            if model is not None:
+                logger.info("診断票 %s を再読み込みしました（%s → %s）", instrument_id, model.key, new_model.key)
+            self._models[instrument_id] = new_model
+            return new_model
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """プロセス内で共有する診断票レジストリ"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = QuestionnaireRegistry(os.environ.get("ADAMS_INSTRUMENT_DIR", DEFAULT_INSTRUMENT_DIR))
+        return _registry
+
+
+def get_questionnaire(instrument_id=None):
+    """コンパイル済みの診断票（省略時は ADAMS_INSTRUMENT の診断票）"""
+    return get_registry().get(instrument_id)
@@ -0,0 +1,266 @@
+"""
+ADAMS 事業推進力診断ツール - レーダーチャート描画モジュール
+
+画面（web）とPDF（pdf）で共通の matplotlib レーダーチャートを描画し、
+PNG を上限付きの LRU キャッシュで共有する。同じスコアの再表示やPDF生成では
+matplotlib を呼ばずにキャッシュ済みの画像を返す。
+
+描画は pyplot のグローバルな状態を使わず、Figure と Agg キャンバスを直接扱う。
+軸・目盛り・ラベルまで作り終えたテンプレートをプロファイルと軸ラベルごとに
+プールしておき、描画では貸し出したテンプレートのデータ多角形だけを差し替える
+（1つのテンプレートを同時に使うのは1スレッドだけなので、複数セッションから安全に呼べる）。
+"""
+
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+# ADAMSブランドカラー
+ADAMS_NAVY = "#243666"
+ADAMS_ACCENT = "#4a90e2"
+# 前回の診断を重ねる線の色
+PREVIOUS_COLOR = "#888888"
+
+# 描画プロファイル（web: 結果ページ用 8×8, pdf: レポート用 5×5）
+RENDER_PROFILES = {
+    "web": {
+        "figsize": (8, 8),
+        "linewidth": 3,
+        "markersize": 10,
+        "fill_alpha": 0.3,
+        "label_fontsize": 14,
+        "tick_fontsize": 12,
+        "grid": {"linewidth": 1, "alpha": 0.3, "color": ADAMS_NAVY},
+        # st.pyplot() と同じ保存設定
+        "savefig": {"dpi": 200, "bbox_inches": "tight"},
+    },
+    "pdf": {
+        "figsize": (5, 5),
+        "linewidth": 2,
+        "markersize": 8,
+        "fill_alpha": 0.25,
+        "label_fontsize": 9,
+        "tick_fontsize": 8,
+        "grid": {"linewidth": 0.8, "alpha": 0.3},
+        "savefig": {"dpi": 150, "bbox_inches": "tight"},
+    },
+}
+
+# キャッシュに保持するPNGの最大件数（web 1枚 約200KB）
+DEFAULT_CACHE_SIZE = 128
+
+# プロファイル・軸ラベルごとに保持しておく未使用テンプレートの最大数（同時描画数の目安）
+MAX_IDLE_TEMPLATES = 4
+
+
+def normalize_scores(axis_scores, axis_max_scores):
+    """各軸のスコアを 0〜4 に正規化（軸の順序は axis_scores の順）"""
+    return [axis_scores[label] / axis_max_scores[label] * 4 for label in axis_scores]
+
+
+class RadarTemplate:
+    """
+    データ以外を作り終えたレーダーチャート（1プロファイル・1組の軸ラベル分）
+
+    保存範囲（bbox_inches="tight" の結果）も作成時に求めておく。データ多角形は
+    ylim（0〜4）の内側に収まり範囲を変えないため、描画ごとに計算し直す必要はない。
+    """
+
+    def __init__(self, labels, profile="web"):
+        style = RENDER_PROFILES[profile]
+        self.profile = profile
+        self.labels = tuple(labels)
+        self.savefig = dict(style["savefig"])
+
+        angles = np.linspace(0, 2 * np.pi, len(labels), endpoint=False)
+        self._angles_plot = np.append(angles, angles[0])
+        zeros = np.zeros_like(self._angles_plot)
+
+        # 正円のレーダーチャートを生成
+        self.figure = Figure(figsize=style["figsize"])
+        FigureCanvasAgg(self.figure)
+        ax = self.figure.add_subplot(111, polar=True, aspect='equal')  # aspect='equal'で正円に
+
+        self._line, = ax.plot(self._angles_plot, zeros, 'o-', linewidth=style["linewidth"], color=ADAMS_NAVY,
+                              markersize=style["markersize"])
+        self._polygon, = ax.fill(self._angles_plot, zeros, alpha=style["fill_alpha"], color=ADAMS_ACCENT)
+        # 前回の診断（重ねるときだけ表示する）
+        self._previous_line, = ax.plot(self._angles_plot, zeros, '--', linewidth=style["linewidth"] * 0.6,
+                                       color=PREVIOUS_COLOR, zorder=self._line.get_zorder() - 0.5)
+        self._previous_line.set_visible(False)
+
+        ax.set_thetagrids(np.degrees(angles), list(labels), fontsize=style["label_fontsize"], weight='bold')
+        ax.set_ylim(0, 4)
+        ax.set_yticks([1, 2, 3, 4])
+        ax.set_yticklabels(['1', '2', '3', '4'], fontsize=style["tick_fontsize"])
+        ax.grid(True, **style["grid"])
+
+        ax.set_facecolor('#f8f9fa')
+        self.figure.patch.set_facecolor('white')
+
+        # アスペクト比を固定して正円を保つ（配置は作成時に1回だけ計算する。レイアウトエンジンを
+        # 残すと savefig のたびに下描きが走るため外しておく）
+        self.figure.tight_layout()
+        self.figure.set_layout_engine(None)
+
+        if self.savefig.get("bbox_inches") == "tight":
+            self.savefig["bbox_inches"] = self._tight_bbox(self.savefig.get("dpi", self.figure.dpi))
+
+    def _tight_bbox(self, dpi):
+        """savefig(bbox_inches="tight") と同じ保存範囲（保存時の dpi の文字幅で求める）"""
+        from matplotlib import rcParams
+
+        original_dpi = self.figure.dpi
+        self.figure.set_dpi(dpi)
+        try:
+            bbox = self.figure.get_tightbbox(self.figure.canvas.get_renderer())
+        finally:
+            self.figure.set_dpi(original_dpi)
+        pad = rcParams["savefig.pad_inches"]
+        return bbox.padded(pad)
+
+    def render(self, scores, previous=None):
+        """正規化済みスコアの多角形（と前回の診断の線）だけを差し替えて PNG を返す"""
+        scores_plot = np.append(np.asarray(scores, dtype=float), scores[0])
+        self._line.set_data(self._angles_plot, scores_plot)
+        self._polygon.set_xy(np.column_stack((self._angles_plot, scores_plot)))
+        self._previous_line.set_visible(previous is not None)
+        if previous is not None:
+            self._previous_line.set_data(self._angles_plot, np.append(np.asarray(previous, dtype=float), previous[0]))
+
+        img_buffer = BytesIO()
+        self.figure.savefig(img_buffer, format='png', **self.savefig)
+        return img_buffer.getvalue()
+
+
+class RadarTemplatePool:
+    """プロファイル・軸ラベルごとのテンプレートの貸し出し（使用中のテンプレートは他のスレッドに渡さない）"""
+
+    def __init__(self, max_idle=MAX_IDLE_TEMPLATES):
+        self.max_idle = max_idle
+        self._idle = {}  # (profile, labels) -> 未使用のテンプレートのリスト
+        self._lock = threading.Lock()
+        self.created = 0
+
+    def render(self, scores, labels, profile="web", previous=None):
+        key = (profile, tuple(labels))
+        with self._lock:
+            idle = self._idle.get(key)
+            template = idle.pop() if idle else None
+        if template is None:
+            template = RadarTemplate(labels, profile)
+            with self._lock:
+                self.created += 1
+
+        try:
+            return template.render(scores, previous)
+        finally:
+            with self._lock:
+                idle = self._idle.setdefault(key, [])
+                if len(idle) < self.max_idle:
+                    idle.append(template)
+
+    def stats(self):
+        with self._lock:
+            return {"created": self.created, "idle": sum(len(idle) for idle in self._idle.values())}
+
+
+template_pool = RadarTemplatePool()
+
+
+def render_radar_png(scores, labels, profile="web", previous=None):
+    """
+    正規化済みスコアからレーダーチャートのPNGを描画（キャッシュなし）
+
+    Args:
+        scores: 0〜4 に正規化した各軸のスコア
+        labels: 各軸の英語ラベル
+        profile: 描画プロファイル（"web" / "pdf"）
+        previous: 前回の診断の正規化済みスコア（指定すると灰色の破線で重ねる）
+
+    Returns:
+        bytes: PNG データ
+    """
+    if profile not in RENDER_PROFILES:
+        raise KeyError(profile)
+    return template_pool.render(list(scores), labels, profile, None if previous is None else list(previous))
+
+
+class RadarChartCache:
+    """正規化スコアと描画プロファイルをキーにした、スレッドセーフな LRU キャッシュ"""
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(scores, labels, profile, previous=None):
+        # 浮動小数の誤差でキーが分かれないよう丸める
+        def rounded(values):
+            return None if values is None else tuple(round(float(s), 6) for s in values)
+        return (profile, tuple(labels), rounded(scores), rounded(previous))
+
+    def get_png(self, scores, labels, profile="web", previous=None):
+        """キャッシュにあればそのPNGを、なければ描画して登録したPNGを返す"""
+        key = self.make_key(scores, labels, profile, previous)
+        with self._lock:
+            png = self._entries.get(key)
+            if png is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return png
+            self.misses += 1
+
+        # 描画はロックの外で行う（同じキーが同時に描画されても結果は同一）
+        png = render_radar_png(scores, labels, profile, previous)
+
+        with self._lock:
+            self._entries[key] = png
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return png
+
+    def stats(self):
+        """ヒット・ミス・追い出し件数と現在の保持件数"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "bytes": sum(len(png) for png in self._entries.values()),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# プロセス内で画面とPDFが共有するキャッシュ
+radar_cache = RadarChartCache()
+
+
+def get_radar_png(axis_scores, axis_max_scores, diagnostic_data, profile="web", previous_axis_scores=None):
+    """
+    軸スコアからレーダーチャートのPNGを取得（共有キャッシュ経由）
+
+    previous_axis_scores を指定すると前回の診断を重ねる（前回にない軸は今回の値で埋める）。
+    """
+    scores = normalize_scores(axis_scores, axis_max_scores)
+    labels = [diagnostic_data[label]["english_label"] for label in axis_scores]
+    previous = None
+    if previous_axis_scores is not None:
+        previous = normalize_scores({label: previous_axis_scores.get(label, score)
+                                     for label, score in axis_scores.items()}, axis_max_scores)
+    return radar_cache.get_png(scores, labels, profile, previous)
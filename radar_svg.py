@@ -0,0 +1,113 @@
+"""
+ADAMS 事業推進力診断ツール - ブラウザで描画するレーダーチャート（インラインSVG）
+
+結果ページでは正規化済みスコアから数KBのSVGを組み立てて送り、描画はブラウザに任せる。
+サーバーでの matplotlib のラスタライズと PNG（約200KB）の送信がなくなる。
+見た目は radar_chart の web プロファイル（ネイビーの線・アクセント色の塗り・0〜4 の同心円、
+右（東）から反時計回りの軸配置）に合わせている。
+"""
+
+from functools import lru_cache
+from html import escape
+from math import cos, pi, radians, sin
+
+# ADAMSブランドカラー
+ADAMS_NAVY = "#243666"
+ADAMS_ACCENT = "#4a90e2"
+# 前回の診断を重ねる線の色
+PREVIOUS_COLOR = "#888888"
+
+# SVG の座標系（viewBox）。外側に英語ラベルの余白を残す（左右のラベルが長いため横長）
+VIEW_WIDTH = 560
+VIEW_HEIGHT = 480
+CX = VIEW_WIDTH // 2
+CY = VIEW_HEIGHT // 2
+RADIUS = 160
+LABEL_RADIUS = RADIUS + 16
+# 目盛りの数字を置く角度（matplotlib の極座標の既定と同じ 22.5°）
+TICK_ANGLE = radians(22.5)
+
+
+def _point(angle, r):
+    """極座標 → SVG 座標（y 軸は下向き）"""
+    return CX + r * cos(angle), CY - r * sin(angle)
+
+
+def _angles(n):
+    return [2 * pi * i / n for i in range(n)]
+
+
+@lru_cache(maxsize=32)
+def _static_layers(labels):
+    """スコアに依存しない背景・同心円・放射線・ラベル（軸ラベルの組ごとに1回だけ組み立てる）"""
+    grid = f'stroke="{ADAMS_NAVY}" stroke-opacity="0.3" stroke-width="1" fill="none"'
+    parts = [f'<circle cx="{CX}" cy="{CY}" r="{RADIUS}" fill="#f8f9fa"/>']
+    for ring in (1, 2, 3):
+        parts.append(f'<circle cx="{CX}" cy="{CY}" r="{RADIUS * ring / 4:g}" {grid}/>')
+    # 外周（matplotlib の極座標の枠線）
+    parts.append(f'<circle cx="{CX}" cy="{CY}" r="{RADIUS}" stroke="#000" stroke-width="0.8" fill="none"/>')
+
+    for angle, label in zip(_angles(len(labels)), labels):
+        x, y = _point(angle, RADIUS)
+        parts.append(f'<line x1="{CX}" y1="{CY}" x2="{x:.1f}" y2="{y:.1f}" {grid}/>')
+        # ラベルは軸の向きに応じて寄せる（右側は左寄せ、左側は右寄せ、上下は中央）
+        lx, ly = _point(angle, LABEL_RADIUS)
+        anchor = "start" if cos(angle) > 0.1 else "end" if cos(angle) < -0.1 else "middle"
+        baseline = "auto" if sin(angle) > 0.1 else "hanging" if sin(angle) < -0.1 else "middle"
+        parts.append(f'<text x="{lx:.1f}" y="{ly:.1f}" text-anchor="{anchor}" dominant-baseline="{baseline}" '
+                     f'font-size="15" font-weight="bold">{escape(label)}</text>')
+
+    for ring in (1, 2, 3, 4):
+        x, y = _point(TICK_ANGLE, RADIUS * ring / 4)
+        parts.append(f'<text x="{x:.1f}" y="{y:.1f}" font-size="12" fill="#333">{ring}</text>')
+    return "".join(parts)
+
+
+def _polygon_points(scores, n):
+    return [_point(angle, RADIUS * min(max(float(score), 0), 4) / 4) for angle, score in zip(_angles(n), scores)]
+
+
+def render_radar_svg(scores, labels, previous=None):
+    """
+    正規化済みスコアからレーダーチャートのSVGを組み立てる
+
+    Args:
+        scores: 0〜4 に正規化した各軸のスコア
+        labels: 各軸の英語ラベル
+        previous: 前回の診断の正規化済みスコア（指定すると灰色の破線で重ねる）
+
+    Returns:
+        str: 1行のSVG（st.markdown(..., unsafe_allow_html=True) でそのまま表示できる）
+    """
+    labels = tuple(labels)
+    points = _polygon_points(scores, len(labels))
+    polygon = " ".join(f"{x:.1f},{y:.1f}" for x, y in points)
+    overlay = ""
+    if previous is not None:
+        previous_polygon = " ".join(f"{x:.1f},{y:.1f}" for x, y in _polygon_points(previous, len(labels)))
+        overlay = (f'<polygon points="{previous_polygon}" fill="none" stroke="{PREVIOUS_COLOR}" '
+                   f'stroke-width="2" stroke-dasharray="6 4"/>')
+    markers = "".join(f'<circle cx="{x:.1f}" cy="{y:.1f}" r="5" fill="{ADAMS_NAVY}"/>' for x, y in points)
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {VIEW_WIDTH} {VIEW_HEIGHT}" overflow="visible" '
+        f'style="width: 100%; max-width: 640px; font-family: sans-serif;" role="img" aria-label="レーダーチャート">'
+        f'{_static_layers(labels)}{overlay}'
+        f'<polygon points="{polygon}" fill="{ADAMS_ACCENT}" fill-opacity="0.3" '
+        f'stroke="{ADAMS_NAVY}" stroke-width="3" stroke-linejoin="round"/>'
+        f'{markers}</svg>'
+    )
+
+
+def get_radar_svg(axis_scores, axis_max_scores, diagnostic_data, previous_axis_scores=None):
+    """
+    軸スコアからレーダーチャートのSVGを取得（radar_chart.get_radar_png() と同じ正規化・軸順）
+
+    previous_axis_scores を指定すると前回の診断を重ねる（前回にない軸は今回の値で埋める）。
+    """
+    scores = [axis_scores[label] / axis_max_scores[label] * 4 for label in axis_scores]
+    labels = [diagnostic_data[label]["english_label"] for label in axis_scores]
+    previous = None
+    if previous_axis_scores is not None:
+        previous = [previous_axis_scores.get(label, axis_scores[label]) / axis_max_scores[label] * 4
+                    for label in axis_scores]
+    return render_radar_svg(scores, labels, previous)
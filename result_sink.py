@@ -0,0 +1,314 @@
+"""
+ADAMS 事業推進力診断ツール - 診断結果の非同期保存（ライトビハインド）
+
+結果ページの描画中に保存先との通信を待たないよう、診断結果はプロセス内の
+上限付きキューに積むだけにして、バックグラウンドの書き込みスレッドが
+まとめて追記する。失敗時は指数バックオフで再試行する。
+キューの深さ・バッチサイズ・フラッシュ遅延は /metrics のゲージ（adams_result_writer_*）に出力する。
+
+保存先（ADAMS_RESULT_SINK）:
+    sqlite  ローカルの SQLite（ADAMS_RESULT_DB、既定: data/diagnoses.sqlite3）
+    sheets  Google Sheets の batch append 互換 HTTP API（ADAMS_SHEETS_URL / ADAMS_SHEETS_ID）
+    none    保存しない
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import urllib.parse
+import urllib.request
+from datetime import datetime
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = os.path.join("data", "diagnoses.sqlite3")
+
+
+# ===== 保存先 =====
+
+class ResultSink:
+    """保存先の基底クラス。write_batch() は書き込みスレッドからのみ呼ばれる"""
+
+    def write_batch(self, rows):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SQLiteSink(ResultSink):
+    """ローカルの SQLite に1行1JSONで追記する"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS diagnoses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at TEXT NOT NULL,
+            payload TEXT NOT NULL
+        )
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(self.SCHEMA)
+        return self._conn
+
+    def write_batch(self, rows):
+        conn = self._connect()
+        created_at = datetime.now().isoformat(timespec="seconds")
+        with conn:
+            conn.executemany(
+                "INSERT INTO diagnoses (created_at, payload) VALUES (?, ?)",
+                [(created_at, json.dumps(row, ensure_ascii=False)) for row in rows],
+            )
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def _cell(value):
+    """シートのセルは文字列・数値のみのため、リストなどは JSON 文字列にする"""
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+class SheetsSink(ResultSink):
+    """
+    Google Sheets API の values:append と同じ形式でまとめて追記する
+
+    列は SHEET_COLUMNS で固定し、最初の書き込みの前に見出し行を1行目に書く（values:update。
+    どのプロセスが書いても同じ内容になる）。診断票ごとに異なる軸のスコアは「軸スコア」列に、
+    固定の列にないキーは「その他」列に JSON でまとめるため、行のキーの違いで列がずれたり値が落ちたりしない。
+    """
+
+    SHEET_COLUMNS = ("診断日時", "診断票", "総合スコア", "最大スコア", "達成率", "ランク",
+                     "業種", "従業員規模", "回答コード", "軸スコア", "その他")
+
+    def __init__(self, base_url, spreadsheet_id, sheet_range="Sheet1!A1", timeout=10):
+        values_url = f"{base_url.rstrip('/')}/v4/spreadsheets/{urllib.parse.quote(spreadsheet_id)}/values/"
+        self.url = f"{values_url}{urllib.parse.quote(sheet_range)}:append" \
+                   "?valueInputOption=RAW&insertDataOption=INSERT_ROWS"
+        sheet = sheet_range.split("!", 1)[0]
+        self.header_url = f"{values_url}{urllib.parse.quote(f'{sheet}!A1')}?valueInputOption=RAW"
+        self.timeout = timeout
+        self.header_written = False
+
+    def to_row(self, result):
+        """診断結果の辞書を SHEET_COLUMNS の順のセルにする"""
+        others = [key for key in result if key not in self.SHEET_COLUMNS]
+        axis_scores = {key[:-len("スコア")]: result[key] for key in others if key.endswith("スコア")}
+        extra = {key: result[key] for key in others if not key.endswith("スコア")}
+        row = dict(result, 軸スコア=axis_scores, その他=extra or "")
+        return [_cell(row.get(column, "")) for column in self.SHEET_COLUMNS]
+
+    def _request(self, url, method, values):
+        body = json.dumps({"majorDimension": "ROWS", "values": values}, ensure_ascii=False).encode("utf-8")
+        request = urllib.request.Request(
+            url, data=body, method=method,
+            headers={"Content-Type": "application/json; charset=utf-8"},
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+    def write_batch(self, rows):
+        if not self.header_written:
+            self._request(self.header_url, "PUT", [list(self.SHEET_COLUMNS)])
+            self.header_written = True
+        self._request(self.url, "POST", [self.to_row(row) for row in rows])
+
+
+# ===== 書き込みスレッド =====
+
+class WriteBehindWriter:
+    """上限付きキューとバックグラウンド書き込みスレッド"""
+
+    def __init__(self, sink, max_queue=1000, batch_size=50, flush_interval=1.0,
+                 max_retries=5, backoff_base=0.5, backoff_max=30.0):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "enqueued": 0,
+            "dropped": 0,
+            "written": 0,
+            "failed": 0,
+            "batches": 0,
+            "retries": 0,
+            "last_batch_size": 0,
+            "max_queue_depth": 0,
+            "last_flush_latency": 0.0,
+            "max_flush_latency": 0.0,
+        }
+        self._thread = threading.Thread(target=self._run, name="adams-result-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, row):
+        """結果を1件キューに積む（待たない）。キューが満杯なら捨てて False を返す"""
+        try:
+            self._queue.put_nowait((time.perf_counter(), row))
+        except queue.Full:
+            with self._stats_lock:
+                self._stats["dropped"] += 1
+            WRITER_ROWS.inc(result="dropped")
+            logger.warning("保存キューが満杯のため診断結果を破棄しました")
+            return False
+        with self._stats_lock:
+            self._stats["enqueued"] += 1
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._queue.qsize())
+        WRITER_ROWS.inc(result="enqueued")
+        return True
+
+    def _next_batch(self):
+        """最初の1件を待ち、flush_interval の間に batch_size 件まで集める"""
+        try:
+            batch = [self._queue.get(timeout=0.2)]
+        except queue.Empty:
+            return []
+        deadline = time.perf_counter() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                # 停止中は待たずに、残っている分だけをまとめる
+                if self._stop.is_set():
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_with_retry(self, rows):
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.sink.write_batch(rows)
+                return True
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error("診断結果 %d 件の保存に失敗しました: %s", len(rows), e)
+                    return False
+                delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+                logger.warning("保存に失敗したため %.1f 秒後に再試行します: %s", delay, e)
+                with self._stats_lock:
+                    self._stats["retries"] += 1
+                WRITER_RETRIES.inc()
+                time.sleep(delay)
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if not batch:
+                continue
+            ok = self._write_with_retry([row for _, row in batch])
+            latency = time.perf_counter() - batch[0][0]
+            with self._stats_lock:
+                self._stats["batches"] += 1
+                self._stats["last_batch_size"] = len(batch)
+                self._stats["written" if ok else "failed"] += len(batch)
+                self._stats["last_flush_latency"] = latency
+                self._stats["max_flush_latency"] = max(self._stats["max_flush_latency"], latency)
+            WRITER_ROWS.inc(len(batch), result="written" if ok else "failed")
+            logger.debug("診断結果 %d 件を保存しました（%.3fs, 残り %d 件）",
+                         len(batch), latency, self._queue.qsize())
+        # SQLite の接続は作成したスレッドでしか閉じられないため、ここで閉じる
+        self.sink.close()
+
+    def stats(self):
+        """キューの深さ・バッチサイズ・フラッシュ遅延などの統計"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self._queue.qsize()
+        stats["avg_batch_size"] = (stats["written"] + stats["failed"]) / stats["batches"] if stats["batches"] else 0.0
+        return stats
+
+    def close(self, timeout=5.0):
+        """キューに残った結果を書き出してから停止する（timeout 秒まで待つ）"""
+        self._stop.set()
+        self._thread.join(timeout)
+
+
+# ===== プロセス共有の書き込みスレッド =====
+
+_writer = None
+_writer_lock = threading.Lock()
+
+WRITER_QUEUE_DEPTH = REGISTRY.gauge(
+    "adams_result_writer_queue_depth", "保存キューの件数（stat=current: 現在 / max: 起動後の最大）", ("stat",))
+WRITER_BATCH_SIZE = REGISTRY.gauge(
+    "adams_result_writer_batch_size", "1回の書き込みの件数（stat=last: 直近 / avg: 平均）", ("stat",))
+WRITER_FLUSH_LATENCY = REGISTRY.gauge(
+    "adams_result_writer_flush_latency_seconds",
+    "キューに積んでから書き込み終えるまでの秒数（バッチの先頭の結果。stat=last: 直近 / max: 最大）", ("stat",))
+WRITER_ROWS = REGISTRY.counter(
+    "adams_result_writer_rows_total", "保存キューの結果の件数（result=enqueued/dropped/written/failed）", ("result",))
+WRITER_RETRIES = REGISTRY.counter("adams_result_writer_retries_total", "書き込みの再試行の回数")
+
+
+def _collect():
+    """/metrics の出力時に書き込みスレッドの統計をゲージに反映する"""
+    if _writer is None:
+        return
+    stats = _writer.stats()
+    WRITER_QUEUE_DEPTH.set(stats["queue_depth"], stat="current")
+    WRITER_QUEUE_DEPTH.set(stats["max_queue_depth"], stat="max")
+    WRITER_BATCH_SIZE.set(stats["last_batch_size"], stat="last")
+    WRITER_BATCH_SIZE.set(stats["avg_batch_size"], stat="avg")
+    WRITER_FLUSH_LATENCY.set(stats["last_flush_latency"], stat="last")
+    WRITER_FLUSH_LATENCY.set(stats["max_flush_latency"], stat="max")
+
+
+REGISTRY.add_collector(_collect)
+
+
+def create_sink_from_env():
+    """環境変数から保存先を作る（none のときは None）"""
+    kind = os.environ.get("ADAMS_RESULT_SINK", "sqlite")
+    if kind == "sqlite":
+        return SQLiteSink(os.environ.get("ADAMS_RESULT_DB", DEFAULT_DB_PATH))
+    if kind == "sheets":
+        return SheetsSink(
+            os.environ.get("ADAMS_SHEETS_URL", "http://127.0.0.1:8765"),
+            os.environ.get("ADAMS_SHEETS_ID", "local"),
+            os.environ.get("ADAMS_SHEETS_RANGE", "Sheet1!A1"),
+        )
+    if kind == "none":
+        return None
+    raise ValueError(f"未対応の保存先です: {kind}")
+
+
+def get_result_writer():
+    """プロセス内で共有する書き込みスレッド（保存先が none なら None）"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            sink = create_sink_from_env()
+            if sink is None:
+                return None
+            _writer = WriteBehindWriter(sink)
+            atexit.register(_writer.close)
+        return _writer
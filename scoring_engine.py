@@ -0,0 +1,133 @@
+"""
+ADAMS 事業推進力診断ツール - スコア計算エンジン
+
+N人分の回答行列（N×設問数の整数配列）を NumPy で一括採点する。
+Streamlit 画面からは N=1 で呼び出し、バッチ処理と同じ結果を得る。
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+# 1問あたりの最高点（回答は 1〜4、0 は未回答）
+MAX_ANSWER = 4
+
+# ランク判定の閾値（達成率%）と対応するランク・ラベル
+RANK_THRESHOLDS = (85, 70, 55)
+RANKS = ("A", "B", "C", "D")
+RANK_LABELS = ("優良レベル", "標準レベル", "要改善レベル", "危機レベル")
+
+# 改善テーマのレベル判定閾値（軸ごとの達成率%）
+LEVEL_THRESHOLDS = (75, 50)
+LEVELS = ("high", "medium", "low")
+
+
+def rank_indices(percentage):
+    """達成率からランクの添字（0=A 〜 3=D）を求める（配列・スカラー両対応）"""
+    pct = np.asarray(percentage, dtype=np.float64)
+    return (pct[..., np.newaxis] < np.array(RANK_THRESHOLDS)).sum(axis=-1)
+
+
+def level_indices(percentage):
+    """軸ごとの達成率から改善レベルの添字（0=high 〜 2=low）を求める"""
+    pct = np.asarray(percentage, dtype=np.float64)
+    return (pct[..., np.newaxis] < np.array(LEVEL_THRESHOLDS)).sum(axis=-1)
+
+
+@dataclass
+class BatchScores:
+    """一括採点の結果（先頭の次元が回答者）"""
+    axis_names: list
+    axis_scores: np.ndarray        # N×軸数 の合計点
+    axis_max_scores: np.ndarray    # 軸数 の最大点
+    axis_percentages: np.ndarray   # N×軸数 の達成率(%)
+    total_scores: np.ndarray       # N の総合スコア
+    max_total_score: int
+    percentages: np.ndarray        # N の総合達成率(%)
+    rank_index: np.ndarray         # N のランク添字（RANKS 参照）
+    level_index: np.ndarray        # N×軸数 の改善レベル添字（LEVELS 参照）
+
+    def __len__(self):
+        return len(self.total_scores)
+
+    @property
+    def ranks(self):
+        return np.array(RANKS)[self.rank_index]
+
+    @property
+    def levels(self):
+        return np.array(LEVELS)[self.level_index]
+
+    def row(self, i):
+        """
+        i 番目の回答者の結果を calculate_scores() と同じ形で返す
+
+        Returns:
+            tuple: (axis_scores, axis_max_scores, total_score, max_total_score, percentage)
+        """
+        axis_scores = {name: int(score) for name, score in zip(self.axis_names, self.axis_scores[i])}
+        axis_max_scores = {name: int(score) for name, score in zip(self.axis_names, self.axis_max_scores)}
+        return (axis_scores, axis_max_scores, int(self.total_scores[i]),
+                self.max_total_score, float(self.percentages[i]))
+
+
+class ScoringEngine:
+    """診断データの軸構成から作る一括採点エンジン"""
+
+    def __init__(self, diagnostic_data, max_answer=MAX_ANSWER):
+        self.max_answer = max_answer
+        self.axis_names = list(diagnostic_data.keys())
+        self.question_counts = np.array(
+            [len(axis_data["questions"]) for axis_data in diagnostic_data.values()], dtype=np.int64
+        )
+        if len(self.question_counts) == 0 or (self.question_counts == 0).any():
+            raise ValueError("各軸に1問以上の設問が必要です")
+
+        # 各軸の先頭設問の列位置（reduceat 用）と総設問数
+        self.offsets = np.concatenate(([0], np.cumsum(self.question_counts)))
+        self.num_questions = int(self.offsets[-1])
+
+        self.axis_max_scores = self.question_counts * max_answer
+        self.max_total_score = int(self.axis_max_scores.sum())
+
+    def answers_from_session(self, sheet):
+        """セッションの回答（answer_sheet.AnswerSheet）を 1×設問数 の配列として読む（コピーしない）"""
+        return np.frombuffer(sheet.data, dtype=np.int8)[np.newaxis, :]
+
+    def score(self, answers):
+        """
+        回答行列を一括採点
+
+        Args:
+            answers: N×設問数 の整数配列（1次元なら1人分として扱う）。0 は未回答
+
+        Returns:
+            BatchScores: 全回答者の採点結果
+        """
+        answers = np.asarray(answers)
+        if answers.ndim == 1:
+            answers = answers[np.newaxis, :]
+        if answers.ndim != 2 or answers.shape[1] != self.num_questions:
+            raise ValueError(f"回答行列は N×{self.num_questions} である必要があります: {answers.shape}")
+        if answers.size and (answers.min() < 0 or answers.max() > self.max_answer):
+            raise ValueError(f"回答は 0〜{self.max_answer} の整数である必要があります")
+
+        answers = answers.astype(np.int64)
+        axis_scores = np.add.reduceat(answers, self.offsets[:-1], axis=1)
+        total_scores = axis_scores.sum(axis=1)
+
+        # calculate_scores() と同じ演算順（点数 / 最大点 * 100）で達成率を求める
+        axis_percentages = axis_scores / self.axis_max_scores * 100
+        percentages = total_scores / self.max_total_score * 100
+
+        return BatchScores(
+            axis_names=self.axis_names,
+            axis_scores=axis_scores,
+            axis_max_scores=self.axis_max_scores,
+            axis_percentages=axis_percentages,
+            total_scores=total_scores,
+            max_total_score=self.max_total_score,
+            percentages=percentages,
+            rank_index=rank_indices(percentages),
+            level_index=level_indices(axis_percentages),
+        )
@@ -0,0 +1,125 @@
+"""
+ADAMS 事業推進力診断ツール - セッションごとのメモリ使用量
+
+Streamlit のサーバー内にある全セッションの st.session_state を走査し、
+キーごとの値（参照先を含む）のバイト数を合計する。診断票のように全セッションで
+共有しているオブジェクトは各セッションには数えない。
+レプリカあたりの同時セッション数の見積もりに使う。
+
+セッション数と合計バイト数は /metrics のゲージ（adams_sessions / adams_session_state_bytes）にも出力する。
+
+    ADAMS_SESSION_DIAGNOSTICS  設定すると ?diagnostics=<この値> でセッションごとの一覧を表示する
+"""
+
+import logging
+import sys
+from dataclasses import dataclass, field
+
+from metrics import REGISTRY
+from questionnaire import Questionnaire
+
+logger = logging.getLogger(__name__)
+
+SESSIONS = REGISTRY.gauge("adams_sessions", "サーバー上のセッション数")
+SESSION_STATE_BYTES = REGISTRY.gauge(
+    "adams_session_state_bytes", "session_state のバイト数（stat=total: 全セッションの合計 / max: 最大のセッション）",
+    ("stat",))
+
+# 全セッションで共有し、セッションのメモリに数えない型（診断票はレジストリのキャッシュを参照している）
+SHARED_TYPES = (Questionnaire, type, type(sys))
+
+
+def deep_sizeof(obj, seen=None):
+    """
+    obj と、そこから参照されるコンテナ・オブジェクトのバイト数（sys.getsizeof の合計。同じオブジェクトは1回だけ）
+
+    Args:
+        obj: 測る値
+        seen: 数え済みのオブジェクトの id の集合（複数の値で共有している部分を重複して数えないため）
+    """
+    seen = set() if seen is None else seen
+    stack = [obj]
+    total = 0
+    while stack:
+        value = stack.pop()
+        if id(value) in seen or isinstance(value, SHARED_TYPES):
+            continue
+        seen.add(id(value))
+        total += sys.getsizeof(value)
+        if isinstance(value, dict):
+            stack.extend(value.keys())
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            stack.extend(value)
+        elif not isinstance(value, (str, bytes, bytearray, int, float)):
+            if hasattr(value, "__dict__"):
+                stack.append(vars(value))
+            for name in getattr(type(value), "__slots__", ()):
+                if hasattr(value, name):
+                    stack.append(getattr(value, name))
+    return total
+
+
+@dataclass
+class SessionMemory:
+    """1セッション分の session_state の使用量"""
+    session_id: str
+    page: str
+    total_bytes: int = 0
+    key_bytes: dict = field(default_factory=dict)  # キー -> バイト数（大きい順）
+
+
+def measure_session_state(session_id, state):
+    """
+    1セッションの session_state（キー → 値の対応）の使用量
+
+    Returns:
+        SessionMemory: キーごとのバイト数（キーの文字列を含む）
+    """
+    seen = set()
+    key_bytes = {}
+    for key, value in list(state.items()):
+        key_bytes[key] = sys.getsizeof(key) + deep_sizeof(value, seen)
+    return SessionMemory(
+        session_id=session_id,
+        page=str(state.get("page", "-")),
+        total_bytes=sum(key_bytes.values()),
+        key_bytes=dict(sorted(key_bytes.items(), key=lambda item: item[1], reverse=True)),
+    )
+
+
+def _active_sessions():
+    """サーバー上の全セッション（Streamlit の実行環境がなければ空）"""
+    from streamlit.runtime import Runtime
+    if not Runtime.exists():
+        return []
+    # セッション一覧の公開APIがないため、セッション管理の内部属性から取得する
+    return Runtime.instance()._session_mgr.list_sessions()
+
+
+def session_memory_report():
+    """
+    全セッションの使用量（大きい順）
+
+    Returns:
+        list: SessionMemory のリスト（他のスレッドで実行中のセッションは読み取れた範囲で数える）
+    """
+    report = []
+    for info in _active_sessions():
+        try:
+            report.append(measure_session_state(info.session.id, info.session.session_state.filtered_state))
+        except (RuntimeError, KeyError):
+            # スクリプトの実行中で状態が書き換わっている。次の集計で数える
+            logger.debug("セッション %s の状態を読み取れませんでした", info.session.id)
+    return sorted(report, key=lambda memory: memory.total_bytes, reverse=True)
+
+
+def _collect():
+    """/metrics の出力時にゲージを更新する"""
+    report = session_memory_report()
+    SESSIONS.set(len(report))
+    SESSION_STATE_BYTES.set(sum(memory.total_bytes for memory in report), stat="total")
+    SESSION_STATE_BYTES.set(report[0].total_bytes if report else 0, stat="max")
+
+
+REGISTRY.add_collector(_collect)
@@ -0,0 +1,145 @@
+"""
+ADAMS 事業推進力診断ツール - Google Sheets batch append API のローカル代替サーバー
+
+values:append と同じURL・リクエスト形式を受け付け、追記された行を JSON Lines に保存する。
+見出し行の書き込み（values:update）は、内容が変わったときだけ同じファイルに1行として記録する。
+ネットワークに出られない環境での動作確認や、保存パイプラインの負荷試験に使う。
+
+    python sheets_stub_server.py --port 8765 --output data/sheets_stub.jsonl
+    ADAMS_RESULT_SINK=sheets ADAMS_SHEETS_URL=http://127.0.0.1:8765 streamlit run streamlit_app.py
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+APPEND_PATH = re.compile(r"^/v4/spreadsheets/(?P<spreadsheet_id>[^/]+)/values/(?P<range>[^/?]+):append$")
+UPDATE_PATH = re.compile(r"^/v4/spreadsheets/(?P<spreadsheet_id>[^/]+)/values/(?P<range>[^/?:]+)$")
+
+
+class SheetsStubHandler(BaseHTTPRequestHandler):
+    server_version = "SheetsStub/1.0"
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_values(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            return json.loads(self.rfile.read(length))["values"]
+        except (ValueError, KeyError):
+            self._send_json(400, {"error": {"code": 400, "message": "Invalid JSON payload"}})
+            return None
+
+    def do_PUT(self):
+        match = UPDATE_PATH.match(self.path.split("?", 1)[0])
+        if not match:
+            self._send_json(404, {"error": {"code": 404, "message": "Not found"}})
+            return
+        values = self._read_values()
+        if values is None:
+            return
+        with self.server.lock:
+            if values != self.server.header:
+                self.server.header = values
+                with open(self.server.output, "a", encoding="utf-8") as f:
+                    for row in values:
+                        f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self._send_json(200, {
+            "spreadsheetId": match.group("spreadsheet_id"),
+            "updatedRange": urllib.parse.unquote(match.group("range")),
+            "updatedRows": len(values),
+            "updatedColumns": max((len(row) for row in values), default=0),
+            "updatedCells": sum(len(row) for row in values),
+        })
+
+    def do_POST(self):
+        match = APPEND_PATH.match(self.path.split("?", 1)[0])
+        if not match:
+            self._send_json(404, {"error": {"code": 404, "message": "Not found"}})
+            return
+
+        # 障害注入（再試行の確認用）
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if random.random() < self.server.fail_rate:
+            self._send_json(503, {"error": {"code": 503, "message": "The service is currently unavailable."}})
+            return
+
+        values = self._read_values()
+        if values is None:
+            return
+
+        with self.server.lock:
+            with open(self.server.output, "a", encoding="utf-8") as f:
+                for row in values:
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            self.server.rows += len(values)
+            start_row = self.server.rows - len(values) + 1
+
+        sheet = match.group("range").split("!", 1)[0]
+        self._send_json(200, {
+            "spreadsheetId": match.group("spreadsheet_id"),
+            "updates": {
+                "spreadsheetId": match.group("spreadsheet_id"),
+                "updatedRange": f"{sheet}!A{start_row}:Z{self.server.rows}",
+                "updatedRows": len(values),
+                "updatedColumns": max((len(row) for row in values), default=0),
+                "updatedCells": sum(len(row) for row in values),
+            },
+        })
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def create_server(host="127.0.0.1", port=8765, output="data/sheets_stub.jsonl",
+                  fail_rate=0.0, latency=0.0, verbose=False):
+    """代替サーバーを作る（serve_forever() で起動）"""
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    server = ThreadingHTTPServer((host, port), SheetsStubHandler)
+    server.output = output
+    server.fail_rate = fail_rate
+    server.latency = latency
+    server.verbose = verbose
+    server.lock = threading.Lock()
+    server.rows = 0
+    server.header = None
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Google Sheets values:append 互換のローカルサーバー")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", default="data/sheets_stub.jsonl", help="追記された行の保存先")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="503 を返す割合（0〜1）")
+    parser.add_argument("--latency", type=float, default=0.0, help="応答までの遅延（秒）")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    server = create_server(args.host, args.port, args.output, args.fail_rate, args.latency, args.verbose)
+    print(f"Sheets stub listening on http://{args.host}:{args.port} -> {args.output}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,17 @@
+import hmac
+import os
+
 import streamlit as st
-import matplotlib.pyplot as plt
-import numpy as np
-import matplotlib.font_manager as fm
 from datetime import datetime
-import json
-import base64
-from io import BytesIO
+
+# numpy / matplotlib / reportlab は結果ページで初めて読み込む（初回表示を軽くするため）
+from answer_codec import AnswerCodeError, decode_answers, encode_answers
+from answer_sheet import AnswerSheet
+from assets import LOGO_PNG, css_tag
+from questionnaire import QuestionnaireError, get_questionnaire
+from metrics import PAGE_TRANSITIONS, page_span, span, start_exporter
+from session_memory import session_memory_report
+from warmup import start_warmup, warmup_report
 
 st.set_page_config(page_title="ADAMS 事業推進力診断ツール", layout="wide", initial_sidebar_state="collapsed")
 
@@ -15,398 +21,147 @@ ADAMS_LIGHT_NAVY = "#3d5a8f"
 ADAMS_ACCENT = "#4a90e2"
 ADAMS_GOLD = "#d4af37"
 
-# カスタムCSS
-st.markdown(f"""
-<style>
-    /* 全体の背景にグラデーション */
-    .stApp {{
-        background: linear-gradient(135deg, #f5f7fa 0%, #c3cfe2 100%);
-    }}
-    
-    /* 印刷時の背景色 */
-    @media print {{
-        .stApp {{
-            background: white !important;
-        }}
-        .no-print {{
-            display: none !important;
-        }}
-    }}
-    
-    /* メインコンテンツエリア */
-    .main .block-container {{
-        padding-top: 1rem;
-        padding-bottom: 2rem;
-        max-width: 1200px;
-    }}
-    
-    /* ヘッダースタイル */
-    .main-header {{
-        font-size: 2.8rem;
-        font-weight: 800;
-        background: linear-gradient(135deg, {ADAMS_NAVY} 0%, {ADAMS_ACCENT} 100%);
-        -webkit-background-clip: text;
-        -webkit-text-fill-color: transparent;
-        background-clip: text;
-        text-align: center;
-        margin-bottom: 0.5rem;
-        margin-top: 1rem;
-    }}
-    
-    .sub-header {{
-        font-size: 1.1rem;
-        text-align: center;
-        color: #5a6c7d;
-        margin-bottom: 2rem;
-        font-weight: 400;
-    }}
-    
-    /* カードスタイル */
-    .info-card {{
-        background: white;
-        border-radius: 12px;
-        padding: 1.2rem;
-        box-shadow: 0 2px 4px rgba(0, 0, 0, 0.06);
-        margin-bottom: 1rem;
-        border: 1px solid rgba(36, 54, 102, 0.08);
-        height: 100%;
-        display: flex;
-        flex-direction: column;
-    }}
-    
-    .info-card h3 {{
-        margin-top: 0;
-        margin-bottom: 0.8rem;
-        color: {ADAMS_NAVY};
-    }}
-    
-    .info-card p, .info-card ul {{
-        margin-top: 0;
-        margin-bottom: 0.5rem;
-    }}
-    
-    .info-card ul {{
-        padding-left: 1.2rem;
-    }}
-    
-    .info-card ul li {{
-        margin-bottom: 0.2rem;
-    }}
-    
-    .info-card:hover {{
-        transform: translateY(-2px);
-        box-shadow: 0 4px 8px rgba(0, 0, 0, 0.1);
-        transition: all 0.3s ease;
-    }}
-    
-    /* ボタンスタイル */
-    .stButton>button {{
-        background: linear-gradient(135deg, {ADAMS_NAVY} 0%, {ADAMS_LIGHT_NAVY} 100%);
-        color: white;
-        border: none;
-        border-radius: 12px;
-        padding: 0.75rem 2rem;
-        font-weight: 600;
-        font-size: 1.1rem;
-        transition: all 0.3s ease;
-        box-shadow: 0 4px 12px rgba(36, 54, 102, 0.3);
-    }}
-    
-    .stButton>button:hover {{
-        transform: translateY(-2px);
-        box-shadow: 0 6px 20px rgba(36, 54, 102, 0.4);
-    }}
-    
-    /* 質問カードスタイル */
-    .question-card {{
-        background: white;
-        border-left: 4px solid {ADAMS_ACCENT};
-        border-radius: 12px;
-        padding: 1.5rem;
-        margin-bottom: 1.5rem;
-        box-shadow: 0 2px 8px rgba(0, 0, 0, 0.08);
-        transition: all 0.3s ease;
-    }}
-    
-    .question-card:hover {{
-        box-shadow: 0 4px 16px rgba(0, 0, 0, 0.12);
-        transform: translateX(4px);
-    }}
-    
-    /* ロゴコンテナ */
-    .logo-container {{
-        text-align: left;
-        margin-bottom: 1rem;
-    }}
-    
-    /* プログレスバー */
-    .stProgress > div > div > div {{
-        background: linear-gradient(90deg, {ADAMS_NAVY} 0%, {ADAMS_ACCENT} 100%);
-    }}
-    
-    /* 著作権表示 */
-    .copyright {{
-        text-align: center;
-        color: #5a6c7d;
-        font-size: 0.85rem;
-        margin-top: 2rem;
-        padding: 1rem;
-        border-top: 1px solid rgba(36, 54, 102, 0.1);
-    }}
-    
-    /* ランクカード */
-    .rank-card {{
-        text-align: center;
-        padding: 2rem;
-        border-radius: 16px;
-        color: white;
-        box-shadow: 0 4px 12px rgba(0,0,0,0.15);
-        margin-bottom: 1rem;
-    }}
-    
-    /* Streamlitのデフォルトマージン削減 */
-    .element-container {{
-        margin-bottom: 0.5rem !important;
-    }}
-    
-    h1, h2, h3, h4 {{
-        margin-top: 1rem !important;
-        margin-bottom: 0.5rem !important;
-    }}
-</style>
-""", unsafe_allow_html=True)
-
-# 診断データ（6軸36問）
-diagnostic_data = {
-    "経営ビジョンの明確さ": {
-        "english_label": "Vision",
-        "icon": "🎯",
-        "questions": [
-            "経営理念やビジョン（将来のあるべき姿）が明文化されていますか？",
-            "経営理念やビジョンは、社員全員が理解し、共感できる内容ですか？",
-            "経営理念やビジョンを、定期的に社員に伝え、浸透させる機会がありますか？",
-            "3〜5年後の具体的な事業目標（売上、利益、顧客数など）を設定していますか？",
-            "自社の強み（他社にない独自の価値）を明確に把握していますか？",
-            "お客様から「この会社でなければならない」と選ばれる理由がありますか？"
-        ],
-        "improvement_themes": {
-            "high": [
-                "✓ ビジョンの更なる具体化と進化",
-                "✓ 社会的価値の創造と発信",
-                "✓ ブランド力の強化"
-            ],
-            "medium": [
-                "✓ 理念の定期的な見直しと更新",
-                "✓ 社員への浸透活動の強化",
-                "✓ 中長期目標の明確化",
-                "✓ 独自の強みの言語化"
-            ],
-            "low": [
-                "✓ 経営理念・ビジョンの策定",
-                "✓ 社員との対話機会の創出",
-                "✓ 3〜5年後の目標設定",
-                "✓ 自社の強みの棚卸し",
-                "✓ 顧客価値の明確化"
-            ]
-        }
-    },
-    "事業計画の実行管理": {
-        "english_label": "Planning",
-        "icon": "📋",
-        "questions": [
-            "年間の事業計画（売上計画・利益計画）を作成していますか？",
-            "事業計画を達成するための具体的な行動計画がありますか？",
-            "計画の進捗状況を、月次または週次で確認していますか？",
-            "計画と実績の差異（ギャップ）が生じた際、原因分析を行っていますか？",
-            "計画が未達の場合、改善策を立て、すぐに行動していますか？",
-            "年度末には計画の振り返りを行い、次年度の計画に活かしていますか？",
-            "社員に対して、会社の計画や目標を明確に伝えていますか？"
-        ],
-        "improvement_themes": {
-            "high": [
-                "✓ 計画精度のさらなる向上",
-                "✓ PDCAサイクルの高速化",
-                "✓ データドリブン経営の推進"
-            ],
-            "medium": [
-                "✓ 月次レビューの質の向上",
-                "✓ 差異分析の深掘り",
-                "✓ 改善アクションの迅速化",
-                "✓ 社員への情報共有強化"
-            ],
-            "low": [
-                "✓ 年間事業計画の策定",
-                "✓ 行動計画の具体化",
-                "✓ 進捗確認の仕組み構築",
-                "✓ 差異分析の習慣化",
-                "✓ 計画の見える化"
-            ]
-        }
-    },
-    "組織体制の強さ": {
-        "english_label": "Organization",
-        "icon": "👥",
-        "questions": [
-            "各メンバーの役割と責任が明確になっていますか？",
-            "組織図や業務分担表が整備されていますか？",
-            "社員の能力やスキルを把握し、適材適所の配置ができていますか？",
-            "定期的な1on1ミーティングや評価面談を実施していますか？",
-            "社員の育成計画があり、スキルアップの機会を提供していますか？",
-            "社内のコミュニケーションは円滑で、風通しの良い職場環境ですか？"
-        ],
-        "improvement_themes": {
-            "high": [
-                "✓ 次世代リーダーの育成",
-                "✓ 組織文化のさらなる強化",
-                "✓ エンゲージメント向上施策"
-            ],
-            "medium": [
-                "✓ 役割分担の最適化",
-                "✓ 評価制度の見直し",
-                "✓ 育成プログラムの体系化",
-                "✓ コミュニケーション活性化"
-            ],
-            "low": [
-                "✓ 組織図の作成",
-                "✓ 役割と責任の明確化",
-                "✓ 1on1ミーティングの導入",
-                "✓ 評価制度の構築",
-                "✓ 育成計画の策定"
-            ]
-        }
-    },
-    "経営者の時間の使い方": {
-        "english_label": "Time Mgmt",
-        "icon": "⏰",
-        "questions": [
-            "経営者として、「やるべきこと」と「やりたいこと」を明確に区別できていますか？",
-            "日々の業務の中で、重要な経営課題に取り組む時間を確保できていますか？",
-            "現場の細かい業務に追われず、経営者としての本来の役割に集中できていますか？",
-            "社員に仕事を任せ、権限委譲ができていますか？",
-            "中長期的な戦略を考える時間を定期的に確保していますか？",
-            "自己研鑽や学びの時間を意識的に取っていますか？"
-        ],
-        "improvement_themes": {
-            "high": [
-                "✓ 戦略的思考時間のさらなる拡大",
-                "✓ 外部ネットワーク構築",
-                "✓ 経営者としての学びの深化"
-            ],
-            "medium": [
-                "✓ 時間管理手法の高度化",
-                "✓ 権限委譲の拡大",
-                "✓ 重要課題への集中力向上",
-                "✓ 学習時間の確保"
-            ],
-            "low": [
-                "✓ 時間の使い方の可視化",
-                "✓ 優先順位の明確化",
-                "✓ 権限委譲の開始",
-                "✓ 戦略思考時間の確保",
-                "✓ 学びの習慣化"
-            ]
-        }
-    },
-    "数値管理の仕組み": {
-        "english_label": "KPI",
-        "icon": "📊",
-        "questions": [
-            "月次の売上・利益を正確に把握していますか？",
-            "経営判断に必要な数値（KPI）を定期的にチェックしていますか？",
-            "数値データをもとに、問題点や改善点を見つけられていますか？",
-            "キャッシュフロー（資金繰り）を常に意識していますか？",
-            "財務諸表（損益計算書・貸借対照表）を理解し、活用していますか？",
-            "数値目標を社員と共有し、達成に向けて動いていますか？"
-        ],
-        "improvement_themes": {
-            "high": [
-                "✓ 予測分析の高度化",
-                "✓ データドリブン経営の深化",
-                "✓ リアルタイムダッシュボード構築"
-            ],
-            "medium": [
-                "✓ KPIの精緻化",
-                "✓ 数値分析力の向上",
-                "✓ キャッシュフロー管理の強化",
-                "✓ 社員への数値共有強化"
-            ],
-            "low": [
-                "✓ 月次決算の仕組み構築",
-                "✓ 重要KPIの設定",
-                "✓ 数値の見える化",
-                "✓ キャッシュフロー管理の開始",
-                "✓ 財務諸表の基礎理解"
-            ]
-        }
-    },
-    "収益性の健全度": {
-        "english_label": "Profitability",
-        "icon": "💰",
-        "questions": [
-            "売上に対する利益率（売上高営業利益率）を把握していますか？",
-            "商品やサービスごとの利益率を把握し、採算管理ができていますか？",
-            "無駄なコストを定期的に見直し、削減する取り組みをしていますか？",
-            "価格設定が適正で、利益を確保できる価格になっていますか？",
-            "売上が増えれば、それに見合った利益も増える仕組みがありますか？",
-            "将来の投資や成長のための資金を確保できていますか？"
-        ],
-        "improvement_themes": {
-            "high": [
-                "✓ 収益構造の最適化",
-                "✓ 新規事業への投資",
-                "✓ 利益率のさらなる改善"
-            ],
-            "medium": [
-                "✓ 商品別採算分析の精緻化",
-                "✓ コスト削減施策の推進",
-                "✓ 価格戦略の見直し",
-                "✓ 投資計画の策定"
-            ],
-            "low": [
-                "✓ 利益率の把握",
-                "✓ 商品別採算管理の開始",
-                "✓ コスト構造の可視化",
-                "✓ 価格設定の見直し",
-                "✓ 資金計画の策定"
-            ]
-        }
-    }
-}
-
-# 回答オプション
-options = {
-    4: "非常に当てはまる",
-    3: "やや当てはまる",
-    2: "あまり当てはまらない",
-    1: "全く当てはまらない"
-}
-
-# Google Sheets保存機能（ダミー）
-def save_to_google_sheets(data):
-    """Google Sheetsへのデータ保存（実装は省略）"""
-    pass
-
-# ランク判定関数
+# カスタムCSS（static/adams.css。静的配信時は <link> だけを送り、CSS本体はブラウザのキャッシュを使う）
+st.markdown(css_tag(st.get_option("server.enableStaticServing")), unsafe_allow_html=True)
+
+# 診断票（セッションの開始時点の定義を使い続け、ファイルの更新は次の診断から反映する）
+def get_session_questionnaire():
+    if "questionnaire" not in st.session_state:
+        try:
+            st.session_state.questionnaire = get_questionnaire(st.query_params.get("instrument"))
+        except QuestionnaireError as e:
+            st.warning(f"指定された診断票を使えないため、既定の診断票で診断します（{e}）")
+            st.session_state.questionnaire = get_questionnaire()
+    return st.session_state.questionnaire
+
+# セッションの回答（1問1バイトの固定長。ラジオボタンの選択状態はここから作る）
+def get_answer_sheet():
+    """セッションの回答（診断票の設問数と合わなければ空の回答で作り直す）"""
+    num_questions = get_session_questionnaire().num_questions
+    sheet = st.session_state.get("answers")
+    if sheet is None or len(sheet) != num_questions:
+        sheet = st.session_state.answers = AnswerSheet(num_questions)
+    return sheet
+
+# 一括採点エンジン（画面では1人分の回答を採点。numpy を遅延読み込みするため診断票ごとに初回利用時に生成）
+def get_scoring_engine():
+    return get_session_questionnaire().scoring_engine
+
+# 診断結果の保存（キューに積むだけで、書き込みはバックグラウンドで行う）
+def save_result(data):
+    """診断結果を保存キューに追加（保存先は result_sink の環境変数設定）"""
+    from result_sink import get_result_writer
+    writer = get_result_writer()
+    if writer is not None:
+        writer.submit(data)
+
+# 企業ごとの再診断履歴（担当者のトークン付きURLで開いたセッションだけが、企業名を入力して記録・比較できる）
+def get_history_owner():
+    """?history=<トークン> に対応する担当者ID（ADAMS_HISTORY_TOKENS の設定がないか、一致しなければ None）"""
+    if "history_owner" not in st.session_state:
+        from history_store import history_owner
+        st.session_state.history_owner = history_owner(st.query_params.get("history", ""))
+    return st.session_state.history_owner
+
+def record_diagnosis_history(owner, company_name, questionnaire, answer_code, axis_scores, total_score, percentage):
+    """今回の診断を担当者の履歴に記録する（記録ボタンを押したときだけ。1回の診断・1社につき1回）"""
+    from history_store import company_key, get_history_store
+    recorded = st.session_state.setdefault("history_ids", {})
+    key = company_key(company_name)
+    if key not in recorded:
+        with span("results.history_record"):
+            recorded[key] = get_history_store().record(owner, company_name, questionnaire, answer_code,
+                                                       axis_scores, total_score, percentage)
+    st.session_state.history_company = company_name
+
+def get_previous_diagnosis(owner, company_name):
+    """記録した今回の診断の直前の診断（なければ None）"""
+    from history_store import company_key, get_history_store
+    with span("results.history_lookup"):
+        return get_history_store().previous(owner, company_name,
+                                            st.session_state.history_ids[company_key(company_name)])
+
+def show_previous_comparison(previous, axis_scores, axis_max_scores, total_score, max_total_score, percentage):
+    """前回の診断との比較（総合スコア・達成率の増減と軸ごとの差分表）"""
+    from history_store import format_delta, score_deltas
+    st.write(f"### 🔁 前回の診断との比較（前回: {previous.diagnosed_at.strftime('%Y年%m月%d日')}）")
+    
+    col1, col2 = st.columns(2)
+    col1.metric("総合スコア", f"{total_score} / {max_total_score} 点",
+                f"{total_score - previous.total_score:+d} 点")
+    col2.metric("達成率", f"{percentage:.1f}%", f"{percentage - previous.percentage:+.1f}%")
+    
+    st.table([
+        {"診断軸": axis_name, "前回": f"{before} / {max_score}", "今回": f"{after} / {max_score}",
+         "増減": format_delta(diff)}
+        for axis_name, before, after, diff, max_score in score_deltas(previous.axis_scores, axis_scores,
+                                                                      axis_max_scores)
+    ])
+
+# 母集団の中での位置（保存済み結果の分布から、業種・規模が同じ他社と比べたパーセンタイルを出す）
+def show_population_rank(questionnaire, axis_scores, total_score):
+    """軸ごと・総合スコアのパーセンタイル（比較できる件数がなければ案内だけを表示）"""
+    from cohort_analytics import TOTAL_AXIS
+    from percentile_rank import ALL, get_population_ranking, segment_label
+    segment = st.session_state.get("segment", {})
+    with span("results.percentile"):
+        ranking = get_population_ranking()
+        population = ranking.rank(axis_scores, total_score, segment.get("業種"), segment.get("従業員規模")) \
+            if ranking else None
+    if population is None:
+        st.caption("診断件数が集まると、ここに他社の中での位置（パーセンタイル）を表示します。")
+        return
+    
+    st.write(f"### 👥 他社との比較（{population['label']}・{population['count']:,}件）")
+    requested = segment_label(segment.get("業種", ALL), segment.get("従業員規模", ALL))
+    if population["label"] != requested:
+        st.caption(f"{requested}の診断件数が少ないため、{population['label']}と比べています。")
+    
+    percentiles = population["percentiles"]
+    if TOTAL_AXIS in percentiles:
+        st.metric("総合スコアの位置", f"上位 {max(100 - percentiles[TOTAL_AXIS], 1):.0f}%",
+                  help="同じセグメントの診断結果の中で、今回の総合スコア以上の割合（同点は半数として数える）")
+    st.table([
+        {"診断軸": axis_name, "スコア": f"{score} / {questionnaire.axis_max_scores[axis_name]}",
+         "中央値": population["medians"][axis_name], "位置": f"上位 {max(100 - percentiles[axis_name], 1):.0f}%"}
+        for axis_name, score in axis_scores.items() if axis_name in percentiles
+    ])
+
+# 結果ページのレーダーチャートの描画方式（svg: ブラウザで描画 / png: サーバーで matplotlib 描画）
+WEB_RADAR = os.environ.get("ADAMS_WEB_RADAR", "svg")
+
+# ランク判定関数（閾値は scoring_engine と共通）
+RANK_ICONS = ("🏆", "🥈", "🥉", "⚠️")
+RANK_COLORS = (ADAMS_GOLD, ADAMS_ACCENT, "#ff9800", "#f44336")
+
 def get_rank(percentage):
-    if percentage >= 85:
-        return "A", "優良レベル", "🏆", ADAMS_GOLD
-    elif percentage >= 70:
-        return "B", "標準レベル", "🥈", ADAMS_ACCENT
-    elif percentage >= 55:
-        return "C", "要改善レベル", "🥉", "#ff9800"
+    from scoring_engine import rank_indices, RANKS, RANK_LABELS
+    idx = int(rank_indices(percentage))
+    return RANKS[idx], RANK_LABELS[idx], RANK_ICONS[idx], RANK_COLORS[idx]
+
+def show_logo(width, fallback_html):
+    """ロゴを表示（起動時に読み込んだ adams_logo.png。読み込めなかった場合は文字で表示）"""
+    if LOGO_PNG is not None:
+        st.image(LOGO_PNG, width=width)
     else:
-        return "D", "危機レベル", "⚠️", "#f44336"
+        st.markdown(fallback_html, unsafe_allow_html=True)
+
+def index_of(choices, value):
+    """selectbox の初期選択（未選択なら None）"""
+    return choices.index(value) if value in choices else None
 
 def show_intro():
     """イントロページ"""
+    # 診断を始める前は、更新された診断票を毎回読み直す
+    st.session_state.pop("questionnaire", None)
+    questionnaire = get_session_questionnaire()
+    num_axes = len(questionnaire.axis_names)
+    num_questions = questionnaire.num_questions
     # ロゴ
-    try:
-        st.image("https://raw.githubusercontent.com/KOKOS130/business-diagnostic-tool/main/adams_logo.png", width=140)
-    except:
-        st.markdown(f'<div style="color: {ADAMS_NAVY}; font-weight: bold; font-size: 1.1rem;">㈱ADAMS Management Consulting Office</div>', unsafe_allow_html=True)
+    show_logo(140, f'<div style="color: {ADAMS_NAVY}; font-weight: bold; font-size: 1.1rem;">㈱ADAMS Management Consulting Office</div>')
     
     st.markdown('<div class="main-header">事業推進力診断ツール</div>', unsafe_allow_html=True)
-    st.markdown('<div class="sub-header">✨ 所要時間: 約15分 | 全36問 | その場で結果がわかります ✨</div>', unsafe_allow_html=True)
+    st.markdown(f'<div class="sub-header">✨ 所要時間: 約15分 | 全{num_questions}問 | その場で結果がわかります ✨</div>', unsafe_allow_html=True)
     
     st.markdown("## 🎯 この診断について")
     
@@ -414,11 +169,11 @@ def show_intro():
     col1, col2 = st.columns(2)
     
     with col1:
-        st.markdown("""
+        st.markdown(f"""
         <div class="info-card" style="min-height: 160px;">
             <h3 style="font-size: 1.2rem; margin-bottom: 0.8rem;">📋 診断内容</h3>
-            <p style="font-size: 0.95rem; margin-bottom: 0.5rem;">事業推進力を<strong>6つの軸</strong>で診断します</p>
-            <p style="font-size: 0.9rem;"><strong>所要時間</strong>: 約15分 | <strong>設問数</strong>: 全36問</p>
+            <p style="font-size: 0.95rem; margin-bottom: 0.5rem;">事業推進力を<strong>{num_axes}つの軸</strong>で診断します</p>
+            <p style="font-size: 0.9rem;"><strong>所要時間</strong>: 約15分 | <strong>設問数</strong>: 全{num_questions}問</p>
         </div>
         """, unsafe_allow_html=True)
     
@@ -439,35 +194,49 @@ def show_intro():
     col3, col4 = st.columns(2)
     
     with col3:
-        st.markdown("""
+        st.markdown(f"""
         <div class="info-card" style="min-height: 160px;">
             <h3 style="font-size: 1.2rem; margin-bottom: 0.8rem;">📊 わかること</h3>
             <ul style="font-size: 0.9rem; margin-top: 0.3rem; padding-left: 1.2rem;">
                 <li>総合スコアとランク評価</li>
-                <li>6軸のバランス（レーダーチャート）</li>
+                <li>{num_axes}軸のバランス（レーダーチャート）</li>
                 <li>具体的な改善ポイント</li>
             </ul>
         </div>
         """, unsafe_allow_html=True)
     
     with col4:
-        st.markdown("""
+        axis_lines = "<br>\n".join(
+            f"{icon} {name} ({count}問)"
+            for icon, name, count in zip(questionnaire.icons, questionnaire.axis_names, questionnaire.question_counts)
+        )
+        st.markdown(f"""
         <div class="info-card" style="min-height: 160px;">
-            <h3 style="font-size: 1.2rem; margin-bottom: 0.8rem;">🔍 6つの診断軸</h3>
+            <h3 style="font-size: 1.2rem; margin-bottom: 0.8rem;">🔍 {num_axes}つの診断軸</h3>
             <p style="font-size: 0.85rem; line-height: 1.6; margin-top: 0.3rem;">
-            🎯 経営ビジョンの明確さ (6問)<br>
-            📋 事業計画の実行管理 (7問)<br>
-            👥 組織体制の強さ (6問)<br>
-            ⏰ 経営者の時間の使い方 (6問)<br>
-            📊 数値管理の仕組み (6問)<br>
-            💰 収益性の健全度 (6問)
+            {axis_lines}
             </p>
         </div>
         """, unsafe_allow_html=True)
     
     st.markdown("<br>", unsafe_allow_html=True)
     
+    # 業種・従業員規模（任意。結果ページで同じセグメントの他社と比べるために使う）
+    from percentile_rank import COMPANY_SIZES, INDUSTRIES
+    segment = st.session_state.get("segment", {})
+    col1, col2 = st.columns(2)
+    with col1:
+        industry = st.selectbox("業種（任意）", INDUSTRIES, index=index_of(INDUSTRIES, segment.get("業種")),
+                                placeholder="選択してください")
+    with col2:
+        company_size = st.selectbox("従業員規模（任意）", COMPANY_SIZES,
+                                    index=index_of(COMPANY_SIZES, segment.get("従業員規模")),
+                                    placeholder="選択してください")
+    
     if st.button("🚀 診断を始める", type="primary", use_container_width=True):
+        st.session_state.segment = {
+            name: value for name, value in (("業種", industry), ("従業員規模", company_size)) if value
+        }
         st.session_state.page = 'questions'
         st.rerun()
     
@@ -480,98 +249,177 @@ def show_intro():
 
 def show_questions():
     """質問ページ"""
-    try:
-        st.image("https://raw.githubusercontent.com/KOKOS130/business-diagnostic-tool/main/adams_logo.png", width=100)
-    except:
-        st.markdown(f'<div style="color: {ADAMS_NAVY}; font-weight: bold;">㈱ADAMS 事業推進力診断ツール</div>', unsafe_allow_html=True)
+    show_logo(100, f'<div style="color: {ADAMS_NAVY}; font-weight: bold;">㈱ADAMS 事業推進力診断ツール</div>')
     
     st.write("## 📝 診断設問")
     
-    total_questions = sum(len(data["questions"]) for data in diagnostic_data.values())
-    answered = len(st.session_state.scores)
+    questionnaire = get_session_questionnaire()
+    total_questions = questionnaire.num_questions
+    answered = get_answer_sheet().answered
     progress = answered / total_questions if total_questions > 0 else 0
     st.progress(progress)
     st.write(f"**進捗: {answered}/{total_questions} 問回答済み** ({int(progress*100)}%)")
 
-    for axis_idx, (axis_name, axis_data) in enumerate(diagnostic_data.items(), 1):
-        icon = axis_data.get('icon', '📌')
-        st.markdown(f"### {icon} 軸{axis_idx}: {axis_name}")
-        
-        for q_idx, question in enumerate(axis_data['questions'], 1):
-            key = f"{axis_name}_{q_idx}"
-            
-            st.markdown(f'<div class="question-card"><p style="font-weight: 600; color: {ADAMS_NAVY};">問{q_idx}. {question}</p>', unsafe_allow_html=True)
-            
-            if key in st.session_state.scores:
-                default_value = st.session_state.scores[key]
-            else:
-                default_value = 4
-            
-            score = st.radio(
-                f"回答を選択してください",
-                options=[4, 3, 2, 1],
-                format_func=lambda x: options[x],
-                horizontal=True,
-                key=f"q_{axis_idx}_{q_idx}",
-                index=[4, 3, 2, 1].index(default_value),
-                label_visibility="collapsed"
-            )
-            
-            st.session_state.scores[key] = score
-            st.markdown('</div>', unsafe_allow_html=True)
-        
-        st.write("---")
+    # 軸ごとのフラグメント: 回答してもその軸のセクションだけが再実行される
+    for axis_idx in range(len(questionnaire.axis_names)):
+        show_axis_questions(axis_idx)
     
-    st.success("✅ 全ての設問に回答しました！")
-    if st.button("📊 診断結果を見る", type="primary", use_container_width=True):
+    if answered >= total_questions:
+        st.success("✅ 全ての設問に回答しました！")
+    else:
+        st.warning(f"未回答の設問が {total_questions - answered} 問あります。全ての設問に回答すると結果を表示できます。")
+    if st.button("📊 診断結果を見る", type="primary", use_container_width=True,
+                 disabled=answered < total_questions):
         st.session_state.page = 'results'
         st.rerun()
 
-def calculate_scores():
-    """スコア計算"""
-    axis_scores = {}
-    axis_max_scores = {}
-    
-    for axis_name, axis_data in diagnostic_data.items():
-        total = 0
-        max_score = len(axis_data['questions']) * 4
-        
-        for q_idx in range(1, len(axis_data['questions']) + 1):
-            key = f"{axis_name}_{q_idx}"
-            total += st.session_state.scores.get(key, 0)
+def store_answer(question_index, widget_key):
+    """ラジオボタンの選択を回答として保存（変更された1問だけを設問の通し番号で書き込む）"""
+    get_answer_sheet().set(question_index, st.session_state[widget_key])
+
+@st.fragment
+def show_axis_questions(axis_idx):
+    """1軸分の設問セクション（axis_idx は0始まりの軸番号）"""
+    questionnaire = get_session_questionnaire()
+    sheet = get_answer_sheet()
+    indices = questionnaire.axis_questions(axis_idx)
+    axis_answered = sum(index in sheet for index in indices)
+    option_values = list(questionnaire.option_values)
+    
+    icon = questionnaire.icons[axis_idx]
+    st.markdown(f"### {icon} 軸{axis_idx + 1}: {questionnaire.axis_names[axis_idx]}")
+    st.caption(f"この軸の回答: {axis_answered}/{len(indices)} 問")
+    
+    for q_idx, index in enumerate(indices, 1):
+        st.markdown(f'<div class="question-card"><p style="font-weight: 600; color: {ADAMS_NAVY};">問{q_idx}. {questionnaire.questions[index]}</p>', unsafe_allow_html=True)
         
-        axis_scores[axis_name] = total
-        axis_max_scores[axis_name] = max_score
+        # 未回答の設問は何も選択しない（既定値を回答済みとして数えないため）
+        widget_key = f"q_{index}"
+        st.radio(
+            f"回答を選択してください",
+            options=option_values,
+            format_func=questionnaire.options.get,
+            horizontal=True,
+            key=widget_key,
+            index=option_values.index(sheet.get(index)) if index in sheet else None,
+            on_change=store_answer,
+            args=(index, widget_key),
+            label_visibility="collapsed"
+        )
+        st.markdown('</div>', unsafe_allow_html=True)
     
-    total_score = sum(axis_scores.values())
-    max_total_score = sum(axis_max_scores.values())
-    percentage = (total_score / max_total_score * 100) if max_total_score > 0 else 0
+    st.write("---")
     
-    return axis_scores, axis_max_scores, total_score, max_total_score, percentage
+    # 軸の全問に回答し終えたときだけページ全体を再実行し、全体の進捗とボタンを更新する
+    # （回答し終えた軸は axis_done の軸番号のビットで覚えておく）
+    axis_bit = 1 << axis_idx
+    axis_done = st.session_state.get("axis_done", 0)
+    if axis_answered == len(indices) and not axis_done & axis_bit:
+        st.session_state.axis_done = axis_done | axis_bit
+        st.rerun(scope="app")
+
+def calculate_scores():
+    """スコア計算（一括採点エンジンを N=1 で利用）"""
+    scoring_engine = get_scoring_engine()
+    answers = scoring_engine.answers_from_session(get_answer_sheet())
+    return scoring_engine.score(answers).row(0)
+
+# PDFレポート（結果ページの表示時にバックグラウンドで生成を始め、完成したらダウンロードボタンを出す）
+PDF_POLL_INTERVAL = 0.5
+
+def show_pdf_download(job_key, report_date):
+    """生成済みPDFのダウンロードボタン（キャッシュのファイルから読み込んで渡す）"""
+    from pdf_jobs import get_pdf_jobs
+    with get_pdf_jobs().open(job_key) as pdf_file, span("results.pdf_download"):
+        st.download_button(
+            label="📥 PDFレポートをダウンロード",
+            data=pdf_file,
+            file_name=f"ADAMS_事業推進力診断レポート_{report_date.strftime('%Y%m%d')}.pdf",
+            mime="application/pdf",
+            type="primary",
+            use_container_width=True
+        )
+
+@st.fragment(run_every=PDF_POLL_INTERVAL)
+def poll_pdf_job(job_key):
+    """生成中のジョブの状態をこのブロックだけで定期的に確認し、終わったらページ全体を再実行する"""
+    from pdf_jobs import get_pdf_jobs
+    if get_pdf_jobs().status(job_key) == "running":
+        st.button("⏳ PDFレポートを準備しています…", disabled=True, use_container_width=True)
+    else:
+        st.rerun(scope="app")
+
+def show_pdf_report(diagnostic_data, report_args):
+    """PDFレポートの生成ジョブを投入し（同じ入力なら投入済みのジョブを使う）、状態に応じて表示する"""
+    from pdf_jobs import get_pdf_jobs
+    jobs = get_pdf_jobs()
+    with span("results.pdf"):
+        job_key = jobs.submit(diagnostic_data, **report_args)
+    
+    status = jobs.status(job_key)
+    if status == "running":
+        poll_pdf_job(job_key)
+    elif status == "error":
+        st.error(f"❌ PDF生成エラー: {jobs.error(job_key)}")
+        st.button("📊 PDFレポートを再生成", use_container_width=True, on_click=jobs.discard, args=(job_key,))
+    else:
+        show_pdf_download(job_key, report_args["report_date"])
 
 def show_results():
     """結果ページ - シンプルで確実に表示される版"""
-    try:
-        st.image("https://raw.githubusercontent.com/KOKOS130/business-diagnostic-tool/main/adams_logo.png", width=100)
-    except:
-        st.markdown(f'<div style="color: {ADAMS_NAVY}; font-weight: bold;">㈱ADAMS 事業推進力診断ツール</div>', unsafe_allow_html=True)
+    show_logo(100, f'<div style="color: {ADAMS_NAVY}; font-weight: bold;">㈱ADAMS 事業推進力診断ツール</div>')
     
     st.write("## 📊 診断結果")
     
-    axis_scores, axis_max_scores, total_score, max_total_score, percentage = calculate_scores()
-    rank, rank_label, rank_icon, rank_color = get_rank(percentage)
+    questionnaire = get_session_questionnaire()
+    diagnostic_data = questionnaire.diagnostic_data
+    
+    with span("results.scoring"):
+        axis_scores, axis_max_scores, total_score, max_total_score, percentage = calculate_scores()
+        rank, rank_label, rank_icon, rank_color = get_rank(percentage)
+    
+    # 回答コードをURLに載せ、このURLだけで同じ結果ページを開けるようにする
+    answer_code = encode_answers(get_answer_sheet().answers(), questionnaire)
+    st.session_state.restored_code = answer_code
+    st.query_params["r"] = answer_code
     
     # 結果データの準備
     result_data = {
         "診断日時": datetime.now().strftime('%Y年%m月%d日 %H:%M:%S'),
+        "診断票": questionnaire.key,
         "総合スコア": total_score,
         "最大スコア": max_total_score,
         "達成率": f"{percentage:.1f}%",
         "ランク": rank,
-        **{f"{axis_name}スコア": score for axis_name, score in axis_scores.items()}
+        **{f"{axis_name}スコア": score for axis_name, score in axis_scores.items()},
+        # 設問ごとの回答（通し番号順を1問2ビットに詰めた回答コード）。コホート分析の設問別分布に使う
+        "回答コード": answer_code,
+        # 業種・従業員規模（イントロページで選んだ場合のみ）。パーセンタイルのセグメントに使う
+        **st.session_state.get("segment", {})
     }
     
-    save_to_google_sheets(result_data)
+    # 再描画のたびに重複保存しないよう、1回の診断につき1回だけ保存する
+    if not st.session_state.get("result_saved"):
+        with span("results.save"):
+            save_result(result_data)
+        st.session_state.result_saved = True
+    
+    # 担当者のセッションでは企業名を入力して記録ボタンを押すと履歴に記録し、前回の診断があれば比較を表示する
+    # （入力途中や打ち間違いの企業名を記録しないよう、入力しただけでは記録しない）
+    history_owner = get_history_owner()
+    company_name = ""
+    previous = None
+    if history_owner:
+        with st.form("history_form", border=False):
+            company_input = st.text_input("企業名（記録すると診断履歴に残し、前回の診断と比較します）",
+                                          key="company_name").strip()
+            if st.form_submit_button("📝 履歴に記録して前回と比較") and company_input:
+                record_diagnosis_history(history_owner, company_input, questionnaire, answer_code, axis_scores,
+                                         total_score, percentage)
+        company_name = st.session_state.get("history_company", "")
+    if company_name:
+        previous = get_previous_diagnosis(history_owner, company_name)
+    previous_axis_scores = previous.axis_scores if previous else None
     
     # ===== 総合評価セクション =====
     st.write("### 🎯 総合評価")
@@ -614,54 +462,37 @@ def show_results():
         </div>
         """, unsafe_allow_html=True)
     
-    # ===== 6軸バランス分析 =====
-    st.write("### 📈 6軸バランス分析")
-    
-    # レーダーチャート生成
-    labels = list(axis_scores.keys())
-    scores = [axis_scores[label] / axis_max_scores[label] * 4 for label in labels]
-    
-    angles = np.linspace(0, 2 * np.pi, len(labels), endpoint=False).tolist()
-    scores_plot = scores + scores[:1]
-    angles_plot = angles + angles[:1]
-    
-    # 正円のレーダーチャートを生成
-    fig = plt.figure(figsize=(8, 8))
-    ax = fig.add_subplot(111, polar=True, aspect='equal')  # aspect='equal'で正円に
-    
-    ax.plot(angles_plot, scores_plot, 'o-', linewidth=3, color=ADAMS_NAVY, markersize=10)
-    ax.fill(angles_plot, scores_plot, alpha=0.3, color=ADAMS_ACCENT)
+    # ===== 他社との比較 =====
+    show_population_rank(questionnaire, axis_scores, total_score)
     
-    english_labels = [diagnostic_data[label]["english_label"] for label in labels]
-    ax.set_thetagrids(np.degrees(angles), english_labels, fontsize=14, weight='bold')
-    ax.set_ylim(0, 4)
-    ax.set_yticks([1, 2, 3, 4])
-    ax.set_yticklabels(['1', '2', '3', '4'], fontsize=12)
-    ax.grid(True, linewidth=1, alpha=0.3, color=ADAMS_NAVY)
+    # ===== 軸バランス分析 =====
+    st.write(f"### 📈 {len(questionnaire.axis_names)}軸バランス分析")
     
-    ax.set_facecolor('#f8f9fa')
-    fig.patch.set_facecolor('white')
-    
-    # アスペクト比を固定して正円を保つ
-    fig.tight_layout()
+    # レーダーチャート生成（svg: スコアだけのSVGを送りブラウザで描画 / png: サーバーで描画した画像をキャッシュ経由で送る）
+    with span("results.radar"):
+        if WEB_RADAR == "png":
+            from radar_chart import get_radar_png
+            radar_png = get_radar_png(axis_scores, axis_max_scores, diagnostic_data, profile="web",
+                                      previous_axis_scores=previous_axis_scores)
+        else:
+            from radar_svg import get_radar_svg
+            radar_svg = get_radar_svg(axis_scores, axis_max_scores, diagnostic_data,
+                                      previous_axis_scores=previous_axis_scores)
     
     # 正円表示のため、左側を少し広く
     col1, col2 = st.columns([3, 4])
     
     with col1:
-        # 正円を保つためuse_container_width=False
-        st.pyplot(fig, use_container_width=False)
-        plt.close()
+        # 正円を保つためコンテナ幅には合わせず原寸で表示
+        with span("results.radar_image"):
+            if WEB_RADAR == "png":
+                st.image(radar_png)
+            else:
+                st.markdown(f'<div style="text-align: center;">{radar_svg}</div>', unsafe_allow_html=True)
         
-        st.info("""
-        **凡例**:  
-        Vision = 経営ビジョンの明確さ  
-        Planning = 事業計画の実行管理  
-        Organization = 組織体制の強さ  
-        Time Mgmt = 経営者の時間の使い方  
-        KPI = 数値管理の仕組み  
-        Profitability = 収益性の健全度
-        """)
+        st.info("**凡例**:  \n" + "  \n".join(
+            f"{label} = {name}" for label, name in zip(questionnaire.english_labels, questionnaire.axis_names)
+        ) + ("  \n灰色の破線 = 前回の診断" if previous else ""))
     
     with col2:
         st.markdown(f"#### 📊 各軸スコア")
@@ -691,6 +522,10 @@ def show_results():
             </div>
             """, unsafe_allow_html=True)
     
+    # ===== 前回の診断との比較 =====
+    if previous:
+        show_previous_comparison(previous, axis_scores, axis_max_scores, total_score, max_total_score, percentage)
+    
     # ===== 優先改善課題 TOP3 =====
     st.write("### 🎯 優先改善課題 TOP3")
     
@@ -733,43 +568,33 @@ def show_results():
     # ===== PDFレポート生成 =====
     st.write("---")
     st.write("### 📄 診断レポート")
+    st.caption(f"このページのURL（回答コード: `{answer_code}`）を保存・共有すると、同じ診断結果をいつでも開けます。")
     
     col1, col2 = st.columns(2)
     
     with col1:
-        if st.button("📊 PDFレポートを生成", use_container_width=True, type="primary"):
-            try:
-                # PDF生成モジュールをインポート
-                from pdf_report_generator import generate_pdf_report
-                
-                # PDFを生成
-                pdf_buffer = generate_pdf_report(
-                    axis_scores=axis_scores,
-                    axis_max_scores=axis_max_scores,
-                    total_score=total_score,
-                    max_total_score=max_total_score,
-                    percentage=percentage,
-                    rank=rank,
-                    rank_label=rank_label,
-                    diagnostic_data=diagnostic_data,
-                    company_name=""
-                )
-                
-                # ダウンロードボタンを表示
-                st.download_button(
-                    label="📥 PDFをダウンロード",
-                    data=pdf_buffer,
-                    file_name=f"ADAMS_事業推進力診断レポート_{datetime.now().strftime('%Y%m%d')}.pdf",
-                    mime="application/pdf",
-                    use_container_width=True
-                )
-                st.success("✅ PDFレポートを生成しました！")
-            except Exception as e:
-                st.error(f"❌ PDF生成エラー: {str(e)}")
+        show_pdf_report(diagnostic_data, {
+            "axis_scores": axis_scores,
+            "axis_max_scores": axis_max_scores,
+            "total_score": total_score,
+            "max_total_score": max_total_score,
+            "percentage": percentage,
+            "rank": rank,
+            "rank_label": rank_label,
+            "company_name": company_name,
+            "report_date": datetime.now().date(),
+            "previous": previous.as_previous() if previous else None
+        })
     
     with col2:
         if st.button("🔄 もう一度診断する", use_container_width=True):
-            st.session_state.scores = {}
+            st.session_state.pop("answers", None)
+            st.session_state.result_saved = False
+            st.session_state.pop("history_ids", None)
+            st.session_state.pop("history_company", None)
+            st.session_state.pop("questionnaire", None)
+            st.query_params.pop("r", None)
+            st.session_state.pop("axis_done", None)
             st.session_state.page = 'intro'
             st.rerun()
     
@@ -780,15 +605,86 @@ def show_results():
     </div>
     """, unsafe_allow_html=True)
 
+# セッションごとのメモリ使用量（ADAMS_SESSION_DIAGNOSTICS を設定したときだけ ?diagnostics=<値> で表示）
+def show_session_diagnostics():
+    """サーバー上の全セッションの session_state の大きさ（レプリカあたりのセッション数の見積もり用）"""
+    report = session_memory_report()
+    total_bytes = sum(memory.total_bytes for memory in report)
+    
+    st.write("## 🧮 セッションのメモリ使用量")
+    col1, col2, col3 = st.columns(3)
+    col1.metric("セッション数", f"{len(report):,}")
+    col2.metric("合計", f"{total_bytes / 1024:,.1f} KB")
+    col3.metric("1セッションあたり（平均 / 最大）",
+                f"{total_bytes / max(len(report), 1) / 1024:,.1f} / {report[0].total_bytes / 1024 if report else 0:,.1f} KB")
+    
+    st.write("### セッションごと")
+    st.dataframe([
+        {"セッション": memory.session_id[:8], "ページ": memory.page, "バイト数": memory.total_bytes,
+         "キー数": len(memory.key_bytes),
+         "大きいキー": ", ".join(f"{key} ({size:,})" for key, size in list(memory.key_bytes.items())[:3])}
+        for memory in report
+    ], hide_index=True, use_container_width=True)
+    
+    st.write("### キーごと（全セッションの合計）")
+    key_totals = {}
+    for memory in report:
+        for key, size in memory.key_bytes.items():
+            key_totals[key] = key_totals.get(key, 0) + size
+    st.dataframe([
+        {"キー": key, "バイト数": size}
+        for key, size in sorted(key_totals.items(), key=lambda item: item[1], reverse=True)
+    ], hide_index=True, use_container_width=True)
+    
+    warmup = warmup_report()
+    st.write(f"### ウォームアップ（{warmup['status']}、合計 {warmup['total']:.2f}s）")
+    st.dataframe([
+        {"ステップ": name, "秒": round(seconds, 3)} for name, seconds in warmup["timings"].items()
+    ], hide_index=True, use_container_width=True)
+
+diagnostics_token = os.environ.get("ADAMS_SESSION_DIAGNOSTICS")
+# compare_digest は非ASCIIの文字列を受け付けないため、バイト列で比べる
+if diagnostics_token and hmac.compare_digest(st.query_params.get("diagnostics", "").encode("utf-8"),
+                                             diagnostics_token.encode("utf-8")):
+    show_session_diagnostics()
+    st.stop()
+
 # メイン処理
 if 'page' not in st.session_state:
     st.session_state.page = 'intro'
-if 'scores' not in st.session_state:
-    st.session_state.scores = {}
-
-if st.session_state.page == 'intro':
-    show_intro()
-elif st.session_state.page == 'questions':
-    show_questions()
-elif st.session_state.page == 'results':
-    show_results()
+
+# 共有されたURL（?r=回答コード）からは、サーバー側のセッションなしで結果ページを復元する
+shared_code = st.query_params.get("r")
+if shared_code and shared_code != st.session_state.get("restored_code"):
+    st.session_state.restored_code = shared_code
+    st.session_state.pop("questionnaire", None)
+    try:
+        answers = decode_answers(shared_code, get_session_questionnaire())
+    except AnswerCodeError as e:
+        st.warning(f"URLの診断結果を読み込めませんでした（{e}）")
+        st.query_params.pop("r", None)
+    else:
+        st.session_state.answers = AnswerSheet.from_answers(answers)
+        st.session_state.pop("history_ids", None)
+        st.session_state.pop("history_company", None)
+        # 共有された結果は保存済みとして扱い、開くたびに保存しない
+        st.session_state.result_saved = True
+        st.session_state.page = 'results'
+
+# ページ遷移の回数と、ページごとの描画時間を記録する
+page = st.session_state.page
+if st.session_state.get("metrics_page") != page:
+    PAGE_TRANSITIONS.inc(from_page=st.session_state.get("metrics_page", "start"), to_page=page)
+    st.session_state.metrics_page = page
+
+with page_span(page):
+    if page == 'intro':
+        show_intro()
+    elif page == 'questions':
+        show_questions()
+    elif page == 'results':
+        show_results()
+
+# 初回表示の後、PDF生成・チャート描画用のモジュールとフォントを裏で準備しておく
+start_warmup()
+start_exporter()
@@ -0,0 +1,248 @@
+"""
+ADAMS 事業推進力診断ツール - 採点・回答コード・パーセンタイル・増分集計のテスト
+
+    python -m pytest -q
+"""
+
+import base64
+import bisect
+import math
+import random
+import sqlite3
+
+import numpy as np
+import pytest
+
+from answer_codec import AnswerCodeError, decode_answers, encode_answers, pack_answers, unpack_answers
+from cohort_analytics import TOTAL_AXIS, CohortAggregates, IncrementalAggregator
+from diagnostic_data import diagnostic_data
+from percentile_rank import ScoreSketch
+from questionnaire import get_questionnaire
+from result_sink import SQLiteSink
+from scoring_engine import RANKS, ScoringEngine
+
+
+# ===== 採点 =====
+
+def calculate_scores(scores, diagnostic_data):
+    """画面の従来の calculate_scores()（session_state.scores の "{軸}_{設問番号}" キーから1人分を採点）"""
+    axis_scores = {}
+    axis_max_scores = {}
+    for axis_name, axis_data in diagnostic_data.items():
+        axis_scores[axis_name] = sum(scores.get(f"{axis_name}_{q_idx}", 0)
+                                     for q_idx in range(1, len(axis_data["questions"]) + 1))
+        axis_max_scores[axis_name] = len(axis_data["questions"]) * 4
+    total_score = sum(axis_scores.values())
+    max_total_score = sum(axis_max_scores.values())
+    percentage = (total_score / max_total_score * 100) if max_total_score > 0 else 0
+    return axis_scores, axis_max_scores, total_score, max_total_score, percentage
+
+
+def get_rank(percentage):
+    """画面の従来の get_rank() のランク部分"""
+    if percentage >= 85:
+        return "A"
+    elif percentage >= 70:
+        return "B"
+    elif percentage >= 55:
+        return "C"
+    return "D"
+
+
+def _session_scores(answers, diagnostic_data):
+    scores = {}
+    position = 0
+    for axis_name, axis_data in diagnostic_data.items():
+        for q_idx in range(1, len(axis_data["questions"]) + 1):
+            if answers[position]:
+                scores[f"{axis_name}_{q_idx}"] = int(answers[position])
+            position += 1
+    return scores
+
+
+@pytest.mark.parametrize("data", [diagnostic_data, get_questionnaire().diagnostic_data],
+                         ids=["diagnostic_data", "instrument"])
+def test_batch_scores_match_calculate_scores(data):
+    engine = ScoringEngine(data)
+    rng = np.random.default_rng(0)
+    answers = rng.integers(0, 5, size=(200, engine.num_questions), dtype=np.int8)
+    # 全問最低・全問最高・全問未回答も含める
+    answers[0] = 1
+    answers[1] = 4
+    answers[2] = 0
+
+    scores = engine.score(answers)
+    for i in range(len(answers)):
+        expected = calculate_scores(_session_scores(answers[i], data), data)
+        assert scores.row(i) == expected
+        assert RANKS[int(scores.rank_index[i])] == get_rank(expected[4])
+
+
+def test_score_rejects_wrong_shape_and_values():
+    engine = ScoringEngine(diagnostic_data)
+    with pytest.raises(ValueError):
+        engine.score(np.zeros((1, engine.num_questions + 1), dtype=np.int8))
+    with pytest.raises(ValueError):
+        engine.score(np.full((1, engine.num_questions), 5, dtype=np.int8))
+
+
+# ===== 回答コード =====
+
+def test_answer_code_round_trip():
+    questionnaire = get_questionnaire()
+    rng = random.Random(0)
+    for _ in range(100):
+        answers = [rng.choice(questionnaire.option_values) for _ in range(questionnaire.num_questions)]
+        code = encode_answers(answers, questionnaire)
+        assert decode_answers(code, questionnaire) == answers
+
+
+def test_pack_answers_round_trip_for_any_length():
+    for count in range(1, 10):
+        answers = [(i % 4) + 1 for i in range(count)]
+        assert unpack_answers(pack_answers(answers), count) == answers
+
+
+def test_answer_code_rejects_corruption():
+    questionnaire = get_questionnaire()
+    code = encode_answers([3] * questionnaire.num_questions, questionnaire)
+    data = bytearray(base64.urlsafe_b64decode(code + "=" * (-len(code) % 4)))
+    # 回答部分の1ビットを反転すると CRC が合わなくなる
+    data[5] ^= 0x01
+    corrupted = base64.urlsafe_b64encode(bytes(data)).rstrip(b"=").decode("ascii")
+    with pytest.raises(AnswerCodeError):
+        decode_answers(corrupted, questionnaire)
+    with pytest.raises(AnswerCodeError):
+        decode_answers(code[:4], questionnaire)
+    with pytest.raises(AnswerCodeError):
+        encode_answers([5] * questionnaire.num_questions, questionnaire)
+
+
+# ===== パーセンタイル =====
+
+def test_score_sketch_matches_sorted_list():
+    rng = random.Random(0)
+    max_score = 30
+    values = sorted(rng.randint(0, max_score) for _ in range(1000))
+    sketch = ScoreSketch(max_score)
+    for value in values:
+        sketch.add(value)
+
+    for score in range(max_score + 1):
+        below = bisect.bisect_left(values, score)
+        equal = bisect.bisect_right(values, score) - below
+        assert sketch.percentile(score) == pytest.approx((below + equal / 2) / len(values) * 100)
+    for q in (0.0, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 1.0):
+        assert sketch.quantile(q) == values[max(math.ceil(q * len(values)), 1) - 1]
+
+
+def test_score_sketch_empty_and_merge():
+    sketch = ScoreSketch(4)
+    assert sketch.percentile(2) is None
+    assert sketch.quantile(0.5) is None
+    merged = ScoreSketch(4)
+    for value in (1, 2, 2, 4):
+        sketch.add(value)
+    merged.add(2, n=2)
+    merged.add(1)
+    merged.add(4)
+    assert merged.counts == sketch.counts and merged.count == sketch.count
+
+
+# ===== 増分集計 =====
+
+class RowCounter(IncrementalAggregator):
+    """取り込んだ行の件数とIDの合計を数えるだけの集計"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS agg_state (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        CREATE TABLE IF NOT EXISTS agg_rows (id INTEGER PRIMARY KEY);
+    """
+    WATERMARK = "test_last_row_id"
+
+    def _apply(self, conn, rows):
+        conn.executemany("INSERT INTO agg_rows VALUES (?)", [(row[0],) for row in rows])
+
+
+def _write_results(db_path, rows):
+    sink = SQLiteSink(db_path)
+    sink.write_batch(rows)
+    sink.close()
+
+
+def _result(questionnaire, answers):
+    engine = questionnaire.scoring_engine
+    axis_scores, _, total_score, _, percentage = engine.score(np.array([answers])).row(0)
+    return {
+        **{f"{axis}スコア": score for axis, score in axis_scores.items()},
+        "総合スコア": total_score,
+        "ランク": get_rank(percentage),
+        "回答コード": encode_answers(answers, questionnaire),
+    }
+
+
+def test_incremental_aggregator_watermark(tmp_path):
+    db_path = str(tmp_path / "diagnoses.sqlite3")
+    _write_results(db_path, [{"n": i} for i in range(7)])
+    counter = RowCounter(db_path)
+
+    assert counter.refresh(chunk=3) == 7
+    assert counter._watermark(counter.conn) == 7
+    assert counter.refresh() == 0
+
+    _write_results(db_path, [{"n": i} for i in range(5)])
+    assert counter.refresh(chunk=2) == 5
+    ids = [row[0] for row in counter.conn.execute("SELECT id FROM agg_rows ORDER BY id")]
+    assert ids == list(range(1, 13))
+
+    # 別のインスタンス（別のレプリカ）はウォーターマークを共有し、同じ行を取り込まない
+    other = RowCounter(db_path)
+    assert other.refresh() == 0
+    counter.close()
+    other.close()
+
+
+def test_cohort_aggregates_add_only_new_rows(tmp_path):
+    db_path = str(tmp_path / "diagnoses.sqlite3")
+    questionnaire = get_questionnaire()
+    rng = random.Random(0)
+    batches = [[[rng.choice(questionnaire.option_values) for _ in range(questionnaire.num_questions)]
+                for _ in range(size)] for size in (40, 25)]
+
+    aggregates = CohortAggregates(db_path, questionnaire)
+    seen = []
+    for batch in batches:
+        _write_results(db_path, [_result(questionnaire, answers) for answers in batch])
+        assert aggregates.refresh(chunk=10) == len(batch)
+        seen += batch
+
+        # 全件をまとめて数えた結果と一致する
+        scores = questionnaire.scoring_engine.score(np.array(seen))
+        assert aggregates.total_count() == len(seen)
+        hist = aggregates.axis_histograms()
+        for column, axis in enumerate(questionnaire.axis_names):
+            values, counts = np.unique(scores.axis_scores[:, column], return_counts=True)
+            assert hist[axis] == dict(zip(values.tolist(), counts.tolist()))
+        values, counts = np.unique(scores.total_scores, return_counts=True)
+        assert hist[TOTAL_AXIS] == dict(zip(values.tolist(), counts.tolist()))
+        question_hist = aggregates.question_histograms()
+        for question in range(questionnaire.num_questions):
+            column = [answers[question] for answers in seen]
+            assert question_hist[question] == {answer: column.count(answer) for answer in set(column)}
+        assert sum(aggregates.rank_mix().values()) == len(seen)
+    aggregates.close()
+
+
+def test_refresh_skips_unreadable_rows(tmp_path):
+    db_path = str(tmp_path / "diagnoses.sqlite3")
+    _write_results(db_path, [{"ランク": "A"}])
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("INSERT INTO diagnoses (created_at, payload) VALUES ('2025-01-01T00:00:00', 'not json')")
+    conn.close()
+
+    aggregates = CohortAggregates(db_path)
+    assert aggregates.refresh() == 2
+    assert aggregates.total_count() == 0
+    assert aggregates.rank_mix() == {}
+    aggregates.close()
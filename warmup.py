@@ -0,0 +1,94 @@
+"""
+ADAMS 事業推進力診断ツール - バックグラウンドウォームアップ
+
+イントロ・設問ページはチャートやPDFの重いモジュールを読み込まずに表示し、
+初回表示の後にバックグラウンドスレッドで numpy / matplotlib / reportlab の
+読み込みと日本語フォントの登録を済ませておく。各ステップの所要時間（import の時間を含む）は
+/metrics のゲージ（adams_warmup_step_seconds / adams_warmup_seconds）に出力し、
+セッションの診断ページ（warmup_report()）にも表示する。
+"""
+
+import logging
+import os
+import threading
+import time
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_thread = None
+_timings = {}
+_finished_at = None
+
+WARMUP_STEP_SECONDS = REGISTRY.gauge(
+    "adams_warmup_step_seconds", "ウォームアップの各ステップの所要時間（秒。import は読み込み時間）", ("step",))
+WARMUP_SECONDS = REGISTRY.gauge("adams_warmup_seconds", "ウォームアップ全体の所要時間（秒。完了するまで 0）")
+
+
+def _import_scoring():
+    import scoring_engine  # noqa: F401
+
+
+def _import_pdf():
+    import pdf_report_generator  # noqa: F401
+
+
+def _register_fonts():
+    from pdf_report_generator import register_fonts
+    register_fonts()
+
+
+def _import_matplotlib():
+    import radar_chart  # noqa: F401
+
+
+# (ステップ名, 処理)。import は初回のみ実時間がかかるため、所要時間がそのまま import 時間になる
+WARMUP_STEPS = (
+    ("import numpy / scoring_engine", _import_scoring),
+    ("import reportlab / pdf_report_generator", _import_pdf),
+    ("register fonts", _register_fonts),
+    ("import matplotlib / radar_chart", _import_matplotlib),
+)
+
+
+def _run():
+    global _finished_at
+    started = time.perf_counter()
+    for name, step in WARMUP_STEPS:
+        step_started = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            logger.exception("ウォームアップ失敗: %s", name)
+            continue
+        _timings[name] = time.perf_counter() - step_started
+        WARMUP_STEP_SECONDS.set(_timings[name], step=name)
+        logger.info("ウォームアップ %s: %.3fs", name, _timings[name])
+    _finished_at = time.perf_counter()
+    WARMUP_SECONDS.set(_finished_at - started)
+    logger.info("ウォームアップ完了: %.3fs", _finished_at - started)
+
+
+def start_warmup():
+    """ウォームアップを開始（プロセスごとに1回だけ。ADAMS_WARMUP=0 で無効化）"""
+    global _thread
+    if os.environ.get("ADAMS_WARMUP", "1") == "0":
+        return None
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_run, name="adams-warmup", daemon=True)
+            _thread.start()
+        return _thread
+
+
+def warmup_report():
+    """ウォームアップの状態と各ステップの所要時間（秒）"""
+    if _thread is None:
+        status = "not started"
+    elif _finished_at is None:
+        status = "running"
+    else:
+        status = "done"
+    return {"status": status, "timings": dict(_timings), "total": sum(_timings.values())}